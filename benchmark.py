@@ -0,0 +1,179 @@
+"""
+Times each stage of the log pipeline over synthetic logs written by loggen, so regressions in parsing, filtering,
+display or export show up as a drop in records per second or a rise in peak memory.
+
+eg: python benchmark.py BRDTransactionLog --records 500000 --files 4 --workers 4 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import loggen
+from logparser import LogFolder, Suffix, TreeViewData, write_csv
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, peak memory isn't reported there
+    resource = None
+
+
+def peak_rss() -> Optional[int]:
+    """
+    :return: peak resident set size in bytes of this process and its largest finished worker process, or None if it
+    can't be measured on this platform
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+class Benchmark:
+    """
+    Collects the timings of each stage, in the order they were run.
+    """
+
+    def __init__(self):
+        self.results: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str, records: int = None):
+        """
+        Times the body of the with block.
+        :param name: stage name
+        :param records: number of records the stage handles, for records per second
+        """
+        result = {'stage': name, 'records': records}
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result['seconds'] = time.perf_counter() - start
+            if result['records'] is not None and result['seconds'] > 0:
+                result['records_per_second'] = result['records'] / result['seconds']
+            result['peak_rss'] = peak_rss()
+            self.results.append(result)
+
+    def skip(self, name: str, reason: str):
+        self.results.append({'stage': name, 'skipped': reason})
+
+    def report(self) -> str:
+        lines = [f'{"stage":<24}{"records":>12}{"seconds":>10}{"records/s":>14}{"peak rss MB":>14}']
+        for result in self.results:
+            if 'skipped' in result:
+                lines.append(f'{result["stage"]:<24}skipped, {result["skipped"]}')
+                continue
+            records = '' if result['records'] is None else result['records']
+            rate = f'{result["records_per_second"]:.0f}' if 'records_per_second' in result else ''
+            rss = '' if result['peak_rss'] is None else f'{result["peak_rss"] / 1024 / 1024:.1f}'
+            lines.append(f'{result["stage"]:<24}{records:>12}{result["seconds"]:>10.3f}{rate:>14}{rss:>14}')
+        return '\n'.join(lines)
+
+
+def display_results(benchmark: Benchmark, tree_view_data: TreeViewData, records: int) -> None:
+    """
+    Times loading the results into the GUI, skipped when there's no display to open a window on.
+    """
+    try:
+        import tkinter as tk
+    except ImportError as error:
+        benchmark.skip('display_results', str(error))
+        return
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        benchmark.skip('display_results', str(error))
+        return
+    from main import ClientApp
+    try:
+        client_app = ClientApp(root)
+        with benchmark.stage('display_results', records):
+            client_app.result_display_frame.display_results(tree_view_data)
+            root.update()
+    finally:
+        root.destroy()
+
+
+def run(directory: str, log_file_suffix: Suffix, workers: int = 1, raw_refs: bool = False,
+        columnar: bool = False) -> Benchmark:
+    """
+    Times reading, indexing, filtering, displaying and exporting the logs in a folder.
+    """
+    benchmark = Benchmark()
+    tree_view_data = TreeViewData(LogFolder(directory, log_file_suffix, workers=workers, raw_refs=raw_refs),
+                                  columnar=columnar)
+    with benchmark.stage('LogFolder.run') as result:
+        tree_view_data.log_folder.run()
+        result['records'] = sum(len(logs) for logs in tree_view_data.log_folder.logs.values())
+    records = result['records']
+    with benchmark.stage('build_index', records):
+        tree_view_data.build_index()
+    logs = tree_view_data.index.logs
+    ur_numbers = sorted({str(log.ur_number) for log in logs[::max(1, len(logs) // 3)]})
+    visit_numbers = sorted({str(log.visit_number) for log in logs[1::max(1, len(logs) // 3)]})
+    with benchmark.stage('filter ur_number', records):
+        tree_view_data.filter(ur_numbers=ur_numbers)
+    with benchmark.stage('filter visit_number', records):
+        tree_view_data.filter(visit_numbers=visit_numbers)
+    with benchmark.stage('filter search', records):
+        tree_view_data.filter(search_query='smith 4east')
+    with benchmark.stage('filter search prefix', records):
+        tree_view_data.filter(search_query='jon* a0*')
+    with benchmark.stage('filter combined', records):
+        tree_view_data.filter(ur_numbers=ur_numbers, visit_numbers=visit_numbers, search_query='smith')
+    timestamps = sorted(log.timestamp for log in logs if log.timestamp is not None)
+    with benchmark.stage('filter time range', records):
+        tree_view_data.filter(start=timestamps[len(timestamps) // 4], end=timestamps[len(timestamps) // 2])
+    tree_view_data.filter()
+    with benchmark.stage('count_by ur_number', records):
+        tree_view_data.count_by('ur_number')
+    display_results(benchmark, tree_view_data, records)
+    with open(os.devnull, 'w', newline='') as csv_file:
+        with benchmark.stage('write_csv', records):
+            write_csv(csv_file, tree_view_data.header, tree_view_data.log_folder.log_list)
+    return benchmark
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the log pipeline over synthetic logs.')
+    parser.add_argument('log_type', choices=[suffix.name for suffix in Suffix], help='type of log to benchmark')
+    parser.add_argument('--records', type=int, default=200000, help='total number of logs to generate')
+    parser.add_argument('--files', type=int, default=1, help='number of log files to spread the logs over')
+    parser.add_argument('--gzip', action='store_true', help='gzip the log files')
+    parser.add_argument('--workers', type=int, default=1, help='processes used to parse the logs')
+    parser.add_argument('--raw-refs', action='store_true',
+                        help='keep where each log is in its file instead of its raw text')
+    parser.add_argument('--columnar', action='store_true', help='index the logs in NumPy columns')
+    parser.add_argument('--directory', default=None,
+                        help='benchmark the logs already in this folder instead of generating them')
+    parser.add_argument('--json', default=None, help='also write the results to this json file')
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+    log_file_suffix = Suffix[args.log_type]
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        directory = args.directory
+        if directory is None:
+            directory = temporary_directory
+            loggen.generate_logs(directory, log_file_suffix, args.records, args.files, args.gzip)
+        benchmark = run(directory, log_file_suffix, workers=args.workers, raw_refs=args.raw_refs,
+                        columnar=args.columnar)
+    print(benchmark.report())
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'arguments': vars(args), 'results': benchmark.results}, json_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Reads a folder of logs, filters them and exports them to a csv file without the GUI, for scheduled extracts on servers
+without a display. Only imports logparser, tkinter is never loaded.
+
+eg: python cli.py /var/log/webpas BRDTransactionLog extract.csv --ur-number 123456 654321 --search "4east"
+"""
+import argparse
+import os
+import sys
+
+from logparser import LogFolder, ParseCache, StageStats, Suffix, filter_query, parse_time_bound, write_csv
+
+
+def end_time(value: str):
+    return parse_time_bound(value, end=True)
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Filter and export logs to csv without the GUI.')
+    parser.add_argument('directory', help='folder containing the log files')
+    parser.add_argument('log_type', choices=[suffix.name for suffix in Suffix], help='type of log to read')
+    parser.add_argument('output', help='csv file to export to, - for stdout')
+    parser.add_argument('--ur-number', nargs='+', default=[], help='only export logs for these UR numbers')
+    parser.add_argument('--visit-number', nargs='+', default=[], help='only export logs for these visit numbers')
+    parser.add_argument('--search', default='', help='only export logs containing every word, word* matches a prefix')
+    parser.add_argument('--message-type', nargs='+', default=[], help='only export these HL7 message types, eg: A01')
+    parser.add_argument('--from', dest='start', type=parse_time_bound, default=None,
+                        help='only export logs from this time, eg: "2020-01-01 14:00"')
+    parser.add_argument('--to', dest='end', type=end_time, default=None,
+                        help='only export logs up to this time, a date on its own includes the whole day')
+    parser.add_argument('--match-any', action='store_true',
+                        help='export logs that match any of the filters, rather than all of them')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes used to parse the logs')
+    parser.add_argument('--cache', action='store_true',
+                        help='load unchanged files from the parse cache, which keeps the parsed logs on disk')
+    parser.add_argument('--cache-dir', default=None,
+                        help='parse cache folder, defaults to ~/.logapp/cache, implies --cache')
+    # Every file is parsed without the cache unless it's asked for, kept so older scripts still run
+    parser.add_argument('--no-cache', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--stream', action='store_true',
+                        help='filter and export one file at a time in constant memory, without the cache or workers')
+    parser.add_argument('--raw-refs', action='store_true',
+                        help='keep where each log is in its file instead of its raw text, read back when exporting')
+    parser.add_argument('--stats', action='store_true', help='print the time taken by each file to stderr')
+    return parser.parse_args(args)
+
+
+def print_stats(stats: StageStats) -> None:
+    dropped = ', '.join(f'{count} {error}' for error, count in stats.dropped.items()) or 'none'
+    print(f'{stats.file} {stats.stage}: {stats.records} logs from {stats.bytes_read} bytes in {stats.seconds:.3f}s '
+          f'({stats.records_per_second:.0f} logs/s), {stats.filtered} filtered, dropped {dropped}', file=sys.stderr)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+    if not os.path.isdir(args.directory):
+        print(f'{args.directory} is not a folder', file=sys.stderr)
+        return 2
+    record_filter = filter_query(ur_numbers=args.ur_number, visit_numbers=args.visit_number, search_query=args.search,
+                                 start=args.start, end=args.end, message_types=args.message_type,
+                                 match_any=args.match_any)
+    log_folder = LogFolder(directory_path=args.directory,
+                           log_file_suffix=Suffix[args.log_type],
+                           workers=args.workers,
+                           cache=ParseCache(args.cache_dir) if args.cache or args.cache_dir else None,
+                           record_filter=record_filter,
+                           on_stats=print_stats if args.stats else None,
+                           raw_refs=args.raw_refs)
+    if args.stream:
+        logs = log_folder.iter_logs()
+        header = log_folder.header if log_folder.files else None
+    else:
+        # The filter is applied as the logs are parsed, so the folder only holds the logs to export
+        log_folder.run()
+        header = log_folder.header
+        logs = log_folder.log_list
+    if header is None:
+        print(f'There were no {args.log_type} files found in {args.directory}', file=sys.stderr)
+        return 1
+    if args.output == '-':
+        count = write_csv(sys.stdout, header, logs)
+    else:
+        with open(args.output, 'w', newline='') as csv_file:
+            count = write_csv(csv_file, header, logs)
+    print(f'Exported {count} logs to {args.output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Writes synthetic BRD, REC and PAS access log files, in the formats the log parser reads, for benchmarks and for
+trying the app without real patient data. The same seed always writes the same logs.
+
+eg: python loggen.py /tmp/logs BRDTransactionLog --records 500000 --files 4 --gzip
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+from os.path import join
+from typing import List, Iterator
+
+from logparser import HL7_MESSAGE, Suffix
+
+BRD_SEPARATOR = 80 * '-'
+FIRST_NAMES = ('JOHN', 'MARY', 'WEI', 'PRIYA', 'AHMED', 'OLIVIA', 'JACK', 'CHLOE', 'NGUYEN', 'LIAM', 'ISLA', 'NOAH')
+LAST_NAMES = ('SMITH', 'JONES', 'WILLIAMS', 'BROWN', 'TRAN', 'SINGH', 'NGUYEN', 'TAYLOR', 'WILSON', 'CHEN', 'KELLY')
+WARDS = ('4EAST', '4WEST', '5NORTH', 'ICU', 'MATERNITY', 'DAYSURG', 'REHAB')
+USERS = ('jbloggs', 'asmith', 'kchen', 'ptran', 'mwilson', 'svc_pas')
+PAS_PAGES = ('pas00001.pbl', 'pas00002.pbl', 'pas00107.pbl', 'pas00200.pbl', 'pas01005.pbl')
+
+
+@dataclass
+class Patient:
+    ur_number: int
+    first_name: str
+    middle_name: str
+    last_name: str
+    date_of_birth: date
+    visit_number: int
+
+
+def patients(rng: random.Random, count: int) -> List[Patient]:
+    return [Patient(ur_number=rng.randint(100000, 9999999),
+                    first_name=rng.choice(FIRST_NAMES),
+                    middle_name=rng.choice(FIRST_NAMES + ('""',) * 6),
+                    last_name=rng.choice(LAST_NAMES),
+                    date_of_birth=date(1930, 1, 1) + timedelta(days=rng.randint(0, 32000)),
+                    visit_number=rng.randint(1000000, 9999999))
+            for _ in range(count)]
+
+
+def _hl7_segments(rng: random.Random, patient: Patient, message_id: int, when: datetime, receiver: bool) -> List[str]:
+    admission_type = rng.choice('IIIIOOE')
+    message_trans_type = rng.choice(list(HL7_MESSAGE[admission_type]))
+    message_type = rng.choice(list(HL7_MESSAGE[admission_type][message_trans_type]))
+    ward = rng.choice(WARDS)
+    bed = f'{rng.randint(1, 40):02}'
+    # The receiver log has a time zone on the message time and the visit number in PV1-17
+    msh = [f'MSH|^~\\&|{"HBA" if receiver else "PAS"}|SJOG|{"PAS" if receiver else "HBA"}|SJOG',
+           f'{when:%Y%m%d%H%M%S}{"+0800" if receiver else ""}', '', f'{message_trans_type}^{message_type}',
+           str(message_id), 'P', '2.4']
+    pid = ['PID', '1', '', f'{patient.ur_number}^^^SJOG^MR', '',
+           f'{patient.last_name}^{patient.first_name}^{patient.middle_name}', '',
+           f'{patient.date_of_birth:%Y%m%d}', rng.choice('MF')]
+    pv1 = ['PV1', '1', admission_type, f'{ward}^^{bed}^SJOG', '', str(patient.visit_number), '', '', '', '',
+           f'ED^{bed}'] + [''] * 6 + [str(patient.visit_number), '', str(patient.visit_number)]
+    return ['|'.join(msh), f'EVN|{message_type}|{when:%Y%m%d%H%M%S}', '|'.join(pid), '|'.join(pv1)]
+
+
+def brd_message(rng: random.Random, patient: Patient, message_id: int, when: datetime) -> List[str]:
+    """
+    Lines of a broadcaster log entry, the 52 character line before the segments puts MSH at HL7Log.msh_offset once
+    the lines are joined.
+    """
+    return [BRD_SEPARATOR, f'{when:%Y-%m-%d %H:%M:%S}.{when.microsecond // 1000:03} [PASBRD01] Outbound msg sent'] + \
+        _hl7_segments(rng, patient, message_id, when, receiver=False)
+
+
+def rec_message(rng: random.Random, patient: Patient, message_id: int, when: datetime) -> List[str]:
+    """
+    Lines of a receiver log entry, the shorter 48 character line before the segments shifts the MSH fields along by
+    one, as RECLog expects.
+    """
+    return [BRD_SEPARATOR, f'{when:%Y-%m-%d %H:%M:%S}.{when.microsecond // 1000:03} [PASREC01] Received msg:'] + \
+        _hl7_segments(rng, patient, message_id, when, receiver=True)
+
+
+def pas_access_line(rng: random.Random, patient: Patient, when: datetime) -> str:
+    page = rng.choice(PAS_PAGES)
+    params = f'template={rng.randint(1, 40)}'
+    if rng.random() < 0.8:
+        params += f'&urnumber={patient.ur_number}'
+        if rng.random() < 0.5:
+            params += f'&admissno={patient.visit_number}'
+    return (f'10.1.{rng.randint(0, 9)}.{rng.randint(1, 254)} {rng.choice(USERS)} {when:%Y-%m-%d %H:%M:%S} '
+            f'"{rng.choice(("GET", "GET", "GET", "POST"))} /cgi-bin/{page}?{params} HTTP/1.1" '
+            f'{rng.choice(("200", "200", "200", "302", "404"))} {rng.randint(200, 90000)} {rng.random():.3f} '
+            f'"Referer=https://webpas.sjog.org.au/cgi-bin/{rng.choice(PAS_PAGES)}?template=1'
+            f'&urnumber={patient.ur_number}"')
+
+
+def log_lines(log_file_suffix: Suffix, records: int, start: datetime, seed: int = 0) -> Iterator[str]:
+    """
+    Lines of a log file holding the given number of records, one every few seconds from start.
+    """
+    rng = random.Random(seed)
+    pool = patients(rng, max(1, records // 20))
+    when = start
+    for message_id in range(1, records + 1):
+        when += timedelta(milliseconds=rng.randint(0, 4000))
+        patient = rng.choice(pool)
+        if log_file_suffix is Suffix.PASAccessLog:
+            yield pas_access_line(rng, patient, when)
+            continue
+        if message_id % 50 == 0:
+            # The broadcaster logs its idle timeouts between messages, they are dropped when parsing
+            yield f'{when:%Y-%m-%d %H:%M:%S}.000 [PASBRD01] Timeout waiting for incoming message'
+        message = brd_message if log_file_suffix is Suffix.BRDTransactionLog else rec_message
+        yield from message(rng, patient, message_id, when)
+    if log_file_suffix is not Suffix.PASAccessLog:
+        # A message is only complete once the separator after it is written
+        yield BRD_SEPARATOR
+
+
+def generate_logs(directory: str, log_file_suffix: Suffix, records: int, files: int = 1, compress: bool = False,
+                  seed: int = 0) -> List[str]:
+    """
+    Writes records logs spread over files log files, one day per file.
+    :param directory: folder to write the log files to, created if it doesn't exist
+    :param log_file_suffix: type of log to write
+    :param records: total number of logs
+    :param files: number of log files
+    :param compress: gzip the log files
+    :param seed: random seed, the same seed writes the same logs
+    :return: paths of the log files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for file_number in range(files):
+        day = datetime(2020, 1, 1) + timedelta(days=file_number)
+        path = join(directory, f'log_{day:%Y%m%d}.{log_file_suffix.value}{".gz" if compress else ""}')
+        opener = gzip.open if compress else open
+        file_records = records // files + (1 if file_number < records % files else 0)
+        with opener(path, 'wt', encoding='latin-1', newline='\n') as log_file:
+            for line in log_lines(log_file_suffix, file_records, day, seed + file_number):
+                log_file.write(line)
+                log_file.write('\n')
+        paths.append(path)
+    return paths
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Write synthetic log files.')
+    parser.add_argument('directory', help='folder to write the log files to')
+    parser.add_argument('log_type', choices=[suffix.name for suffix in Suffix], help='type of log to write')
+    parser.add_argument('--records', type=int, default=100000, help='total number of logs')
+    parser.add_argument('--files', type=int, default=1, help='number of log files to spread the logs over')
+    parser.add_argument('--gzip', action='store_true', help='gzip the log files')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+    for path in generate_logs(args.directory, Suffix[args.log_type], args.records, args.files, args.gzip, args.seed):
+        print(f'{path} {os.path.getsize(path)} bytes', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
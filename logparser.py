@@ -0,0 +1,2479 @@
+import csv
+import gzip
+import io
+import os
+import ipaddress
+import enum
+import hashlib
+import mmap
+import pickle
+import queue
+import re
+import sys
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import asdict, dataclass, field
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, date
+from functools import partial, lru_cache
+from itertools import chain, repeat
+from operator import attrgetter
+from os import listdir
+from os.path import basename, isfile, join
+from time import perf_counter
+from typing import BinaryIO, TextIO, Tuple, List, Optional, Dict, Iterable, Iterator, Callable, NamedTuple, Union
+from urllib import parse
+
+# NumPy is only needed for the columnar LogIndex, it's imported by load_numpy when the first one is made rather than
+# here, as it's slow to import and the hash indexes and the command line don't use it
+np = None
+
+
+def load_numpy() -> None:
+    """
+    Imports NumPy as the module global np, if it hasn't been already.
+    :raises ImportError: NumPy isn't installed
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError as error:
+            raise ImportError('NumPy is needed for a columnar LogIndex') from error
+        np = numpy
+
+# HL7 Message Definitions
+
+HL7_MESSAGE = {
+    'I': {
+        'ADT': {
+            'A01': 'Admission',
+            'A02': 'Transfer',
+            'A03': 'Discharge',
+            'A05': 'Pre-admission',
+            'A08': 'Visit Update',
+            'A11': 'Cancel Admission',
+            'A12': 'Cancel Transfer',
+            'A13': 'Cancel I/P Discharge',
+            'A14': 'Pre-admission',
+            'A21': 'On-Leave',
+            'A22': 'Return from leave',
+            'A27': 'Cancel Pre-admission',
+            'A28': 'PMI Registration',
+            'A31': 'PMI Update',
+            'A34': 'PMI Merge',
+            'A44': 'Change U/R for O/P visit',
+        },
+        'SIU': {
+            'S12': 'Notification of New Appointment',
+            'S14': 'Notification of Appointment Modification',
+            'S15': 'Notification of Appointment Cancellation',
+        }
+    },
+    'E': {
+        'ADT': {
+            'A03': 'Discharge Emergency Visit',
+            'A04': 'Register Emergency Visit',
+            'A08': 'Emergency Visit Update',
+            'A11': 'Cancel Emergency Visit',
+            'A13': 'Cancel Emergency Visit Discharge',
+            'A44': 'Change U/R for Emergency Visit',
+        }
+    },
+    'O': {
+        'ADT': {
+            'A03': 'Discharge',
+            'A04': 'Register Event (Attendance)',
+            'A05': 'Pre-admit a Patient (Booking)',
+            'A08': 'Update Patient Information (Update Booking/Reschedule)',
+            'A11': 'Cancel Visit (Unattend)',
+            'A13': 'Cancel Discharge',
+            'A38': 'Cancel Pre-admit (Booking)',
+            'A44': 'Change U/R for O/P visit',
+            'A31': 'PMI Update',
+        }
+    },
+
+}
+HL7_MESSAGE['S'] = HL7_MESSAGE['I']
+
+
+# Timestamps
+# Logs parse a timestamp or two each, fixed width timestamps are sliced straight into a datetime rather than going
+# through strptime, and the results are cached as the same second or date of birth turns up in many logs.
+
+ACCESS_LOG_DATETIME_PATTERN = re.compile(r'(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)')
+
+
+@lru_cache(maxsize=65536)
+def parse_hl7_datetime(value: str) -> datetime:
+    """
+    Same as datetime.strptime(value, '%Y%m%d%H%M%S')
+    """
+    if len(value) == 14 and value.isdigit():
+        return datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                        int(value[8:10]), int(value[10:12]), int(value[12:]))
+    return datetime.strptime(value, '%Y%m%d%H%M%S')
+
+
+@lru_cache(maxsize=65536)
+def parse_hl7_date(value: str) -> date:
+    """
+    Same as datetime.strptime(value, '%Y%m%d').date()
+    """
+    if len(value) == 8 and value.isdigit():
+        return date(int(value[:4]), int(value[4:6]), int(value[6:]))
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+@lru_cache(maxsize=65536)
+def parse_access_log_datetime(value: str) -> datetime:
+    """
+    Same as datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    """
+    match = ACCESS_LOG_DATETIME_PATTERN.fullmatch(value)
+    if match:
+        return datetime(*map(int, match.groups()))
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
+def parse_time_bound(value: str, end: bool = False) -> Optional[datetime]:
+    """
+    Parses one end of a time range typed in by a user, eg: "2020-01-01 14:00", "2020-01-01T14:30:15" or "2020-01-01".
+    :param end: a date on its own covers the whole day, so it ends at midnight rather than starting at it
+    :return: None for a blank value, which leaves that end of the range open
+    :raises ValueError: if the value isn't a date or date and time
+    """
+    value = value.strip()
+    if not value:
+        return None
+    bound = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        bound = datetime.combine(bound.date(), datetime.max.time())
+    return bound
+
+
+# Log Classes
+
+
+class Log:
+    """
+    Base log class to hold common functionality across logfiles. Logs are slotted and only keep the columns they
+    export, as a folder of logs can hold millions of them.
+    """
+    __slots__ = '_raw',
+    # Attributes holding a placeholder when the log has no value, mapped to the placeholder, values() shows them blank
+    blank_values = {}
+
+    def __init__(self, raw_data: str):
+        self._raw = raw_data
+        self._parse()
+
+    def _parse(self):
+        pass
+
+    @property
+    def raw(self) -> str:
+        """
+        The raw text of the log, read back from its log file if it was left there by detach_raw.
+        """
+        raw = self._raw
+        return raw if isinstance(raw, str) else raw.read()
+
+    @raw.setter
+    def raw(self, raw_data: str) -> None:
+        self._raw = raw_data
+
+    def detach_raw(self, raw_ref: 'RawRef') -> None:
+        """
+        Drops the raw text of the log, it is read back through raw_ref when it's needed.
+        """
+        self._raw = raw_ref
+
+    @classmethod
+    def header(cls):
+        pass
+
+    def values(self):
+        pass
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """
+        When the log was written, used by time range filters.
+        """
+        return None
+
+
+class HL7Log(Log):
+    """
+    Log class that has common HL7 Attributes
+    """
+    __slots__ = ('message_id', 'message_date_time', 'message_type', 'type_description', 'ur_number', 'first_name',
+                 'middle_name', 'last_name', 'date_of_birth', 'visit_number', 'admission_type', 'ward', 'bed')
+    # Offset of the MSH segment in the raw log, after the timestamp the log line starts with, used when the raw log
+    # has no MSH segment
+    msh_offset = 53
+    # Characters skipped from the start of the MSH segment before its fields are split off
+    msh_skip = 0
+    blank_values = {'visit_number': 0}
+
+    def __init__(self, raw_data: str):
+        """
+        Converts the raw string data to the BRDLog object
+        :param raw_data: str data to be converted to class object
+        """
+        super().__init__(raw_data)
+
+    def _parse(self):
+        msh, pid, pv1 = self._parse_headers()
+        message_trans_type = self._build_msh(msh)
+        self._build_pid(pid)
+        self._build_pv1(pv1)
+        self._set_type_descriptions(message_trans_type)
+
+    def _parse_headers(self) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Splits the MSH, PID and PV1 segments into fields. The message is split once from the MSH segment, only as far
+        as the last field needed, and the PID and PV1 fields are sliced out of that by counting the field separators
+        before each segment. The segments are only needed while parsing, so they are returned rather than kept on the
+        log.
+        :return: (msh, pid, pv1)
+        """
+        if len(self._raw) == 0:
+            return '', '', ''
+        msh_start = self._msh_start()
+        pid_index = self._segment_index('PID|', msh_start)
+        pv1_index = self._segment_index('PV1|', msh_start)
+        last_field = max(19,
+                         pid_index + 31 if pid_index is not None else 0,
+                         pv1_index + 45 if pv1_index is not None else 0)
+        fields = self._raw[msh_start:].split('|', last_field)
+        return fields[:19], self._segment_fields(fields, 'PID|', pid_index, 31), \
+               self._segment_fields(fields, 'PV1|', pv1_index, 45)
+
+    def _msh_start(self) -> int:
+        """
+        :return: where the MSH fields are split from, found rather than fixed so logs with a different length line
+        before the message, or none at all in MLLP captures, parse the same
+        """
+        position = self._raw.find('MSH|')
+        return self.msh_offset if position == -1 else position + self.msh_skip
+
+    def _segment_index(self, segment: str, msh_start: int) -> Optional[int]:
+        """
+        :param segment: segment name and field separator, eg: 'PID|'
+        :param msh_start: HL7Log._msh_start
+        :return: index of the field ending in the segment name, in raw[msh_start:].split('|'), or None if the segment
+        isn't in that part of the message
+        """
+        position = self._raw.find(segment)
+        if position < msh_start:
+            return None
+        return self._raw.count('|', msh_start, position)
+
+    def _segment_fields(self, fields: List[str], segment: str, index: Optional[int], count: int) -> List[str]:
+        """
+        Gets the first fields of a segment, the same as raw[raw.find(segment):].split('|')[:count].
+        :param fields: raw[msh_start:].split('|')
+        :param segment: segment name and field separator, eg: 'PID|'
+        :param index: index of the segment in fields
+        :param count: number of fields needed, including the segment name
+        """
+        if index is not None:
+            return [segment[:3]] + fields[index + 1:index + count]
+        position = self._raw.find(segment)
+        if position == -1:
+            return []
+        return self._raw[position:].split('|')[:count]
+
+    def _build_msh(self, msh) -> str:
+        """
+        :return: message transaction type, eg: ADT, used to look up the type description
+        """
+        self.message_date_time = None
+        self.message_type = ''
+        self.message_id = None
+        message_trans_type = ''
+        try:
+            self.message_date_time = parse_hl7_datetime(msh[6])
+            message_trans_type = msh[8].split('^')[0]
+            self.message_type = sys.intern(msh[8].split('^')[1])
+            self.message_id = int(msh[9])
+        except AttributeError:
+            pass
+        except IndexError:
+            pass
+        return message_trans_type
+
+    def _build_pid(self, pid):
+        self.ur_number = ''
+        self.first_name = ''
+        self.middle_name = ''
+        self.last_name = ''
+        self.date_of_birth = None
+        try:
+            # A patient's messages repeat their details, intern them so the logs share one copy
+            self.ur_number = sys.intern(pid[3].split('^')[0])
+            self.first_name = sys.intern(pid[5].split('^')[1])
+            self.middle_name = sys.intern(pid[5].split('^')[2].replace('"', ''))
+            self.last_name = sys.intern(pid[5].split('^')[0])
+            self.date_of_birth = parse_hl7_date(pid[7])
+        except IndexError:
+            pass
+
+    def _build_pv1(self, pv1):
+        try:
+            self.admission_type = pv1[2]
+            self.ward = ''
+            self.bed = ''
+            self.visit_number = 0
+            if self.admission_type.lower() == 'e':
+                self.ward = 'Emergency'
+                self.bed = pv1[10].split('^')[1]
+            else:
+                self.ward = sys.intern(pv1[3].split('^')[0])
+                self.bed = sys.intern(pv1[3].split('^')[2])
+                self.visit_number = int(pv1[5])
+        except IndexError:
+            self.ward = ''
+            self.bed = ''
+            self.visit_number = 0
+            self.admission_type = ''
+
+    def _set_type_descriptions(self, message_trans_type):
+        self.type_description = ''
+        if self.admission_type != '':
+            self.type_description = HL7_MESSAGE[self.admission_type][message_trans_type][self.message_type]
+
+    @property
+    def message_date(self):
+        return self.message_date_time.date()
+
+    @property
+    def message_time(self):
+        return self.message_date_time.time()
+
+    @property
+    def timestamp(self):
+        return self.message_date_time
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} MsgID:{self.message_id} MsgType:{self.message_type} MRN:{self.ur_number}>'
+
+    @classmethod
+    def header(cls):
+        return 'message_id', 'message_date_time', 'message_type', 'type_description', 'ur_number', 'first_name', \
+               'middle_name', 'last_name', 'date_of_birth', 'visit_number', 'admission_type', 'ward', 'bed', 'raw'
+
+    def values(self):
+        if self.visit_number == self.blank_values['visit_number']:
+            visit = ''
+        else:
+            visit = self.visit_number
+        return self.message_id, self.message_date_time, self.message_type, self.type_description, \
+               self.ur_number, self.first_name, self.middle_name, self.last_name, self.date_of_birth, \
+               visit, self.admission_type, self.ward, self.bed, self.raw
+
+
+class BRDLog(HL7Log):
+    """
+    Broadcaster Log class
+    """
+    __slots__ = ()
+
+
+class RECLog(HL7Log):
+    """
+    Receiver Log class
+    """
+    __slots__ = ()
+    # The receiver's fields are numbered from after the MSH segment name
+    msh_skip = 4
+
+    def _build_msh(self, msh) -> str:
+        self.message_date_time = None
+        self.message_type = ''
+        self.message_id = None
+        message_trans_type = ''
+        try:
+            self.message_date_time = parse_hl7_datetime(msh[5][:14])
+            message_trans_type = msh[7].split('^')[0]
+            self.message_type = sys.intern(msh[7].split('^')[1])
+            self.message_id = 0
+            try:
+                self.message_id = int(msh[8])
+            except ValueError:
+                self.message_id = msh[8]
+        except AttributeError:
+            pass
+        except IndexError:
+            pass
+        return message_trans_type
+
+    def _build_pv1(self, pv1):
+        try:
+            self.admission_type = pv1[2]
+            self.ward = ''
+            self.bed = ''
+            self.visit_number = 0
+            if self.admission_type.lower() == 'e':
+                self.ward = 'Emergency'
+                self.bed = pv1[10].split('^')[1]
+            elif self.admission_type.lower() == 'o':
+                self.ward = sys.intern(pv1[3].split('^')[0])
+                self.bed = ''
+                self.visit_number = int(pv1[17].split('^')[0])
+            elif self.admission_type.lower() == 'i':
+                self.ward = sys.intern(pv1[3].split('^')[0])
+                self.bed = sys.intern(pv1[3].split('^')[2])
+                if pv1[1] == '':
+                    self.visit_number = pv1[19].split(' ')[0]
+                else:
+                    self.visit_number = int(pv1[17].split('^')[0])
+        except IndexError:
+            self.ward = ''
+            self.bed = ''
+            self.visit_number = 0
+            self.admission_type = ''
+        except ValueError:
+            self.visit_number = 0
+
+
+class PASAccessLog(Log):
+    """
+    Webpas Web Server Access Log
+    """
+    __slots__ = ('ip_address', 'user', 'datetime', 'method', 'response_code', 'url', 'referer_url', 'host',
+                 'ur_number', 'visit_number')
+
+    def __new__(cls, raw_data: Union[str, 'RawRef'], *args, **kwargs):
+        # Logs unpickled with a RawRef were checked when they were first read
+        if isinstance(raw_data, RawRef) or ipaddress.ip_address(raw_data.split(' ')[0]):
+            return super(PASAccessLog, cls).__new__(cls)
+
+    def __getnewargs__(self):
+        # __new__ needs the raw data when the log is unpickled in the LogFolder process pool
+        return self._raw,
+
+    def __init__(self, raw_data: str):
+        """
+        Converts the raw string data to the PASAccessLog object
+        :param raw_data: str data to be converted to class object
+        """
+        super().__init__(raw_data)
+        log = raw_data.split(' ')
+        # Columns that repeat across many logs are interned, so the logs share one copy of each value
+        self.ip_address = sys.intern(log[0])
+        self.user = sys.intern(log[1])
+        self.datetime = parse_access_log_datetime(' '.join(log[2:4]))
+        self.method = sys.intern(log[4].strip('"'))
+        self.response_code = sys.intern(log[7])
+
+        # Parsing visited URL
+        self.url = sys.intern(log[5].split('?')[0])
+        try:
+            url_params = parse.parse_qs(log[5].split('?')[1])
+        except IndexError:
+            url_params = ''
+
+        # Parsing referred URL
+        self.referer_url = sys.intern(log[10].split('?')[0].strip('Referer=').replace('"', ''))
+        try:
+            referer_params = parse.parse_qs(log[10].split('?')[1])
+        except IndexError:
+            referer_params = ''
+        self.host = sys.intern(self.referer_url.strip('https://')[:self.referer_url.find('.sjog.org.au') - 8])
+
+        # Parse UR Number
+        self.ur_number = None
+        try:
+            self.ur_number = int(url_params['urnumber'][0])
+        except KeyError:
+            pass
+        except TypeError:
+            pass
+        except ValueError:
+            pass
+        try:
+            referer_ur = int(referer_params['urnumber'][0])
+            if referer_ur != self.ur_number and self.ur_number is None:
+                self.ur_number = referer_ur
+        except KeyError:
+            pass
+        except TypeError:
+            pass
+        except ValueError:
+            pass
+
+        # Parse Visit number
+        self.visit_number = None
+        try:
+            self.visit_number = int(url_params['admissno'][0])
+        except KeyError:
+            pass
+        except TypeError:
+            pass
+        except ValueError:
+            pass
+        try:
+            referer_visit = int(referer_params['admissno'][0])
+            if referer_visit != self.visit_number and self.visit_number is None:
+                self.visit_number = referer_visit
+        except KeyError:
+            pass
+        except TypeError:
+            pass
+        except ValueError:
+            pass
+
+    @property
+    def date(self):
+        return self.datetime.date()
+
+    @property
+    def time(self):
+        return self.datetime.time()
+
+    @property
+    def timestamp(self):
+        return self.datetime
+
+    def __repr__(self):
+        return f'<PASAccessLog IP:{self.ip_address} UserID:{self.user} MRN:{self.ur_number}>'
+
+    @classmethod
+    def header(cls):
+        return 'ip_address', 'user', 'datetime', 'method', 'response_code', 'host', 'ur_number', 'visit_number', \
+               'visited_url', 'referred_url', 'raw '
+
+    def values(self):
+        return self.ip_address, self.user, self.datetime, self.method, self.response_code, self.host, self.ur_number, \
+               self.visit_number, self.url, self.referer_url, self.raw
+
+
+class LogType(enum.Enum):
+    """
+    Enum to call the correct log from the LogFile class.
+    """
+    BRDTRANSACTIONLOG = BRDLog
+    RECTRANSACTIONLOG = RECLog
+    PASACCESSLOG = PASAccessLog
+
+
+class LogFile:
+    """
+    Base Log file, contains a list of Log's. This class holds common functionality across all log file types
+    """
+
+    # Bytes found at the start of every record after the first, used to split large files into chunks
+    record_separator = b'\n'
+    # Whether LogBuffers can be read, giving where each log is in the file so its raw text can be left there, and
+    # whether uncompressed files are read as LogBuffers even when the raw text is kept, as it's faster than lines
+    reads_buffers = False
+    prefers_buffers = False
+
+    def __init__(self, file_attributes: Tuple[str, str], log_file: TextIO, lazy: bool = False,
+                 record_filter: 'Query' = None, raw_source: 'RawSource' = None):
+        """
+        :param file_attributes: (name, log file type)
+        :param log_file: open log file
+        :param lazy: don't read the file up front, iterate over the LogFile to stream its logs instead
+        :param record_filter: only keeps the logs that pass it, logs whose raw text can't match are never parsed
+        :param raw_source: the file log_file was opened from, the logs read from a LogBuffer of it keep a RawRef
+        rather than their raw text
+        """
+        self.name = file_attributes[0]
+        self.header = None
+        self.suffix = file_attributes[1]
+        self.log_type = self.suffix.upper()
+        self.log_file = log_file
+        self.record_filter = record_filter
+        self.raw_source = raw_source if self.reads_buffers and isinstance(log_file, LogBuffer) else None
+        # Raw logs skipped by the record filter, and raw logs that failed to parse by error name
+        self.filtered = 0
+        self.dropped = defaultdict(int)
+        self._logs = []
+        if not lazy:
+            self._create_log_files()
+            self._get_header()
+
+    def __iter__(self) -> Iterator[Log]:
+        """
+        Parses the logs one at a time as the file is read, nothing is kept on the LogFile.
+        """
+        log_class = LogType[self.log_type].value
+        record_filter = self.record_filter
+        raw_source = self.raw_source
+        if raw_source is None:
+            records = zip(self._parse(), repeat(None), repeat(None))
+        else:
+            records = self._parse_spans(self.log_file)
+            base = self.log_file.offset
+        for raw_log, offset, length in records:
+            if record_filter is not None and not record_filter.might_match(raw_log):
+                self.filtered += 1
+                continue
+            try:
+                log = log_class(raw_log)
+            except (ValueError, IndexError) as error:
+                self.dropped[type(error).__name__] += 1
+                continue
+            if record_filter is None or record_filter(log):
+                if raw_source is not None:
+                    log.detach_raw(RawRef(raw_source, base + offset, length))
+                yield log
+            else:
+                self.filtered += 1
+
+    def _get_header(self):
+        """
+        Sets the header name on the log file, based on the Log header field.
+        Used for setting the headers in the Treeview
+        """
+        self.header = LogType[self.log_type].value.header()
+
+    def _create_log_files(self):
+        self._logs.extend(self)
+
+    def to_dict(self):
+        return {self.name: self._logs}
+
+    def _parse(self) -> Iterator[str]:
+        """
+        Yields the raw text of each log in the file.
+        """
+        return iter(())
+
+    def _parse_spans(self, log_buffer: 'LogBuffer') -> Iterator[Tuple[str, int, int]]:
+        """
+        Yields the raw text of each log in a LogBuffer, with the offset and length of the bytes it was read from. The
+        raw text is read back from those bytes by raw_text, for LogFile classes that read buffers.
+        """
+        return iter(())
+
+    @classmethod
+    def raw_text(cls, data: bytes) -> str:
+        """
+        :param data: the bytes a RawRef points to
+        :return: the raw text of the log read from them
+        """
+        log_file = cls(('', ''), LogBuffer(data), lazy=True)
+        return next((raw for raw, offset, length in log_file._parse_spans(log_file.log_file)), '')
+
+
+class BRDLogFile(LogFile):
+    """
+    Webpas Broadcaster Log file, contains a list of BRDLog's. Reads a text stream line by line, or a LogBuffer by
+    searching its bytes for the separator lines and only decoding the messages between them.
+    """
+
+    record_separator = b'\n' + 80 * b'-'
+    reads_buffers = True
+    prefers_buffers = True
+    # A line starting with this separates messages
+    separator = 80 * b'-'
+    line_end = re.compile(rb'\r\n|\r|\n')
+    # The broadcaster logs this between messages while it's idle, lines holding it are dropped
+    timeout = 'Timeout waiting for incoming message'
+
+    def __init__(self, file_attributes: Tuple[str, str], log_file: Union[TextIO, 'LogBuffer'], lazy: bool = False,
+                 record_filter: 'Query' = None, raw_source: 'RawSource' = None):
+        super().__init__(file_attributes, log_file, lazy, record_filter, raw_source)
+
+    def _parse(self):
+        if isinstance(self.log_file, LogBuffer):
+            return (message for message, offset, length in self._parse_spans(self.log_file))
+        return self._parse_lines()
+
+    def _parse_spans(self, log_buffer: 'LogBuffer') -> Iterator[Tuple[str, int, int]]:
+        """
+        Gives the same messages as _parse_lines, with universal newlines, from the bytes of the log. Lines before the
+        first separator are part of the first message, and the message after the last separator is dropped as it may
+        still be being written. The bytes of a message run from the separator before it, or the start of the file
+        for the first, to the end of the separator after it, so scanning them again gives the same message.
+        """
+        data = log_buffer.data
+        size = len(data)
+        find, line_end, separator_length = data.find, self.line_end.search, len(self.separator)
+        report_at = 0
+        preamble = None
+        body_start = 0
+        record_start = 0
+        position = find(self.separator)
+        while position != -1:
+            if position >= report_at:
+                log_buffer.read_to(position)
+                report_at = position + log_buffer.report_size
+            if position == 0 or data[position - 1] in b'\r\n':
+                end = line_end(data, position + separator_length)
+                if preamble is None:
+                    # Nothing is yielded at the first separator, the lines before it join the first message
+                    preamble = data[:position]
+                else:
+                    message = self._message(preamble, data[body_start:position]) if preamble else \
+                        self._message(data[body_start:position])
+                    preamble = b''
+                    if message:
+                        yield message, record_start, position + separator_length - record_start
+                    record_start = position
+                body_start = size if end is None else end.end()
+            else:
+                # Dashes part way along a line, carry on from the next line
+                end = line_end(data, position)
+            position = -1 if end is None else find(self.separator, end.end())
+        log_buffer.read_to(size)
+
+    def _message(self, *spans: bytes) -> str:
+        """
+        Joins the stripped lines of a message with spaces, as _parse_lines does.
+        :param spans: runs of the message's lines, each line ending in a newline. They're split separately, so a
+        carriage return ending one run isn't read as a CRLF with the newline starting the next
+        """
+        lines = []
+        timeout = False
+        for span in spans:
+            if not span:
+                continue
+            text = span.decode('latin-1')
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            timeout = timeout or self.timeout in text
+            # The text ends in a newline, so the last item is empty
+            lines.extend(text.split('\n')[:-1])
+        if timeout:
+            lines = [line for line in lines if self.timeout not in line]
+        return ' '.join(map(str.strip, lines))
+
+    def _parse_lines(self) -> Iterator[str]:
+        header = []
+        body = []
+        data = []
+        for idx, log in enumerate(self.log_file):
+            try:
+                if not log[:80] == (80 * '-'):
+                    raise NameError
+                if len(header) != 0:
+                    data.append(' '.join(body))
+                    header = []
+                    body = []
+                    if data[0]:
+                        yield data[0]
+                    data = []
+                    header.append(log)
+                else:
+                    header.append(log[:80])
+            except NameError:
+                msg_body = str(log).strip()
+                if self.timeout not in msg_body:
+                    body.append(str(log).strip())
+
+
+class RECLogFile(BRDLogFile):
+    """
+    Webpas Receiver Log file, contains a list of RECLog's.
+    """
+
+    def __init__(self, file_attributes: Tuple[str, str], log_file: Union[TextIO, 'LogBuffer'], lazy: bool = False,
+                 record_filter: 'Query' = None, raw_source: 'RawSource' = None):
+        super().__init__(file_attributes, log_file, lazy, record_filter, raw_source)
+
+
+class PASLogFile(LogFile):
+    reads_buffers = True
+
+    def __init__(self, file_attributes: Tuple[str, str], log_file: Union[TextIO, 'LogBuffer'], lazy: bool = False,
+                 record_filter: 'Query' = None, raw_source: 'RawSource' = None):
+        super().__init__(file_attributes, log_file, lazy, record_filter, raw_source)
+
+    def _parse(self):
+        if isinstance(self.log_file, LogBuffer):
+            return (line for line, offset, length in self._parse_spans(self.log_file))
+        # A last line without a line end is still being written, LogFolder.follow reads it once it's finished
+        return (log.strip('\n') for log in self.log_file if log.endswith('\n'))
+
+    @classmethod
+    def raw_text(cls, data: bytes) -> str:
+        # The bytes of a line, without its line end
+        return data.decode('latin-1')
+
+    def _parse_spans(self, log_buffer: 'LogBuffer') -> Iterator[Tuple[str, int, int]]:
+        """
+        Gives the same lines as reading the log as text with universal newlines, without their line ends. A last line
+        without a line end is dropped as it may still be being written.
+        """
+        data = log_buffer.data
+        size = len(data)
+        find = data.find
+        report_at = 0
+        start = 0
+        while start < size:
+            if start >= report_at:
+                log_buffer.read_to(start)
+                report_at = start + log_buffer.report_size
+            end = find(b'\n', start)
+            finished = end != -1
+            if not finished:
+                end = size
+            line = data[start:end]
+            if b'\r' in line:
+                # Carriage returns end lines too, the one before a newline just ends the same line
+                lines = line.split(b'\r')
+                if not lines[-1] or not finished:
+                    lines.pop()
+                for line in lines:
+                    yield line.decode('latin-1'), start, len(line)
+                    start += len(line) + 1
+            elif finished:
+                yield line.decode('latin-1'), start, end - start
+            start = end + 1
+        log_buffer.read_to(size)
+
+
+# MLLP frames wrap each HL7 message in a start block and an end block, usually followed by a carriage return
+MLLP_START_BLOCK = b'\x0b'
+MLLP_END_BLOCK = b'\x1c'
+MLLP_FRAME_PATTERN = re.compile(rb'\x0b([^\x0b\x1c]*)\x1c')
+HL7_SEGMENT_SEPARATOR = re.compile(r'[\r\n]+')
+
+
+def mllp_frames(buffer, start: int = 0, end: int = None) -> Iterator[memoryview]:
+    """
+    Finds the whole MLLP frames in a bytes-like object, eg: bytes, a memoryview or an mmap. Anything outside a frame,
+    and a frame that hasn't been finished, is skipped.
+    :param start: offset to start looking from
+    :param end: offset to stop looking at, defaults to the end of the buffer
+    :return: the message in each frame, as memoryview slices of the buffer so no message is copied
+    """
+    view = memoryview(buffer)
+    for match in MLLP_FRAME_PATTERN.finditer(view, start, len(view) if end is None else end):
+        yield view[match.start(1):match.end(1)]
+
+
+def read_mllp_frames(binary_file: BinaryIO, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Streams the message in each whole MLLP frame of a file opened in binary mode, reading it a block at a time. Only
+    the unfinished frame at the end of each block is carried over to the next.
+    """
+    buffer = bytearray()
+    while True:
+        block = binary_file.read(block_size)
+        if not block:
+            return
+        buffer += block
+        end = buffer.rfind(MLLP_END_BLOCK) + 1
+        if end == 0:
+            # Only the last start block can begin a frame, drop anything before it
+            start = buffer.rfind(MLLP_START_BLOCK)
+            del buffer[:start if start != -1 else len(buffer)]
+            continue
+        frames = [bytes(match.group(1)) for match in MLLP_FRAME_PATTERN.finditer(buffer, 0, end)]
+        del buffer[:end]
+        yield from frames
+
+
+class MLLPLogFile(LogFile):
+    """
+    Broadcaster or receiver capture of MLLP framed HL7 messages, contains a list of BRDLog's or RECLog's. The segments
+    of each message are joined with spaces, the same as the 80-dash logs.
+    """
+
+    record_separator = MLLP_END_BLOCK
+
+    def _parse(self):
+        # Frames are read from the binary stream under the text one, text mode would turn segment separators into
+        # newlines
+        for frame in read_mllp_frames(self.log_file.buffer):
+            message = ' '.join(segment for segment in HL7_SEGMENT_SEPARATOR.split(frame.decode('latin-1').strip())
+                               if segment)
+            if message:
+                yield message
+
+
+class LogFileType(enum.Enum):
+    """
+    Enum to call the correct log file from the LogFolder class.
+    """
+    BRDTransactionLog = BRDLogFile
+    RECTransactionLog = RECLogFile
+    PASAccessLog = PASLogFile
+
+
+class Suffix(enum.Enum):
+    # todo rework this as cant have to txt suffixes
+    PASAccessLog = 'txt'
+    BRDTransactionLog = 'brd'
+    RECTransactionLog = 'rec'
+
+
+# Files larger than this are split into chunks of about this size when parsing in parallel
+CHUNK_SIZE = 32 * 1024 * 1024
+# Bytes read from the start of a broadcaster or receiver log to tell MLLP captures from 80-dash logs
+SNIFF_SIZE = 64 * 1024
+
+
+def sniff_log_file_class(path: str, log_file_type: str) -> type:
+    """
+    :param log_file_type: Suffix name, eg: 'BRDTransactionLog'
+    :return: the LogFile class that reads the file, MLLPLogFile for broadcaster and receiver logs that hold MLLP
+    frames rather than 80-dash separated messages. 80-dash logs can hold stray MLLP start bytes, so a file is only an
+    MLLP capture if it starts with a frame, or has start bytes and no separator lines
+    """
+    log_file_class = LogFileType[log_file_type].value
+    if issubclass(log_file_class, BRDLogFile):
+        with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as binary_file:
+            data = binary_file.read(SNIFF_SIZE)
+        # Not lstrip(), the start block is whitespace to bytes.strip
+        if data.lstrip(b' \t\r\n').startswith(MLLP_START_BLOCK) or \
+                (MLLP_START_BLOCK in data and BRDLogFile.separator not in data):
+            return MLLPLogFile
+    return log_file_class
+
+
+class LoadCancelled(Exception):
+    """
+    Raised out of LogFolder.run, and out of the logs streamed by LogFolder.iter_logs, once LogFolder.cancel is called.
+    """
+
+
+class ProgressReader(io.RawIOBase):
+    """
+    Binary file wrapper that reports how many bytes have been read from the file on disk, before any decompression,
+    stops reading once the load is cancelled and can stop at a given size, as if the file ended there.
+    """
+
+    def __init__(self, binary_file, on_read: Callable[[int], None] = None, cancelled: threading.Event = None,
+                 size: int = None):
+        """
+        :param binary_file: file opened in binary mode
+        :param on_read: called with the number of bytes read by each read
+        :param cancelled: raises LoadCancelled on the next read once this is set
+        :param size: bytes to read before reporting the end of the file, None reads to the end
+        """
+        super().__init__()
+        self._binary_file = binary_file
+        self._on_read = on_read
+        self._cancelled = cancelled
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._cancelled is not None and self._cancelled.is_set():
+            raise LoadCancelled
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return 0
+            buffer = memoryview(buffer)[:self._remaining]
+        count = self._binary_file.readinto(buffer)
+        if count:
+            if self._remaining is not None:
+                self._remaining -= count
+            if self._on_read is not None:
+                self._on_read(count)
+        return count
+
+    def close(self):
+        self._binary_file.close()
+        super().close()
+
+
+class LogBuffer:
+    """
+    The bytes of a log file, eg: an mmap of it, for LogFile classes that search the bytes rather than reading lines.
+    Reports progress and checks for cancellation as the bytes are scanned, like ProgressReader.
+    """
+    # Bytes scanned between progress reports
+    report_size = 1024 * 1024
+
+    def __init__(self, data, on_read: Callable[[int], None] = None, cancelled: threading.Event = None,
+                 offset: int = 0):
+        """
+        :param data: bytes-like object with find, eg: bytes or an mmap
+        :param on_read: called with the number of bytes scanned since the last call
+        :param cancelled: raises LoadCancelled on the next report once this is set
+        :param offset: where data starts in the log file, for the RawRefs of its logs
+        """
+        self.data = data
+        self.offset = offset
+        self._on_read = on_read
+        self._cancelled = cancelled
+        self._reported = 0
+
+    def read_to(self, position: int) -> None:
+        """
+        Marks the bytes up to position as scanned, callers report every report_size bytes or so.
+        """
+        if self._cancelled is not None and self._cancelled.is_set():
+            raise LoadCancelled
+        if self._on_read is not None and position > self._reported:
+            self._on_read(position - self._reported)
+        self._reported = max(self._reported, position)
+
+
+class RawSource(NamedTuple):
+    """
+    A log file that logs leave their raw text in, and the LogFile class that reads the text back out.
+    """
+    path: str
+    log_file_class: type
+
+
+class RawRef:
+    """
+    Where a log's raw text is in its log file, kept on the log instead of the text when a LogFolder is loaded with
+    raw_refs. The file must be left as it is while the logs are in use.
+    """
+    __slots__ = 'source', 'offset', 'length'
+
+    def __init__(self, source: RawSource, offset: int, length: int):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return f'<RawRef {self.source.path} offset: {self.offset} length: {self.length}>'
+
+    def read(self) -> str:
+        return read_raw(self.source, self.offset, self.length)
+
+
+# Log files kept open by reading_raw, on each thread
+_raw_files = threading.local()
+
+
+@contextmanager
+def reading_raw() -> Iterator[None]:
+    """
+    Keeps the log files RawRefs read from open until the with block ends, rather than opening them for every read, for
+    reading the raw text of many logs, eg: to index or export them. Files are otherwise closed straight away, so log
+    files can still be rotated while their logs are shown.
+    """
+    if getattr(_raw_files, 'files', None) is not None:
+        yield
+        return
+    _raw_files.files = {}
+    try:
+        yield
+    finally:
+        for binary_file in _raw_files.files.values():
+            binary_file.close()
+        _raw_files.files = None
+
+
+@lru_cache(maxsize=1024)
+def read_raw(source: RawSource, offset: int, length: int) -> str:
+    """
+    Reads the raw text of a log back from its log file, the last few hundred logs read, eg: the rows on display, are
+    cached.
+    """
+    files = getattr(_raw_files, 'files', None)
+    if files is None:
+        with open(source.path, 'rb', buffering=0) as binary_file:
+            binary_file.seek(offset)
+            data = binary_file.read(length)
+    else:
+        if source.path not in files:
+            files[source.path] = open(source.path, 'rb', buffering=0)
+        files[source.path].seek(offset)
+        data = files[source.path].read(length)
+    return source.log_file_class.raw_text(data)
+
+
+@contextmanager
+def open_log_file(path: str, on_read: Callable[[int], None] = None, cancelled: threading.Event = None,
+                  size: int = None) -> Iterator[TextIO]:
+    """
+    Opens a log file as a text stream. Gzip compressed files are decompressed as they are read, so nothing is
+    written back to the log folder.
+    :param path: eg: "C:/Users/user/desktop/broadcaster.brd" or "C:/Users/user/desktop/broadcaster.brd.gz"
+    :param on_read: called with the number of bytes read from the file, compressed bytes for gzip files
+    :param cancelled: stops reading the file with LoadCancelled once set
+    :param size: only read this many bytes of the file, compressed bytes for gzip files
+    """
+    with open(path, 'rb') as binary_file:
+        if on_read is not None or cancelled is not None or size is not None:
+            binary_file = io.BufferedReader(ProgressReader(binary_file, on_read, cancelled, size), 256 * 1024)
+        if path.endswith('.gz'):
+            binary_file = gzip.GzipFile(fileobj=binary_file, mode='rb')
+        with io.TextIOWrapper(binary_file, encoding='latin-1', errors='surrogateescape') as log_file:
+            yield log_file
+
+
+@contextmanager
+def open_log_source(path: str, log_file_class: type, on_read: Callable[[int], None] = None,
+                    cancelled: threading.Event = None, size: int = None,
+                    raw_refs: bool = False) -> Iterator[Union[TextIO, LogBuffer]]:
+    """
+    Opens a log file for its LogFile class, as an mmap LogBuffer for uncompressed broadcaster and receiver logs, so
+    they are scanned without reading them line by line, otherwise as a text stream from open_log_file.
+    :param raw_refs: also open uncompressed files as a LogBuffer if the LogFile class can read one, so where each log
+    is in the file is known
+    """
+    buffered = log_file_class.prefers_buffers or raw_refs and log_file_class.reads_buffers
+    if not buffered or path.endswith('.gz'):
+        with open_log_file(path, on_read, cancelled, size) as log_file:
+            yield log_file
+        return
+    with open(path, 'rb') as binary_file:
+        length = os.fstat(binary_file.fileno()).st_size
+        if size is not None:
+            length = min(length, size)
+        if length == 0:
+            # Empty files can't be mapped
+            yield LogBuffer(b'', on_read, cancelled)
+            return
+        with mmap.mmap(binary_file.fileno(), length, access=mmap.ACCESS_READ) as data:
+            yield LogBuffer(data, on_read, cancelled)
+
+
+@dataclass
+class StageStats:
+    """
+    Timings and counters for one stage of loading one log file.
+    stage is 'cache' for looking the file up in the ParseCache, 'parse' for reading and parsing it, 'save' for
+    caching it and 'follow' for reading the logs appended to it by LogFolder.follow.
+    """
+    file: str
+    stage: str
+    seconds: float = 0.0
+    bytes_read: int = 0
+    records: int = 0
+    filtered: int = 0
+    dropped: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, other: 'StageStats') -> None:
+        """
+        Adds the counters of another chunk of the same file and stage.
+        """
+        self.seconds += other.seconds
+        self.bytes_read += other.bytes_read
+        self.records += other.records
+        self.filtered += other.filtered
+        for error, count in other.dropped.items():
+            self.dropped[error] = self.dropped.get(error, 0) + count
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_read / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return dict(asdict(self), records_per_second=self.records_per_second, bytes_per_second=self.bytes_per_second)
+
+
+def read_log_file(path: str, file_attributes: Tuple[str, str], chunk: Tuple[int, Optional[int]] = (0, None),
+                  record_filter: 'Query' = None, on_read: Callable[[int], None] = None,
+                  cancelled: threading.Event = None, size: int = None,
+                  raw_refs: bool = False) -> Tuple[tuple, List[Log], StageStats]:
+    """
+    Parses a log file, or a chunk of one, into its logs. Module level so it can run in the LogFolder process pool.
+    :param path: path of the log file
+    :param file_attributes: (name, log file type) passed on to the LogFile
+    :param chunk: (start, end) byte range starting on a record boundary, end of None reads the whole file
+    :param record_filter: only returns the logs that pass it
+    :param on_read: called with the number of bytes read as a whole file is read, for progress
+    :param cancelled: stops reading a whole file with LoadCancelled once set
+    :param size: size of the file when it was found, anything appended since is left for LogFolder.follow
+    :param raw_refs: logs of uncompressed files keep a RawRef rather than their raw text
+    :return: (header, logs, parse stats)
+    """
+    started = perf_counter()
+    log_file_class = sniff_log_file_class(path, file_attributes[1])
+    raw_source = RawSource(os.path.abspath(path), log_file_class) if raw_refs and not path.endswith('.gz') else None
+    start, end = chunk
+    if end is None:
+        with open_log_source(path, log_file_class, on_read, cancelled, size, raw_refs) as log_file:
+            log_file = log_file_class(file_attributes, log_file, record_filter=record_filter, raw_source=raw_source)
+        bytes_read = os.path.getsize(path) if size is None else size
+    else:
+        length = end - start + len(log_file_class.record_separator) - 1
+        if size is not None:
+            length = min(length, size - start)
+        with open(path, 'rb') as binary_file:
+            binary_file.seek(start)
+            # Read on into the next chunk's separator, so the last record of this chunk is terminated
+            data = binary_file.read(length)
+        if log_file_class.prefers_buffers or raw_source is not None and log_file_class.reads_buffers:
+            source = LogBuffer(data, offset=start)
+        else:
+            source = io.TextIOWrapper(io.BytesIO(data), encoding='latin-1', errors='surrogateescape')
+        log_file = log_file_class(file_attributes, source, record_filter=record_filter, raw_source=raw_source)
+        bytes_read = end - start
+    stats = StageStats(basename(path), 'parse', perf_counter() - started, bytes_read, len(log_file._logs),
+                       log_file.filtered, dict(log_file.dropped))
+    return log_file.header, log_file._logs, stats
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed log files, one cache file per log file. A cache file holds a pickled fingerprint of the
+    source file (path, size and modification time) followed by its zlib compressed, pickled header and logs.
+    Changed files no longer match their fingerprint, so they are parsed again.
+    """
+    # Bump when the Log classes change shape, or an unchanged file parses to different logs, so stale pickles are
+    # parsed again rather than loaded
+    version = 6
+
+    def __init__(self, directory: str = None):
+        """
+        :param directory: folder to keep the cache files in, defaults to ~/.logapp/cache
+        """
+        self._directory = directory or join(os.path.expanduser('~'), '.logapp', 'cache')
+
+    def __repr__(self):
+        return f'<ParseCache Path: "{self._directory}" >'
+
+    @staticmethod
+    def fingerprint(path: str) -> Tuple[str, int, int]:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def _cache_path(self, path: str, log_file_type: str, raw_refs: bool = False) -> str:
+        key = f'{log_file_type}|{os.path.abspath(path)}'
+        if raw_refs:
+            # Logs read with raw_refs hold RawRefs rather than their raw text, they are cached apart from the others
+            key = f'{key}|raw_refs'
+        key = hashlib.sha1(key.encode('utf-8', 'surrogateescape'))
+        return join(self._directory, f'{key.hexdigest()}.cache')
+
+    def get(self, path: str, log_file_type: str, fingerprint: Tuple[str, int, int],
+            raw_refs: bool = False) -> Optional[Tuple[tuple, List[Log]]]:
+        """
+        Loads the cached header and logs of a log file.
+        :param raw_refs: load the logs cached when the file was read with raw_refs
+        :return: (header, logs), or None if the file isn't cached or has changed since it was cached
+        """
+        try:
+            with open(self._cache_path(path, log_file_type, raw_refs), 'rb') as cache_file:
+                if pickle.load(cache_file) != (self.version, fingerprint):
+                    return None
+                return pickle.loads(zlib.decompress(cache_file.read()))
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, zlib.error, AttributeError, ValueError):
+            # Corrupt or out of date cache file, parse the log file again
+            return None
+
+    def put(self, path: str, log_file_type: str, fingerprint: Tuple[str, int, int], header: tuple,
+            logs: List[Log], raw_refs: bool = False) -> None:
+        """
+        Saves the header and logs of a log file. The fingerprint should be taken before the file is parsed, so a file
+        that changes while it is being parsed is not cached as unchanged.
+        :param raw_refs: the file was read with raw_refs
+        """
+        os.makedirs(self._directory, exist_ok=True)
+        cache_path = self._cache_path(path, log_file_type, raw_refs)
+        with open(f'{cache_path}.tmp', 'wb') as cache_file:
+            pickle.dump((self.version, fingerprint), cache_file, pickle.HIGHEST_PROTOCOL)
+            cache_file.write(zlib.compress(pickle.dumps((header, logs), pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(f'{cache_path}.tmp', cache_path)
+
+
+class LogFolder:
+    """
+    Folder level class that contains a list of log files, each logfile contains logs.
+    """
+
+    def __init__(self, directory_path: str, log_file_suffix: Suffix, workers: int = 1, cache: ParseCache = None,
+                 record_filter: 'Query' = None, on_stats: Callable[[StageStats], None] = None,
+                 on_file: Callable[[str, tuple, List[Log]], None] = None, raw_refs: bool = False):
+        """
+        Takes the given directory path and checks it for the file suffix provided, then uses the search word list to
+        filter the logs.
+        :param directory_path: eg: "C:/Users/user/desktop"
+        :param log_file_suffix: log file extension
+        :param workers: number of processes used to parse the log files, 1 parses them in the calling thread
+        :param cache: loads unchanged files from the cache instead of parsing them, None parses every file
+        :param record_filter: only loads the logs that pass it, filtered files are read from but never saved to the
+        cache
+        :param on_stats: called with the StageStats of each stage of each file as it finishes, on the loading thread
+        :param on_file: called with the name, header and logs of each file as soon as it is loaded, on the loading
+        thread. Files are announced in the order they finish, LogFolder.logs keeps them in folder order. follow calls
+        it again with the logs appended to a file
+        :param raw_refs: logs of uncompressed files keep where their raw text is in the file rather than the text, it's
+        read back when it's shown, searched or exported. Saves most of the memory of the logs, as long as the files
+        aren't changed, other than being appended to, while the logs are in use
+        """
+        self._path = directory_path
+        self._log_file_suffix = log_file_suffix.value
+        self._log_file_type = log_file_suffix.name
+        self._workers = workers
+        self._cache = cache
+        self._record_filter = record_filter or None
+        self._on_stats = on_stats
+        self.on_file = on_file
+        self._raw_refs = raw_refs
+        self.stats: List[StageStats] = []
+        self._fingerprints = {}
+        # Size of each file when it was loaded, and the byte offset follow has read whole records up to
+        self._sizes = {}
+        self._offsets = {}
+        self._log_file_classes = {}
+        self._files = []
+        self.logs = {}
+        self.filtered_logs = {}
+        # Progress is counted in bytes read from disk, so large and compressed files move the bar at the same rate
+        self._progress_max = max(1, sum(os.path.getsize(join(self._path, file)) for file in listdir(self._path)
+                                        if self._is_log_file(file) and isfile(join(self._path, file))))
+        self._progress_min = 0
+        self._current_progress = 0
+        self._started = None
+        self._cancelled = threading.Event()
+        self.header = None
+
+    def run(self):
+        """
+        Loads every log file in the folder.
+        :raises LoadCancelled: if cancel is called before the load finishes, the files loaded so far are kept
+        """
+        self._started = perf_counter()
+        self._find_available_files()
+        if self._workers > 1:
+            self._create_log_files_parallel()
+        else:
+            self._create_log_files()
+
+    def iter_logs(self) -> Iterator[Log]:
+        """
+        Streams the logs of every file in the folder as each file is read, without keeping them on the LogFolder, so
+        folders too big to load can be filtered and exported. LogFolder.header is set straight away, so it can be
+        written out before the first log.
+        """
+        self.header = LogType[self._log_file_type.upper()].value.header()
+        self._started = perf_counter()
+        self._find_available_files()
+        return self._iter_logs()
+
+    def _iter_logs(self) -> Iterator[Log]:
+        for file in self._files:
+            log_file_class = self._log_file_class(file)
+            # Streamed parse times include the time the caller spends on each log
+            started = perf_counter()
+            stats = StageStats(file, 'parse', bytes_read=os.path.getsize(join(self._path, file)))
+            with open_log_source(join(self._path, file), log_file_class, self._update_progress,
+                                 self._cancelled) as log_file:
+                log_file = log_file_class(self._file_attributes(file), log_file, lazy=True,
+                                          record_filter=self._record_filter)
+                for log in log_file:
+                    stats.records += 1
+                    yield log
+            stats.seconds = perf_counter() - started
+            stats.filtered = log_file.filtered
+            stats.dropped = dict(log_file.dropped)
+            self._record_stats(stats)
+
+    def _record_stats(self, stats: StageStats) -> None:
+        self.stats.append(stats)
+        if self._on_stats is not None:
+            self._on_stats(stats)
+
+    def report(self) -> List[dict]:
+        """
+        Timings and counters of each stage of loading each file, in the order the stages finished.
+        eg: [{'file': 'broadcaster.brd', 'stage': 'parse', 'seconds': 1.5, 'bytes_read': 52428800, 'records': 100000,
+        'filtered': 0, 'dropped': {'ValueError': 2}, 'records_per_second': 66666.7, 'bytes_per_second': 34952533.3}]
+        """
+        return [stats.to_dict() for stats in self.stats]
+
+    def _update_progress(self, bytes_read: int):
+        self._current_progress += bytes_read
+
+    def get_progress(self):
+        """
+        :return: bytes read so far, out of LogFolder.progress_max
+        """
+        return self._current_progress
+
+    def eta(self) -> Optional[float]:
+        """
+        :return: estimated seconds until the load finishes, from the rate bytes have been read so far, or None before
+        any have been read
+        """
+        if self._started is None or self._current_progress == 0:
+            return None
+        elapsed = perf_counter() - self._started
+        return max(0.0, elapsed * (self._progress_max - self._current_progress) / self._current_progress)
+
+    def cancel(self) -> None:
+        """
+        Stops a load running on another thread, the load raises LoadCancelled at the next read or between files.
+        """
+        self._cancelled.set()
+
+    def _check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise LoadCancelled
+
+    def __repr__(self):
+        return f'<LogFolder Path: "{self._path}" Type: "{self._log_file_type}" >'
+
+    def _find_available_files(self) -> None:
+        """
+        Find all files in the provided directory with the provided suffix, including gzip compressed files.
+        """
+        for file in listdir(self._path):
+            if isfile(join(self._path, file)):
+                if self._is_log_file(file) and file not in self._sizes:
+                    self._files.append(file)
+                    # Logs appended after this are left for follow, so none are read twice
+                    self._sizes[file] = os.path.getsize(join(self._path, file))
+
+    def _log_file_class(self, file) -> type:
+        if file not in self._log_file_classes:
+            path = join(self._path, file)
+            if os.path.getsize(path) == 0:
+                # Nothing written yet to tell which kind of log it is
+                return LogFileType[self._log_file_type].value
+            self._log_file_classes[file] = sniff_log_file_class(path, self._log_file_type)
+        return self._log_file_classes[file]
+
+    @staticmethod
+    def _decompressed_name(file) -> str:
+        """
+        Gzip compressed files are named as they were when they were extracted to disk, file.txt for file.gz, so a
+        compressed file without the suffix in its name, eg: access.1.gz, is still read as a PAS access log.
+        """
+        return f'{file[:-2]}txt' if file.endswith('.gz') else file
+
+    def _is_log_file(self, file) -> bool:
+        return self._log_file_suffix in self._decompressed_name(file)
+
+    def _file_attributes(self, file) -> Tuple[str, str]:
+        name = self._decompressed_name(file)
+        return name[:name.index(self._log_file_suffix) - 1], self._log_file_type
+
+    def _file_loaded(self, file, header, logs) -> None:
+        if self.header is None:
+            self.header = header
+        if self.on_file is not None:
+            self.on_file(self._file_attributes(file)[0], header, logs)
+
+    def _add_log_file(self, file, header, logs) -> None:
+        # todo raise custom error to remove the wrong long types, if there are multiple logs that use
+        # todo the same file suffix
+        if self.header is None:
+            self.header = header
+        self.logs[self._file_attributes(file)[0]] = logs
+
+    def _load_cached(self, file) -> Optional[Tuple[tuple, List[Log]]]:
+        """
+        Loads a file from the cache, recording its fingerprint so it can be cached once parsed if it isn't.
+        """
+        if self._cache is None:
+            return None
+        started = perf_counter()
+        path = join(self._path, file)
+        self._fingerprints[file] = self._cache.fingerprint(path)
+        # A file is parsed as it was when fingerprinted, so a cached file always holds the logs its fingerprint says
+        self._sizes[file] = self._fingerprints[file][1]
+        result = self._cache.get(path, self._log_file_type, self._fingerprints[file], self._raw_refs)
+        if result is not None and self._record_filter is not None:
+            header, logs = result
+            result = header, [log for log in logs if self._record_filter(log)]
+        self._record_stats(StageStats(file, 'cache', perf_counter() - started, records=len(result[1]) if result else 0))
+        return result
+
+    def _save_cached(self, file, header, logs) -> None:
+        # Filtered files are missing logs, so caching them would hide those logs from later unfiltered reads
+        if self._cache is not None and self._record_filter is None:
+            started = perf_counter()
+            self._cache.put(join(self._path, file), self._log_file_type, self._fingerprints[file], header, logs,
+                            self._raw_refs)
+            self._record_stats(StageStats(file, 'save', perf_counter() - started, records=len(logs)))
+
+    def _create_log_files(self) -> None:
+        """
+        Opens each file in the LogFolder._files list and creates a log file
+        """
+        for file in self._files:
+            self._check_cancelled()
+            result = self._load_cached(file)
+            if result is None:
+                header, logs, stats = read_log_file(join(self._path, file), self._file_attributes(file),
+                                                    record_filter=self._record_filter,
+                                                    on_read=self._update_progress, cancelled=self._cancelled,
+                                                    size=self._sizes[file], raw_refs=self._raw_refs)
+                stats.file = file
+                self._record_stats(stats)
+                result = header, logs
+                self._save_cached(file, *result)
+            else:
+                self._update_progress(os.path.getsize(join(self._path, file)))
+            self._file_loaded(file, *result)
+            self._add_log_file(file, *result)
+
+    def _chunk_file(self, file) -> List[Tuple[int, Optional[int]]]:
+        """
+        Splits a large uncompressed file into byte ranges that each start on a record boundary. Compressed and small
+        files are read whole.
+        """
+        path = join(self._path, file)
+        size = self._sizes[file] if file in self._sizes else os.path.getsize(path)
+        if file.endswith('.gz') or size <= CHUNK_SIZE:
+            return [(0, None)]
+        separator = self._log_file_class(file).record_separator
+        boundaries = [0]
+        with open(path, 'rb') as binary_file, mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while boundaries[-1] + CHUNK_SIZE < size:
+                position = data.find(separator, boundaries[-1] + CHUNK_SIZE, size)
+                if position == -1:
+                    break
+                boundaries.append(position + 1)
+        boundaries.append(size)
+        return list(zip(boundaries, boundaries[1:]))
+
+    def _create_log_files_parallel(self) -> None:
+        """
+        Parses the files in the LogFolder._files list in a process pool. Large files are split into chunks, the
+        chunks of each file are put back in order once they have all been parsed. The parse seconds of a chunked file
+        are the total of its chunks, which can be more than the wall time when they run side by side.
+        """
+        cached = {}
+        for file in self._files:
+            self._check_cancelled()
+            cached[file] = self._load_cached(file)
+            if cached[file] is not None:
+                self._update_progress(os.path.getsize(join(self._path, file)))
+                self._file_loaded(file, *cached[file])
+        chunks = {file: self._chunk_file(file) for file in self._files if cached[file] is None}
+        results = {file: [None] * len(file_chunks) for file, file_chunks in chunks.items()}
+        loaded = {}
+        remaining = {file: len(file_chunks) for file, file_chunks in chunks.items()}
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            futures = {executor.submit(read_log_file, join(self._path, file), self._file_attributes(file), chunk,
+                                       self._record_filter, size=self._sizes[file], raw_refs=self._raw_refs):
+                       (file, index)
+                       for file, file_chunks in chunks.items() for index, chunk in enumerate(file_chunks)}
+            pending = set(futures)
+            while pending:
+                # Wake up regularly to check for cancellation, workers can't see the cancelled event
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                self._check_cancelled()
+                for future in done:
+                    file, index = futures[future]
+                    results[file][index] = future.result()
+                    # Workers can't report bytes as they read, so progress moves on a chunk at a time
+                    self._update_progress(results[file][index][2].bytes_read)
+                    remaining[file] -= 1
+                    if remaining[file] == 0:
+                        stats = StageStats(file, 'parse')
+                        for header, logs, chunk_stats in results[file]:
+                            stats.add(chunk_stats)
+                        self._record_stats(stats)
+                        header = next((header for header, logs, stats in results[file] if header is not None), None)
+                        loaded[file] = header, [log for header, logs, stats in results[file] for log in logs]
+                        self._file_loaded(file, *loaded[file])
+        finally:
+            # Don't wait for chunks still being parsed when the load was cancelled
+            executor.shutdown(wait=not self._cancelled.is_set(), cancel_futures=True)
+        for file in self._files:
+            if cached[file] is not None:
+                self._add_log_file(file, *cached[file])
+                continue
+            self._save_cached(file, *loaded[file])
+            self._add_log_file(file, *loaded[file])
+
+    def follow(self) -> Dict[str, List[Log]]:
+        """
+        Reads the logs appended to the log files since they were loaded, or since the last call, for logs that are
+        still being written. Only whole records are read, a message still being written is read by a later call
+        once the separator after it has been written. Files added to the folder are read from the start, and a file
+        that has shrunk has been replaced, so it is read again from the start. Files that have been deleted, eg: by
+        log retention, are no longer followed and keep the logs already read from them. Gzip compressed files are
+        finished logs and aren't followed.
+        :return: the logs appended to each file that has new logs, they are also added to LogFolder.logs and passed
+        to on_file
+        """
+        for file in [file for file in self._files if not isfile(join(self._path, file))]:
+            self._files.remove(file)
+            for file_state in (self._offsets, self._sizes, self._log_file_classes, self._fingerprints):
+                file_state.pop(file, None)
+        for file in self._files:
+            if file not in self._offsets and not file.endswith('.gz'):
+                # Loaded up to its size when it was found, less the message that was still being written
+                self._offsets[file] = self._record_boundary(file, 0, self._sizes[file])
+        self._find_available_files()
+        appended = {}
+        for file in self._files:
+            if file.endswith('.gz'):
+                continue
+            path = join(self._path, file)
+            self._offsets.setdefault(file, 0)
+            size = os.path.getsize(path)
+            if size < self._offsets[file]:
+                self._offsets[file] = 0
+            start = self._offsets[file]
+            end = self._record_boundary(file, start, size)
+            if end == start:
+                continue
+            header, logs, stats = read_log_file(path, self._file_attributes(file), (start, end), self._record_filter,
+                                                raw_refs=self._raw_refs)
+            stats.file, stats.stage = file, 'follow'
+            self._record_stats(stats)
+            self._offsets[file] = end
+            name = self._file_attributes(file)[0]
+            # A new list rather than extending in place, on_file listeners may still be reading the old one
+            self.logs[name] = self.logs.get(name, []) + logs
+            if logs:
+                appended[name] = logs
+                self._file_loaded(file, header, logs)
+        return appended
+
+    def _record_boundary(self, file: str, start: int, end: int) -> int:
+        """
+        :return: the offset of the record after the last whole record between start and end, start if there are none
+        """
+        if end <= start:
+            return start
+        path = join(self._path, file)
+        separator = self._log_file_class(file).record_separator
+        with open(path, 'rb') as binary_file, mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = data.rfind(separator, start, end)
+        return start if position == -1 else position + 1
+
+    @property
+    def log_list(self) -> List[Log]:
+        logs = self.filtered_logs if self.filtered_logs else self.logs
+        return [log for file_logs in logs.values() for log in file_logs]
+
+    @property
+    def log_file_type(self):
+        return self._log_file_type
+
+    @property
+    def progress_max(self):
+        return self._progress_max
+
+    @property
+    def files(self) -> List[str]:
+        return list(self._files)
+
+
+# Words in a log's raw text, and search terms with an optional trailing * for prefix matching
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+SEARCH_TERM_PATTERN = re.compile(r'[0-9a-z]+\*?')
+
+
+def index_key(value):
+    """
+    Normalises a UR or visit number for the LogIndex, so '0012345', '12345' and 12345 all find the same logs.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def in_time_range(timestamp: Optional[datetime], start: datetime = None, end: datetime = None) -> bool:
+    """
+    :param start: inclusive, None for no lower bound
+    :param end: inclusive, None for no upper bound
+    :return: False for logs without a timestamp
+    """
+    if timestamp is None:
+        return False
+    return (start is None or start <= timestamp) and (end is None or timestamp <= end)
+
+
+class Query(ABC):
+    """
+    A filter over logs that can be combined with others, eg: (UrNumber('123') | VisitNumber('456')) & Search('smith').
+    A query finds its logs in a LogIndex with positions, or checks one log at a time as it is parsed with might_match
+    and then by calling it with the log.
+    """
+
+    def positions(self, index: 'LogIndex') -> Iterable[int]:
+        """
+        :return: positions of the matching logs in the index
+        """
+        return [position for position, log in enumerate(index.logs) if self(log)]
+
+    def cost(self, index: 'LogIndex') -> int:
+        """
+        :return: about how many logs match, so And can start from the query that leaves the fewest candidates
+        """
+        return len(index)
+
+    def mask(self, index: 'LogIndex') -> 'np.ndarray':
+        """
+        :return: bool array, True for the matching logs, for a columnar index
+        """
+        mask = np.zeros(len(index), dtype=bool)
+        mask[np.fromiter(self.positions(index), dtype=np.int64)] = True
+        return mask
+
+    def might_match(self, raw: str) -> bool:
+        """
+        Cheap check of a log's raw text before it is parsed. False means the log can't match, True means it might.
+        """
+        return True
+
+    @abstractmethod
+    def __call__(self, log: Log) -> bool:
+        """
+        :return: whether the log matches
+        """
+
+    def __and__(self, other: 'Query') -> 'Query':
+        return And(self, other)
+
+    def __or__(self, other: 'Query') -> 'Query':
+        return Or(self, other)
+
+
+class UrNumber(Query):
+    def __init__(self, *ur_numbers):
+        self.keys = {index_key(ur_number) for ur_number in ur_numbers}
+        # '0012345' is indexed as 12345, so look for the digits without leading zeros in the raw text
+        self._raw_keys = {str(key) for key in self.keys}
+
+    def positions(self, index):
+        return index.ur_number_positions(self.keys)
+
+    def cost(self, index):
+        return index.ur_number_count(self.keys)
+
+    def mask(self, index):
+        return index.columns.isin('ur_number', self.keys)
+
+    def might_match(self, raw):
+        return any(key in raw for key in self._raw_keys)
+
+    def __call__(self, log):
+        return index_key(log.ur_number) in self.keys
+
+
+class VisitNumber(UrNumber):
+    def positions(self, index):
+        return index.visit_number_positions(self.keys)
+
+    def cost(self, index):
+        return index.visit_number_count(self.keys)
+
+    def mask(self, index):
+        return index.columns.isin('visit_number', self.keys)
+
+    def __call__(self, log):
+        return index_key(log.visit_number) in self.keys
+
+
+class MessageType(Query):
+    """
+    HL7 message types, eg: 'A01', logs without a message type never match.
+    """
+
+    def __init__(self, *message_types):
+        self.keys = {message_type.strip().upper() for message_type in message_types}
+
+    def positions(self, index):
+        return index.message_type_positions(self.keys)
+
+    def cost(self, index):
+        return index.message_type_count(self.keys)
+
+    def mask(self, index):
+        return index.columns.isin('message_type', self.keys)
+
+    def might_match(self, raw):
+        return any(key in raw for key in self.keys)
+
+    def __call__(self, log):
+        return getattr(log, 'message_type', None) in self.keys
+
+
+class Search(Query):
+    """
+    Logs whose raw text contains every word of the search query, a word ending in * matches any word that starts
+    with it. eg: "smith 4east msg12*". A query without any words, eg: "-", matches every log, filter_query leaves it
+    out.
+    """
+
+    def __init__(self, search_query: str):
+        self.search_query = search_query
+        self.terms = set(SEARCH_TERM_PATTERN.findall(search_query.lower()))
+        self._raw_terms = {term.rstrip('*') for term in self.terms}
+
+    def positions(self, index):
+        if not self.terms:
+            return range(len(index))
+        return index.search_positions(self.search_query)
+
+    def cost(self, index):
+        if not self.terms:
+            return len(index)
+        return index.search_count(self.search_query)
+
+    def might_match(self, raw):
+        raw = raw.lower()
+        return all(term in raw for term in self._raw_terms)
+
+    def __call__(self, log):
+        words = set(TOKEN_PATTERN.findall(log.raw.lower()))
+        for term in self.terms:
+            if term.endswith('*'):
+                if not any(word.startswith(term[:-1]) for word in words):
+                    return False
+            elif term not in words:
+                return False
+        return True
+
+
+class TimeRange(Query):
+    """
+    Logs with a timestamp from start to end inclusive, either end can be left open with None.
+    """
+
+    def __init__(self, start: datetime = None, end: datetime = None):
+        self.start = start
+        self.end = end
+
+    def positions(self, index):
+        return index.time_range_positions(self.start, self.end)
+
+    def cost(self, index):
+        return index.time_range_count(self.start, self.end)
+
+    def mask(self, index):
+        return index.columns.between(self.start, self.end)
+
+    def __call__(self, log):
+        return in_time_range(log.timestamp, self.start, self.end)
+
+
+class And(Query):
+    """
+    Logs that match every query, an And of no queries matches every log and is falsy.
+    """
+
+    def __init__(self, *queries: Query):
+        self.queries = queries
+
+    def __bool__(self):
+        return bool(self.queries)
+
+    def positions(self, index):
+        if not self.queries:
+            return range(len(index))
+        queries = sorted(self.queries, key=lambda query: query.cost(index))
+        candidates = set(queries[0].positions(index))
+        for query in queries[1:]:
+            if not candidates:
+                break
+            if len(candidates) < query.cost(index):
+                # Fewer candidates left than the query would find, check them directly
+                logs = index.logs
+                candidates = {position for position in candidates if query(logs[position])}
+            else:
+                candidates.intersection_update(query.positions(index))
+        return candidates
+
+    def cost(self, index):
+        return min((query.cost(index) for query in self.queries), default=len(index))
+
+    def mask(self, index):
+        mask = np.ones(len(index), dtype=bool)
+        for query in self.queries:
+            if not mask.any():
+                break
+            mask &= query.mask(index)
+        return mask
+
+    def might_match(self, raw):
+        return all(query.might_match(raw) for query in self.queries)
+
+    def __call__(self, log):
+        return all(query(log) for query in self.queries)
+
+
+class Or(Query):
+    """
+    Logs that match any of the queries.
+    """
+
+    def __init__(self, *queries: Query):
+        self.queries = queries
+
+    def positions(self, index):
+        return set(chain.from_iterable(query.positions(index) for query in self.queries))
+
+    def cost(self, index):
+        return min(len(index), sum(query.cost(index) for query in self.queries))
+
+    def mask(self, index):
+        mask = np.zeros(len(index), dtype=bool)
+        for query in self.queries:
+            mask |= query.mask(index)
+        return mask
+
+    def might_match(self, raw):
+        return any(query.might_match(raw) for query in self.queries)
+
+    def __call__(self, log):
+        return any(query(log) for query in self.queries)
+
+
+def filter_query(ur_numbers: Iterable = (), visit_numbers: Iterable = (), search_query: str = '',
+                 start: datetime = None, end: datetime = None, message_types: Iterable = (),
+                 match_any: bool = False) -> Query:
+    """
+    Builds the query for the filters the GUI and command line offer, empty filters are left out.
+    :param match_any: match logs that pass any of the filters, rather than all of them
+    :return: a falsy query that matches every log if every filter is empty
+    """
+    queries = []
+    if ur_numbers:
+        queries.append(UrNumber(*ur_numbers))
+    if visit_numbers:
+        queries.append(VisitNumber(*visit_numbers))
+    if message_types:
+        queries.append(MessageType(*message_types))
+    if SEARCH_TERM_PATTERN.search(search_query.lower()):
+        queries.append(Search(search_query))
+    if start is not None or end is not None:
+        queries.append(TimeRange(start, end))
+    if match_any and queries:
+        # Wrapped in an And so only an empty query is falsy
+        return And(Or(*queries))
+    return And(*queries)
+
+
+class LogColumns:
+    """
+    The columns of a columnar LogIndex held in NumPy arrays, one row per log, so filters and counts are mask
+    operations over whole columns rather than a loop over the logs. Message ids, UR and visit numbers are int64
+    columns of their index keys, keys that aren't whole numbers are dictionary encoded as negative codes. Ward, message
+    type and user are dictionary encoded, a column of codes into the distinct values. Timestamps are a datetime64
+    column, NaT for logs without one. Columns a log type doesn't have hold None.
+    """
+    numbers = 'message_id', 'ur_number', 'visit_number'
+    strings = 'ward', 'message_type', 'user'
+
+    def __init__(self):
+        self._length = 0
+        # Arrays grow by doubling, the rows past _length are unused
+        self._columns = {name: np.empty(1024, dtype=np.int64) for name in self.numbers}
+        self._columns.update({name: np.empty(1024, dtype=np.int32) for name in self.strings})
+        self._columns['timestamp'] = np.empty(1024, dtype='datetime64[us]')
+        # Distinct values of the dictionary encoded columns, and the code of each value
+        self._values = {name: [] for name in self.numbers + self.strings}
+        self._codes = {name: {} for name in self.numbers + self.strings}
+
+    def __len__(self):
+        return self._length
+
+    def _encode(self, name: str, value, add: bool = True) -> Optional[int]:
+        """
+        :param add: give a value that hasn't been seen a new code, rather than returning None
+        :return: the column value of a log value
+        """
+        if name in self.numbers:
+            value = index_key(value)
+            if isinstance(value, int) and 0 <= value < 2 ** 63:
+                return value
+        code = self._codes[name].get(value)
+        if code is None:
+            if not add:
+                return None
+            code = self._codes[name][value] = len(self._values[name])
+            self._values[name].append(value)
+        return -1 - code if name in self.numbers else code
+
+    def _decode(self, name: str, value: int):
+        if name in self.numbers:
+            return value if value >= 0 else self._values[name][-1 - value]
+        return self._values[name][value]
+
+    def add(self, logs: List[Log]) -> None:
+        """
+        Adds the logs to the end of the columns.
+        """
+        end = self._length + len(logs)
+        if end > len(self._columns['timestamp']):
+            for name, column in self._columns.items():
+                grown = np.empty(max(end, 2 * len(column)), dtype=column.dtype)
+                grown[:self._length] = column[:self._length]
+                self._columns[name] = grown
+        for name in self.numbers + self.strings:
+            encode = partial(self._encode, name)
+            self._columns[name][self._length:end] = [encode(getattr(log, name, None)) for log in logs]
+        self._columns['timestamp'][self._length:end] = [log.timestamp for log in logs]
+        self._length = end
+
+    def column(self, name: str) -> 'np.ndarray':
+        return self._columns[name][:self._length]
+
+    def isin(self, name: str, values: Iterable) -> 'np.ndarray':
+        """
+        :return: bool array, True for the logs with any of the values in the column
+        """
+        codes = [code for code in (self._encode(name, value, add=False) for value in values) if code is not None]
+        if not codes:
+            return np.zeros(self._length, dtype=bool)
+        if len(codes) == 1:
+            return self.column(name) == codes[0]
+        return np.isin(self.column(name), codes)
+
+    def between(self, start: datetime = None, end: datetime = None) -> 'np.ndarray':
+        """
+        :return: bool array, True for the logs with a timestamp from start to end inclusive
+        """
+        timestamps = self.column('timestamp')
+        mask = ~np.isnat(timestamps)
+        if start is not None:
+            mask &= timestamps >= np.datetime64(start, 'us')
+        if end is not None:
+            mask &= timestamps <= np.datetime64(end, 'us')
+        return mask
+
+    def value_counts(self, name: str, positions: Iterable[int] = None) -> Dict[object, int]:
+        """
+        :param positions: only count these logs, None counts every log
+        :return: number of logs with each value of the column, numbers are counted by their index key
+        """
+        column = self.column(name)
+        if positions is not None:
+            column = column[np.fromiter(positions, dtype=np.int64)]
+        if name in self.numbers:
+            values, counts = np.unique(column, return_counts=True)
+        else:
+            counts = np.bincount(column, minlength=len(self._values[name]))
+            values = np.flatnonzero(counts)
+            counts = counts[values]
+        return {self._decode(name, value): count for value, count in zip(values.tolist(), counts.tolist())}
+
+
+class LogIndex:
+    """
+    Hash indexes over the logs of a LogFolder. Logs are numbered in the order they are added, each index maps a key
+    to the ascending positions of the logs that have it. The word index is an inverted index of the lower cased
+    words in each log's raw text, used by the anywhere search. A columnar index keeps the other columns in NumPy
+    arrays instead of hash indexes, see LogColumns, so queries can be answered with masks.
+    """
+    # New words inserted one at a time into the sorted vocabulary, more than this are merged in with a sort
+    vocabulary_inserts = 64
+
+    def __init__(self, columnar: bool = False):
+        """
+        :param columnar: keep the columns in LogColumns, needs NumPy
+        """
+        if columnar:
+            load_numpy()
+        self.logs = []
+        self.columns = LogColumns() if columnar else None
+        self._run_starts = []
+        self._run_names = []
+        self._ur_numbers = defaultdict(list)
+        self._visit_numbers = defaultdict(list)
+        self._message_types = defaultdict(list)
+        self._words = defaultdict(partial(array, 'I'))
+        self._vocabulary = None
+        # Timestamps in ascending order and the positions of their logs, sorted on the first time range lookup
+        self._timestamps = None
+        self._timestamp_positions = None
+
+    def __len__(self):
+        return len(self.logs)
+
+    def add(self, name: str, logs: List[Log]) -> None:
+        """
+        Adds the logs of a log file to the end of the index.
+        :param name: log file name, used to group search results
+        :param logs: logs in file order
+        """
+        start = len(self.logs)
+        self._run_starts.append(start)
+        self._run_names.append(name)
+        words = self._words
+        new_words = []
+        if self.columns is not None:
+            self.columns.add(logs)
+        with reading_raw():
+            for position, log in enumerate(logs, start):
+                if self.columns is None:
+                    self._ur_numbers[index_key(log.ur_number)].append(position)
+                    self._visit_numbers[index_key(log.visit_number)].append(position)
+                    self._message_types[getattr(log, 'message_type', None)].append(position)
+                for word in set(TOKEN_PATTERN.findall(log.raw.lower())):
+                    word_positions = words.get(word)
+                    if word_positions is None:
+                        word_positions = words[word] = array('I')
+                        new_words.append(word)
+                    word_positions.append(position)
+        self.logs.extend(logs)
+        if self._vocabulary is not None and new_words:
+            # Keep the sorted vocabulary rather than sorting it again on the next prefix search
+            if len(new_words) <= self.vocabulary_inserts:
+                for word in new_words:
+                    insort(self._vocabulary, word)
+            else:
+                # Two sorted runs, merged in linear time by the sort
+                self._vocabulary.extend(sorted(new_words))
+                self._vocabulary.sort()
+        if self._timestamps is not None and self.columns is None:
+            # Followed logs are appended in time order, so they can extend the sorted timestamps without a re-sort
+            appended = [(log.timestamp, position) for position, log in enumerate(logs, start)
+                        if log.timestamp is not None]
+            if all(earlier[0] <= later[0] for earlier, later in zip(appended, appended[1:])) and \
+                    (not appended or not self._timestamps or self._timestamps[-1] <= appended[0][0]):
+                self._timestamps.extend(timestamp for timestamp, position in appended)
+                self._timestamp_positions.extend(position for timestamp, position in appended)
+            else:
+                self._timestamps = None
+                self._timestamp_positions = None
+
+    @staticmethod
+    def _lookup(index: Dict[object, List[int]], keys: Iterable) -> List[int]:
+        return sorted(set(chain.from_iterable(index.get(index_key(key), ()) for key in keys)))
+
+    @staticmethod
+    def _count(index: Dict[object, List[int]], keys: Iterable) -> int:
+        return sum(len(index.get(index_key(key), ())) for key in set(keys))
+
+    def _column_positions(self, name: str, keys: Iterable) -> List[int]:
+        return np.flatnonzero(self.columns.isin(name, keys)).tolist()
+
+    def _column_count(self, name: str, keys: Iterable) -> int:
+        return int(np.count_nonzero(self.columns.isin(name, keys)))
+
+    def ur_number_positions(self, ur_numbers: Iterable) -> List[int]:
+        if self.columns is not None:
+            return self._column_positions('ur_number', ur_numbers)
+        return self._lookup(self._ur_numbers, ur_numbers)
+
+    def ur_number_count(self, ur_numbers: Iterable) -> int:
+        if self.columns is not None:
+            return self._column_count('ur_number', ur_numbers)
+        return self._count(self._ur_numbers, ur_numbers)
+
+    def visit_number_positions(self, visit_numbers: Iterable) -> List[int]:
+        if self.columns is not None:
+            return self._column_positions('visit_number', visit_numbers)
+        return self._lookup(self._visit_numbers, visit_numbers)
+
+    def visit_number_count(self, visit_numbers: Iterable) -> int:
+        if self.columns is not None:
+            return self._column_count('visit_number', visit_numbers)
+        return self._count(self._visit_numbers, visit_numbers)
+
+    def message_type_positions(self, message_types: Iterable) -> List[int]:
+        if self.columns is not None:
+            return self._column_positions('message_type', message_types)
+        return self._lookup(self._message_types, message_types)
+
+    def message_type_count(self, message_types: Iterable) -> int:
+        if self.columns is not None:
+            return self._column_count('message_type', message_types)
+        return self._count(self._message_types, message_types)
+
+    def _time_range(self, start: datetime = None, end: datetime = None) -> Tuple[int, int]:
+        """
+        :return: (first, last) slice of the sorted timestamps from start to end inclusive
+        """
+        if self._timestamps is None:
+            timestamps = [log.timestamp for log in self.logs]
+            # Logs are mostly written in time order, so this sort is close to linear
+            self._timestamp_positions = sorted((position for position, timestamp in enumerate(timestamps)
+                                                if timestamp is not None), key=timestamps.__getitem__)
+            self._timestamps = [timestamps[position] for position in self._timestamp_positions]
+        first = 0 if start is None else bisect_left(self._timestamps, start)
+        last = len(self._timestamps) if end is None else bisect_right(self._timestamps, end)
+        return first, last
+
+    def time_range_positions(self, start: datetime = None, end: datetime = None) -> List[int]:
+        """
+        Finds the logs with a timestamp from start to end inclusive, by binary search over the sorted timestamps, or
+        a mask over the timestamp column of a columnar index. Logs without a timestamp never match.
+        :return: positions, in timestamp order, or in log order for a columnar index
+        """
+        if self.columns is not None:
+            return np.flatnonzero(self.columns.between(start, end)).tolist()
+        first, last = self._time_range(start, end)
+        return self._timestamp_positions[first:last]
+
+    def time_range_count(self, start: datetime = None, end: datetime = None) -> int:
+        if self.columns is not None:
+            return int(np.count_nonzero(self.columns.between(start, end)))
+        first, last = self._time_range(start, end)
+        return last - first
+
+    def _word_positions(self, term: str) -> Iterable[int]:
+        if not term.endswith('*'):
+            return self._words.get(term, ())
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._words)
+        prefix = term[:-1]
+        vocabulary = self._vocabulary
+        words = []
+        for position in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            if not vocabulary[position].startswith(prefix):
+                break
+            words.append(self._words[vocabulary[position]])
+        return set(chain.from_iterable(words))
+
+    def search_positions(self, search_query: str) -> List[int]:
+        """
+        Finds the logs whose raw text contains every word of the search query, a word ending in * matches any word
+        that starts with it. eg: "smith 4east msg12*"
+        """
+        terms = SEARCH_TERM_PATTERN.findall(search_query.lower())
+        if not terms:
+            return []
+        # Intersect from the rarest term, so the candidate set only ever shrinks
+        matches = sorted((self._word_positions(term) for term in set(terms)), key=len)
+        positions = set(matches[0])
+        for term_positions in matches[1:]:
+            if not positions:
+                break
+            positions.intersection_update(term_positions)
+        return sorted(positions)
+
+    def search_count(self, search_query: str) -> int:
+        """
+        :return: number of logs with the rarest word of the search query, at least as many as match the whole query
+        """
+        terms = SEARCH_TERM_PATTERN.findall(search_query.lower())
+        return min((len(self._word_positions(term)) for term in set(terms)), default=0)
+
+    def value_counts(self, column: str, positions: Iterable[int] = None) -> Dict[object, int]:
+        """
+        Counts the logs with each value of a column, eg: 'ward'. UR numbers, visit numbers and message ids are counted
+        by their index key, so '0012345' and 12345 are counted together.
+        :param positions: only count the logs at these positions, None counts every log
+        """
+        if self.columns is not None and column in LogColumns.numbers + LogColumns.strings:
+            return self.columns.value_counts(column, positions)
+        logs = self.logs if positions is None else map(self.logs.__getitem__, positions)
+        values = (getattr(log, column, None) for log in logs)
+        if column in LogColumns.numbers:
+            values = map(index_key, values)
+        counts = defaultdict(int)
+        for value in values:
+            counts[value] += 1
+        return dict(counts)
+
+    def group(self, positions: Iterable[int]) -> Dict[str, List[Log]]:
+        """
+        Groups the logs at the given positions by log file, every log file gets a list even if it has no matches.
+        :param positions: in ascending order
+        """
+        positions = list(positions)
+        grouped = {}
+        starts = self._run_starts + [len(self.logs)]
+        first = 0
+        for name, end in zip(self._run_names, starts[1:]):
+            last = bisect_left(positions, end, first)
+            grouped.setdefault(name, []).extend(map(self.logs.__getitem__, positions[first:last]))
+            first = last
+        return grouped
+
+
+def column_values(logs: List[Log], header: tuple, column: str) -> list:
+    """
+    Gets the values of one column as they are displayed, read straight from the log attribute when the column is named
+    after one.
+    """
+    with reading_raw():
+        if logs and hasattr(logs[0], column):
+            values = list(map(attrgetter(column), logs))
+            if column in logs[0].blank_values:
+                blank = logs[0].blank_values[column]
+                values = ['' if value == blank else value for value in values]
+            return values
+        index = list(header).index(column)
+        return [log.values()[index] for log in logs]
+
+
+def sort_order(values: list, reverse: bool = False) -> List[int]:
+    """
+    Sorts a column by type, numbers (including numeric text) and dates sort by value rather than as text, and blanks
+    sort last in either direction.
+    :param values: column values
+    :param reverse: sort descending
+    :return: positions of the values in sorted order
+    """
+    keys = list(values)
+    numbers, date_times, dates, text, blanks = [], [], [], [], []
+    for position, value in enumerate(values):
+        if value is None or value == '':
+            blanks.append(position)
+        elif isinstance(value, str):
+            if value.isdigit():
+                keys[position] = int(value)
+                numbers.append(position)
+            else:
+                text.append(position)
+        elif isinstance(value, datetime):
+            date_times.append(position)
+        elif isinstance(value, date):
+            dates.append(position)
+        else:
+            numbers.append(position)
+    order = []
+    for group in (numbers, date_times, dates, text):
+        group.sort(key=keys.__getitem__)
+        order.extend(group)
+    if reverse:
+        order.reverse()
+    return order + blanks
+
+
+@dataclass
+class TreeViewData:
+    log_folder: LogFolder
+    index: LogIndex = None
+    # Queue each file as it loads, for index_loaded to add to the index, rather than indexing once run finishes
+    incremental: bool = False
+    # Index the logs in NumPy columns and filter with masks, see LogColumns
+    columnar: bool = False
+
+    def __post_init__(self):
+        self._loaded = queue.Queue()
+        self._pending = None
+        self._query = None
+        self._positions = None
+        if self.incremental:
+            self.index = LogIndex(self.columnar)
+            self.log_folder.on_file = self._file_loaded
+
+    @property
+    def header(self):
+        return self.log_folder.header
+
+    @property
+    def log_list(self) -> List[Log]:
+        """
+        The filtered logs, or every indexed log when there is no filter.
+        """
+        if self.log_folder.filtered_logs:
+            return self.log_folder.log_list
+        return list(self.index.logs) if self.index is not None else []
+
+    def _file_loaded(self, name: str, header: tuple, logs: List[Log]) -> None:
+        self._loaded.put((name, logs, 0))
+
+    def index_loaded(self, max_logs: int = 5000) -> int:
+        """
+        Adds the logs of the files loaded since the last call to the index, for incremental TreeViewData. Call it from
+        the thread that filters, eg: the Tk mainloop, while run loads the folder on another thread. Large files are
+        added max_logs at a time so the caller isn't held up.
+        :return: number of logs added, 0 once every loaded file has been indexed
+        """
+        added = 0
+        while added < max_logs:
+            if self._pending is None:
+                try:
+                    self._pending = self._loaded.get_nowait()
+                except queue.Empty:
+                    break
+            name, logs, start = self._pending
+            end = min(len(logs), start + max_logs - added)
+            self.index.add(name, logs[start:end])
+            added += end - start
+            self._pending = (name, logs, end) if end < len(logs) else None
+        return added
+
+    def build_index(self):
+        self.index = LogIndex(self.columnar)
+        for name, logs in self.log_folder.logs.items():
+            self.index.add(name, logs)
+
+    def query(self, query: Query):
+        """
+        Filters the logs to those that match the query, a falsy query such as And() clears the filter.
+        """
+        self._query = query
+        if not query:
+            self._positions = None
+            self.log_folder.filtered_logs = {}
+            return
+        if self.index.columns is not None:
+            self._positions = np.flatnonzero(query.mask(self.index)).tolist()
+        else:
+            self._positions = sorted(query.positions(self.index))
+        self.log_folder.filtered_logs = self.index.group(self._positions)
+
+    def count_by(self, column: str) -> Dict[object, int]:
+        """
+        Counts the filtered logs, or every indexed log when there is no filter, by the values of a column.
+        eg: count_by('ward') -> {'4EAST': 120, 'ICU': 15}
+        """
+        return self.index.value_counts(column, self._positions)
+
+    def filter_by_ur_number(self, ur_numbers: tuple):
+        # Replaces any other filter, use filter or query to combine them
+        self.query(filter_query(ur_numbers=ur_numbers))
+
+    def filter_by_visit_number(self, visit_number: tuple):
+        self.query(filter_query(visit_numbers=visit_number))
+
+    def filter(self, ur_numbers: Iterable = (), visit_numbers: Iterable = (), search_query: str = '',
+               start: datetime = None, end: datetime = None, message_types: Iterable = (), match_any: bool = False):
+        """
+        Filters the logs to those that match all of the given filters, empty filters are ignored and if every filter
+        is empty the filter is cleared.
+        :param start: earliest log timestamp, inclusive
+        :param end: latest log timestamp, inclusive
+        :param match_any: match logs that pass any of the filters instead
+        """
+        self.query(filter_query(ur_numbers, visit_numbers, search_query, start, end, message_types, match_any))
+
+    def filter_all(self, search_query: str):
+        self.query(filter_query(search_query=search_query))
+
+    def run(self):
+        self.log_folder.run()
+        if not self.incremental:
+            self.build_index()
+
+    def follow(self) -> int:
+        """
+        Reads the logs appended to the folder's files since they were loaded or last followed, see LogFolder.follow,
+        adds them to the index and applies the current filter again, so matching logs join the filtered logs.
+        :return: number of logs added
+        """
+        appended = self.log_folder.follow()
+        if self.incremental:
+            # log_folder.on_file has queued them
+            while self.index_loaded():
+                pass
+        else:
+            for name, logs in appended.items():
+                self.index.add(name, logs)
+        if self._query:
+            self.query(self._query)
+        return sum(len(logs) for logs in appended.values())
+
+    def progress(self):
+        return self.log_folder.get_progress()
+
+    def eta(self):
+        return self.log_folder.eta()
+
+    def cancel(self):
+        self.log_folder.cancel()
+
+
+def write_csv(csv_file: TextIO, header: Iterable[str], logs: Iterable[Log]) -> int:
+    """
+    Writes a header row followed by the values of each log to an open csv file.
+    :return: number of logs written
+    """
+    csv_writer = csv.writer(csv_file)
+    csv_writer.writerow(list(header))
+    count = 0
+    with reading_raw():
+        for log in logs:
+            csv_writer.writerow(list(log.values()))
+            count += 1
+    return count
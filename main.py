@@ -1,20 +1,14 @@
+import argparse
 import csv
 import sys
 import threading
 import tkinter as tk
-import gzip
 import os
-import ipaddress
-import shutil
-import enum
 from tkinter import ttk
 from tkinter import filedialog, messagebox
-from dataclasses import dataclass
-from datetime import datetime
-from os import listdir
-from os.path import isfile, join
-from typing import TextIO, Tuple, List
-from urllib import parse
+from typing import Tuple, List
+from logparser import (Log, LoadCancelled, LogFolder, ParseCache, Suffix, TreeViewData, column_values,
+                       parse_time_bound, sort_order)
 
 # Colours
 BACKGROUND = '#121212'
@@ -31,652 +25,6 @@ ERROR = '#eb6773'
 ERROR_TEXT = '#000'
 WHITE_TEXT = '#fff'
 
-# HL7 Message Definitions
-
-HL7_MESSAGE = {
-    'I': {
-        'ADT': {
-            'A01': 'Admission',
-            'A02': 'Transfer',
-            'A03': 'Discharge',
-            'A05': 'Pre-admission',
-            'A08': 'Visit Update',
-            'A11': 'Cancel Admission',
-            'A12': 'Cancel Transfer',
-            'A13': 'Cancel I/P Discharge',
-            'A14': 'Pre-admission',
-            'A21': 'On-Leave',
-            'A22': 'Return from leave',
-            'A27': 'Cancel Pre-admission',
-            'A28': 'PMI Registration',
-            'A31': 'PMI Update',
-            'A34': 'PMI Merge',
-            'A44': 'Change U/R for O/P visit',
-        },
-        'SIU': {
-            'S12': 'Notification of New Appointment',
-            'S14': 'Notification of Appointment Modification',
-            'S15': 'Notification of Appointment Cancellation',
-        }
-    },
-    'E': {
-        'ADT': {
-            'A03': 'Discharge Emergency Visit',
-            'A04': 'Register Emergency Visit',
-            'A08': 'Emergency Visit Update',
-            'A11': 'Cancel Emergency Visit',
-            'A13': 'Cancel Emergency Visit Discharge',
-            'A44': 'Change U/R for Emergency Visit',
-        }
-    },
-    'O': {
-        'ADT': {
-            'A03': 'Discharge',
-            'A04': 'Register Event (Attendance)',
-            'A05': 'Pre-admit a Patient (Booking)',
-            'A08': 'Update Patient Information (Update Booking/Reschedule)',
-            'A11': 'Cancel Visit (Unattend)',
-            'A13': 'Cancel Discharge',
-            'A38': 'Cancel Pre-admit (Booking)',
-            'A44': 'Change U/R for O/P visit',
-            'A31': 'PMI Update',
-        }
-    },
-
-}
-HL7_MESSAGE['S'] = HL7_MESSAGE['I']
-
-
-# Log Classes
-
-
-class Log:
-    """
-    Base log class to hold common functionality across logfiles
-    """
-
-    def __init__(self, raw_data: str):
-        self.raw = raw_data
-        self._parse()
-
-    def _parse(self):
-        pass
-
-    def header(self):
-        pass
-
-    def values(self):
-        pass
-
-
-class HL7Log(Log):
-    """
-    Log class that has common HL7 Attributes
-    """
-
-    def __init__(self, raw_data: str):
-        """
-        Converts the raw string data to the BRDLog object
-        :param raw_data: str data to be converted to class object
-        """
-        super().__init__(raw_data)
-
-    def _parse(self):
-        self._parse_headers()
-        self._build_msh()
-        self._build_pid()
-        self._build_pv1()
-        self._set_type_descriptions()
-
-    def _parse_headers(self):
-        self.pid = ''
-        if len(self.raw) != 0:
-            self.msh = str(self.raw)[53:].split('|')[0:19]
-            try:
-                self.pid = str(self.raw)[str(self.raw).find('PID|'):].split('|')[:31]
-            except IndexError:
-                self.pid = ''
-            try:
-                self.pv1 = str(self.raw)[str(self.raw).find('PV1|'):].split('|')[:45]
-            except IndexError:
-                self.pv1 = ''
-
-    def _build_msh(self):
-        try:
-            self.message_date_time = datetime.strptime(self.msh[6], '%Y%m%d%H%M%S')
-            self.message_date = self.message_date_time.date()
-            self.message_time = self.message_date_time.time()
-            self.message_trans_type = self.msh[8].split('^')[0]
-            self.message_type = self.msh[8].split('^')[1]
-            self.message_id = int(self.msh[9])
-        except AttributeError:
-            pass
-        except IndexError:
-            pass
-
-    def _build_pid(self):
-        self.ur_number = ''
-        self.first_name = ''
-        self.middle_name = ''
-        self.last_name = ''
-        self.date_of_birth = None
-        try:
-            self.ur_number = self.pid[3].split('^')[0]
-            self.first_name = self.pid[5].split('^')[1]
-            self.middle_name = self.pid[5].split('^')[2].replace('"', '')
-            self.last_name = self.pid[5].split('^')[0]
-            self.date_of_birth = datetime.strptime(self.pid[7], '%Y%m%d').date()
-        except IndexError:
-            pass
-
-    def _build_pv1(self):
-        try:
-            self.admission_type = self.pv1[2]
-            self.ward = ''
-            self.bed = ''
-            self.visit_number = 0
-            if self.admission_type.lower() == 'e':
-                self.ward = 'Emergency'
-                self.bed = self.pv1[10].split('^')[1]
-            else:
-                self.ward = self.pv1[3].split('^')[0]
-                self.bed = self.pv1[3].split('^')[2]
-                self.visit_number = int(self.pv1[5])
-        except IndexError:
-            self.ward = ''
-            self.bed = ''
-            self.visit_number = 0
-            self.admission_type = ''
-
-    def _set_type_descriptions(self):
-        self.type_description = ''
-        if self.admission_type != '':
-            self.type_description = HL7_MESSAGE[self.admission_type][self.message_trans_type][self.message_type]
-
-    def __repr__(self):
-        return f'<{self.__class__.__name__} MsgID:{self.message_id} MsgType:{self.message_type} MRN:{self.ur_number}>'
-
-    def header(self):
-        return 'message_id', 'message_date_time', 'message_type', 'type_description', 'ur_number', 'first_name', \
-               'middle_name', 'last_name', 'date_of_birth', 'visit_number', 'admission_type', 'ward', 'bed', 'raw'
-
-    def values(self):
-        if self.visit_number == 0:
-            visit = ''
-        else:
-            visit = self.visit_number
-        return self.message_id, self.message_date_time, self.message_type, self.type_description, \
-               self.ur_number, self.first_name, self.middle_name, self.last_name, self.date_of_birth, \
-               visit, self.admission_type, self.ward, self.bed, self.raw
-
-
-class BRDLog(HL7Log):
-    """
-    Broadcaster Log class
-    """
-    pass
-
-
-class RECLog(HL7Log):
-    """
-    Receiver Log class
-    """
-
-    def _build_msh(self):
-        try:
-            self.message_date_time = datetime.strptime(self.msh[5][:14], '%Y%m%d%H%M%S')
-            self.message_date = self.message_date_time.date()
-            self.message_time = self.message_date_time.time()
-            self.message_trans_type = self.msh[7].split('^')[0]
-            self.message_type = self.msh[7].split('^')[1]
-            self.message_id = 0
-            try:
-                self.message_id = int(self.msh[8])
-            except ValueError:
-                self.message_id = self.msh[8]
-        except AttributeError:
-            pass
-        except IndexError:
-            pass
-
-    def _build_pv1(self):
-        try:
-            self.admission_type = self.pv1[2]
-            self.ward = ''
-            self.bed = ''
-            self.visit_number = 0
-            if self.admission_type.lower() == 'e':
-                self.ward = 'Emergency'
-                self.bed = self.pv1[10].split('^')[1]
-            elif self.admission_type.lower() == 'o':
-                self.ward = self.pv1[3].split('^')[0]
-                self.bed = ''
-                self.visit_number = int(self.pv1[17].split('^')[0])
-            elif self.admission_type.lower() == 'i':
-                self.ward = self.pv1[3].split('^')[0]
-                self.bed = self.pv1[3].split('^')[2]
-                if self.pv1[1] == '':
-                    self.visit_number = self.pv1[19].split(' ')[0]
-                else:
-                    self.visit_number = int(self.pv1[17].split('^')[0])
-        except IndexError:
-            self.ward = ''
-            self.bed = ''
-            self.visit_number = 0
-            self.admission_type = ''
-        except ValueError:
-            self.visit_number = 0
-
-
-class PASAccessLog(Log):
-    """
-    Webpas Web Server Access Log
-    """
-
-    def __new__(cls, raw_data: str, *args, **kwargs):
-        if ipaddress.ip_address(raw_data.split(' ')[0]):
-            return super(PASAccessLog, cls).__new__(cls)
-
-    def __init__(self, raw_data: str):
-        """
-        Converts the raw string data to the PASAccessLog object
-        :param raw_data: str data to be converted to class object
-        """
-        super().__init__(raw_data)
-        self.log = self.raw.split(' ')
-        self.ip_address = self.log[0]
-        self.user = self.log[1]
-        self.datetime = datetime.strptime(' '.join(self.log[2:4]), '%Y-%m-%d %H:%M:%S')
-        self.date = self.datetime.date()
-        self.time = self.datetime.time()
-        self.method = self.log[4].strip('"')
-        self.response_code = self.log[7]
-
-        # Parsing visited URL
-        self.url = self.log[5].split('?')[0]
-        try:
-            self.url_params = parse.parse_qs(self.log[5].split('?')[1])
-        except IndexError:
-            self.url_params = ''
-        if '/cgi-bin/' in self.url:
-            self.visited_server = self.url[-12:-4].upper()
-
-        # Parse Visited Template Number
-        self.visited_template = None
-        try:
-            self.visited_template = self.url_params['template'][0].zfill(3)
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-
-        # Parse Visited Report Number
-        self.visited_report = None
-        try:
-            self.visited_report = self.url_params['reportno'][0].zfill(2)
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-
-        # Parsing referred URL
-        self.referer_url = self.log[10].split('?')[0].strip('Referer=').replace('"', '')
-        try:
-            self.referer_params = parse.parse_qs(self.log[10].split('?')[1])
-        except IndexError:
-            self.referer_params = ''
-        self.host = self.referer_url.strip('https://')[:self.referer_url.find('.sjog.org.au') - 8]
-        if '/cgi-bin/' in self.referer_url:
-            self.referred_server = self.referer_url[-12:-4].upper()
-
-        # Parse Referred Template Number
-        self.referred_template = None
-        try:
-            self.referred_template = self.referer_params['template'][0].zfill(3)
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-
-        # Parse Referred Report Number
-        self.referred_report = None
-        try:
-            self.referred_report = self.referer_params['reportno'][0].zfill(2)
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-
-        # Parse UR Number
-        self.ur_number = None
-        try:
-            self.ur_number = int(self.url_params['urnumber'][0])
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-        except ValueError:
-            pass
-        try:
-            referer_ur = int(self.referer_params['urnumber'][0])
-            if referer_ur != self.ur_number and self.ur_number is None:
-                self.ur_number = referer_ur
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-        except ValueError:
-            pass
-
-        # Parse Visit number
-        self.visit_number = None
-        try:
-            self.visit_number = int(self.url_params['admissno'][0])
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-        except ValueError:
-            pass
-        try:
-            referer_visit = int(self.referer_params['admissno'][0])
-            if referer_visit != self.visit_number and self.visit_number is None:
-                self.visit_number = referer_visit
-        except KeyError:
-            pass
-        except TypeError:
-            pass
-        except ValueError:
-            pass
-
-    def __repr__(self):
-        return f'<PASAccessLog IP:{self.ip_address} UserID:{self.user} MRN:{self.ur_number}>'
-
-    def header(self):
-        return 'ip_address', 'user', 'datetime', 'method', 'response_code', 'host', 'ur_number', 'visit_number', \
-               'visited_url', 'referred_url', 'raw '
-
-    def values(self):
-        return self.ip_address, self.user, self.datetime, self.method, self.response_code, self.host, self.ur_number, \
-               self.visit_number, self.url, self.referer_url, self.raw
-
-
-class LogType(enum.Enum):
-    """
-    Enum to call the correct log from the LogFile class.
-    """
-    BRDTRANSACTIONLOG = BRDLog
-    RECTRANSACTIONLOG = RECLog
-    PASACCESSLOG = PASAccessLog
-
-
-class LogFile:
-    """
-    Base Log file, contains a list of Log's. This class holds common functionality across all log file types
-    """
-
-    def __init__(self, file_attributes: Tuple[str, str], log_file: TextIO):
-        self.name = file_attributes[0]
-        self.header = None
-        self.suffix = file_attributes[1]
-        self.log_type = self.suffix.upper()
-        self.log_file = log_file
-        self._raw_logs = []
-        self._logs = []
-        self._parse()
-        self._create_log_files()
-        self._get_header()
-
-    def _get_header(self):
-        """
-        Sets the header name on the log file, based on the first row Log header field.
-        Used for setting the headers in the Treeview
-        """
-        try:
-            self.header = self._logs[0].header()
-        except IndexError:
-            # todo Why does this occur?
-            print(self._logs)
-
-    def _create_log_files(self):
-        for log in self._raw_logs:
-            try:
-                self._logs.append(LogType[self.log_type].value(log))
-            except ValueError:
-                pass
-
-    def to_dict(self):
-        return {self.name: self._logs}
-
-    def _parse(self):
-        pass
-
-
-class BRDLogFile(LogFile):
-    """
-    Webpas Broadcaster Log file, contains a list of BRDLog's.
-    """
-
-    def __init__(self, file_attributes: Tuple[str, str], log_file: TextIO):
-        super().__init__(file_attributes, log_file)
-
-    def _parse(self):
-        header = []
-        body = []
-        data = []
-        for idx, log in enumerate(self.log_file):
-            try:
-                if not log[:80] == (80 * '-'):
-                    raise NameError
-                if len(header) != 0:
-                    data.append(' '.join(body))
-                    header = []
-                    body = []
-                    if data[0]:
-                        self._raw_logs.append(data[0])
-                    data = []
-                    header.append(log)
-                else:
-                    header.append(log[:80])
-            except NameError:
-                msg_body = str(log).strip()
-                if 'Timeout waiting for incoming message' not in msg_body:
-                    body.append(str(log).strip())
-
-
-class RECLogFile(BRDLogFile):
-    """
-    Webpas Receiver Log file, contains a list of RECLog's.
-    """
-
-    def __init__(self, file_attributes: Tuple[str, str], log_file: TextIO):
-        super().__init__(file_attributes, log_file)
-
-
-class PASLogFile(LogFile):
-    def __init__(self, file_attributes: Tuple[str, str], log_file: TextIO):
-        super().__init__(file_attributes, log_file)
-
-    def _parse(self):
-        for log in self.log_file:
-            self._raw_logs.append(log.strip('\n'))
-
-
-class LogFileType(enum.Enum):
-    """
-    Enum to call the correct log file from the LogFolder class.
-    """
-    BRDTransactionLog = BRDLogFile
-    RECTransactionLog = RECLogFile
-    PASAccessLog = PASLogFile
-
-
-class Suffix(enum.Enum):
-    # todo rework this as cant have to txt suffixes
-    PASAccessLog = 'txt'
-    BRDTransactionLog = 'brd'
-    RECTransactionLog = 'rec'
-
-
-class LogFolder:
-    """
-    Folder level class that contains a list of log files, each logfile contains logs.
-    """
-
-    # todo if existing txt files in folder then it crashes ;(
-    def __init__(self, directory_path: str, log_file_suffix: Suffix):
-        """
-        Takes the given directory path and checks it for the file suffix provided, then uses the search word list to
-        filter the logs.
-        :param directory_path: eg: "C:/Users/user/desktop"
-        :param log_file_suffix: log file extension
-        """
-        self._path = directory_path
-        self._log_file_suffix = log_file_suffix.value
-        self._log_file_type = log_file_suffix.name
-        self._files = []
-        self._extracted_files = []
-        self.logs = {}
-        self.filtered_logs = {}
-        self._progress_max = len([file for file in listdir(self._path) if self._log_file_suffix in file]) + 4
-        self._progress_min = 0
-        self._current_progress = 0
-        self.header = None
-
-    def run(self):
-        self._find_available_files()
-        self._create_log_files()
-        self._remove_decompressed_files()
-
-    def _update_progress(self):
-        self._current_progress += 1
-
-    def get_progress(self):
-        return self._current_progress
-
-    def __repr__(self):
-        return f'<LogFolder Path: "{self._path}" Type: "{self._log_file_type}" >'
-
-    def _gz_extract(self, file_to_extract) -> None:
-        """
-        Function to extract gzip compressed files to the same working directory.
-        :param file_to_extract: File_name.gz (must be a gzip file)
-        """
-        with gzip.open(join(self._path, file_to_extract), 'rb') as f_in:
-            with open(join(self._path, f'{file_to_extract[:-2]}txt'), 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-                self._extracted_files.append(f'{file_to_extract[:-2]}txt')
-        self._update_progress()
-
-    def _decompress_files(self) -> None:
-        """
-        Decompress files
-        """
-        for file in listdir(self._path):
-            if isfile(join(self._path, file)):
-                if '.gz' in file:
-                    self._gz_extract(file)
-        self._update_progress()
-
-    def _remove_decompressed_files(self) -> None:
-        """
-        Removed decompressed *.gz files
-        """
-        if self._extracted_files:
-            for file in self._extracted_files:
-                os.remove(join(self._path, file))
-        self._update_progress()
-
-    def _find_available_files(self) -> None:
-        """
-        Find all files in the provided directory with the provided suffix.
-        """
-        self._decompress_files()
-        for file in listdir(self._path):
-            if isfile(join(self._path, file)):
-                if self._log_file_suffix in file:
-                    self._files.append(file)
-        self._update_progress()
-
-    def _create_log_files(self) -> None:
-        """
-        Opens each file in the LogFolder._files list and creates a log file
-        """
-        for file in self._files:
-            with open(join(self._path, file), 'r', encoding='latin-1', errors='surrogateescape') as log_file:
-                file_attributes = (file[:file.index(self._log_file_suffix) - 1], self._log_file_type)
-                log_file = LogFileType[self._log_file_type].value(file_attributes, log_file)
-                # todo raise custom error to remove the wrong long types, if there are multiple logs that use
-                # todo the same file suffix
-                if self.header is None:
-                    self.header = log_file.header
-                self.logs |= log_file.to_dict()
-            self._update_progress()
-
-    @property
-    def log_list(self) -> List[Log]:
-        if self.filtered_logs:
-            logs = list(self.filtered_logs.values())
-            return logs[0]
-        else:
-            logs = list(self.logs.values())
-        return logs[0]
-
-    @property
-    def log_file_type(self):
-        return self._log_file_type
-
-    @property
-    def progress_max(self):
-        return self._progress_max
-
-
-@dataclass
-class TreeViewData:
-    log_folder: LogFolder
-
-    @property
-    def header(self):
-        return self.log_folder.header
-
-    def filter_by_ur_number(self, ur_numbers: tuple):
-        if ur_numbers:
-            filtered_logs = []
-            for name, logs in self.log_folder.logs.items():
-                for idx, log in enumerate(logs):
-                    for ur_number in list(ur_numbers):
-                        if int(ur_number) == log.ur_number:
-                            filtered_logs.append(log)
-                    else:
-                        pass
-                self.log_folder.filtered_logs[name] = filtered_logs
-        else:
-            self.log_folder.filtered_logs = {}
-
-    def filter_by_visit_number(self, visit_number: tuple):
-        # todo handle if there are already filters, need to append items to the list
-        if visit_number:
-            filtered_logs = []
-            for name, logs in self.log_folder.logs.items():
-                for idx, log in enumerate(logs):
-                    for visit_num in list(visit_number):
-                        if int(visit_num) == log.visit_number:
-                            filtered_logs.append(log)
-                    else:
-                        pass
-                self.log_folder.filtered_logs[name] = filtered_logs
-        else:
-            self.log_folder.filtered_logs = {}
-
-    def filter_all(self, search_query: str):
-        pass
-
-    def run(self):
-        self.log_folder.run()
-
-    def progress(self):
-        return self.log_folder.get_progress()
-
 # GUI Classes
 # Widgets
 
@@ -808,6 +156,69 @@ class SearchBox(tk.Frame):
             return self.search_list.get()
 
 
+class TimeRangeBox(tk.Frame):
+    """
+    Frame with From and To Entry boxes for filtering logs to a time range, either can be left blank.
+    """
+
+    def __init__(self, parent, label, background, foreground, *args, **kwargs):
+        """
+        :param parent: Parent window or frame to place this widget on
+        :param label: Title of the widget
+        :param background: Sets the background of the frame and all child widgets
+        :param foreground: Sets the foreground of the frame and all child widgets
+        """
+        tk.Frame.__init__(self, parent, *args, **kwargs)
+        self.configure(background=background)
+
+        # Widgets
+        self.label = tk.Label(self,
+                              text=f'{str(label).lower().capitalize()}',
+                              bg=background,
+                              fg=foreground,
+                              bd=0,
+                              highlightthickness=0,
+                              justify="center")
+        self.hint = tk.Label(self,
+                             text='eg: 2020-01-01 14:00',
+                             bg=background,
+                             fg=foreground,
+                             bd=0,
+                             highlightthickness=0,
+                             justify="center")
+        self.start_var = tk.StringVar()
+        self.end_var = tk.StringVar()
+        self.entries = []
+        for text, variable in (('From', self.start_var), ('To', self.end_var)):
+            row = tk.Frame(self, background=background)
+            tk.Label(row, text=text, width=5, bg=background, fg=foreground).pack(side='left', padx=(40, 0))
+            entry = tk.Entry(row,
+                             textvariable=variable,
+                             bg=background,
+                             fg=foreground,
+                             highlightcolor='grey',
+                             bd=0,
+                             highlightthickness=1,
+                             justify="center",
+                             width=20,
+                             )
+            entry.pack(side='left', padx=(0, 40))
+            self.entries.append(row)
+
+        # Packing
+        self.label.pack(side='top')
+        self.hint.pack(side='top', pady=(0, 5))
+        for row in self.entries:
+            row.pack(side='top', pady=(0, 5))
+
+    def get_range(self):
+        """
+        :return: (start, end) datetimes, None for a blank entry
+        :raises ValueError: if an entry isn't a date or date and time
+        """
+        return parse_time_bound(self.start_var.get()), parse_time_bound(self.end_var.get(), end=True)
+
+
 class Button(tk.Button):
     def __init__(self, parent, *args, **kwargs):
         """
@@ -973,16 +384,18 @@ class ProgressBar(tk.Toplevel):
                 command: command to be ran in thread,
                 min_value: default 0, set minimum value of progress bar,
                 max_value: default 100, set maximum value of progress bar,
+                cancel_callback: called instead of callback if the task is cancelled
 
     The command needs a command.progress() function, this function will be used to get the current
-    progress of the task.
+    progress of the task. If the command has a command.eta() function the estimated time left is shown, and if it
+    has a command.cancel() function a Cancel button is shown, the task should then raise LoadCancelled from run().
     """
-    def __init__(self, parent, command=None, callback=None, max_value=100, *args, **kwargs):
+    def __init__(self, parent, command=None, callback=None, max_value=100, cancel_callback=None, *args, **kwargs):
         tk.Toplevel.__init__(self, parent, *args, **kwargs)
         self.wm_overrideredirect(True)
         self.wm_attributes('-topmost', True)
         w = '500'
-        h = '20'
+        h = '24'
         x = parent.winfo_screenwidth() // 2 - round(int(w)/2)
         y = parent.winfo_screenheight() // 2 - round(int(h)/2)
         self.geometry(f'{w}x{h}+{x}+{y}')
@@ -990,27 +403,62 @@ class ProgressBar(tk.Toplevel):
         self.parent = parent
         self.task = command
         self.callback = callback
+        self.cancel_callback = cancel_callback
+        self.cancelled = False
+        self.cancel_requested = False
         self.max = max_value
 
+        self.configure(background=BACKGROUND)
+        if hasattr(self.task, 'cancel'):
+            self.cancel_button = Button(self, name='btn_cancel', text='Cancel', command=self.cancel)
+            self.cancel_button.pack(side='right', fill='y')
+        self.eta_var = tk.StringVar()
+        self.eta = tk.Label(self, name='lbl_eta', textvariable=self.eta_var, width=10, background=BACKGROUND,
+                            foreground=FOREGROUND)
+        self.eta.pack(side='right', fill='y')
         self.bar = ttk.Progressbar(self, maximum=self.max)
-        self.bar.pack(side='top', fill='x', expand=True)
-        self.thread = threading.Thread(target=self.task.run)
+        self.bar.pack(side='left', fill='x', expand=True)
+        self.thread = threading.Thread(target=self._run)
         self.thread.daemon = True
         self.start_task()
 
+    def _run(self):
+        try:
+            self.task.run()
+        except LoadCancelled:
+            self.cancelled = True
+
     def _progress(self):
         if self.thread.is_alive():
             self.bar['value'] = self.task.progress()
+            if hasattr(self.task, 'eta') and not self.cancel_requested:
+                self.eta_var.set(self.format_eta(self.task.eta()))
             self.after(100, self._progress)
         else:
             self.cleanup()
 
+    @staticmethod
+    def format_eta(seconds) -> str:
+        if seconds is None:
+            return ''
+        minutes, seconds = divmod(round(seconds), 60)
+        return f'{minutes}:{seconds:02} left'
+
+    def cancel(self):
+        self.cancel_requested = True
+        self.cancel_button['state'] = 'disabled'
+        self.eta_var.set('Cancelling')
+        self.task.cancel()
+
     def start_task(self):
         self.thread.start()
         self._progress()
 
     def cleanup(self):
-        self.callback()
+        if not self.cancelled:
+            self.callback()
+        elif self.cancel_callback is not None:
+            self.cancel_callback()
         self.destroy()
 
 # Frames
@@ -1021,12 +469,21 @@ class OptionsFrame(tk.Frame):
     Options Frame for setting up the parameters for the parser that reads the logs used by the application.
     """
 
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, workers: int = 1, cache: ParseCache = None, raw_refs: bool = False, **kwargs):
         """
         :param parent: Parent window or frame to place this widget on
+        :param workers: number of processes used to parse the log files, 1 parses them on the loading thread
+        :param cache: parse cache to load unchanged files from, None parses every file
+        :param raw_refs: logs keep where they are in their files rather than their raw text, see LogFolder
         """
         tk.Frame.__init__(self, parent, *args, **kwargs)
+        self.workers = workers
+        self.cache = cache
+        self.raw_refs = raw_refs
         self.selected_data = []
+        self.loading = False
+        self.following = False
+        self._follow_job = None
         self.parent: ClientApp = parent
         self.pack_propagate(False)
         self.configure(background=BACKGROUND, width=300)
@@ -1086,6 +543,7 @@ class OptionsFrame(tk.Frame):
         self.read_logs_button = ButtonFrame(self, title='Read Logs', subtext='', name='btn_read',  command=self.read_logs)
         self.filter_button = ButtonFrame(self, title='Filter', subtext='', name='btn_filter',  command=self.filter)
         self.export_button = ButtonFrame(self, title='Export to CSV', subtext='', name='btn_export',  command=self.export_logs_to_csv)
+        self.follow_button = ButtonFrame(self, title='Follow', subtext='Off', name='btn_follow', command=self.toggle_follow)
 
         self.ur_number_search = SearchBox(self, name='srb_ur_number', label='UR Number search', background=BACKGROUND,
                                           foreground=FOREGROUND)
@@ -1094,6 +552,10 @@ class OptionsFrame(tk.Frame):
                                              foreground=FOREGROUND)
         self.wildcard_search = SearchBox(self, name='srb_wildcard', label='Anywhere search', background=BACKGROUND,
                                          foreground=FOREGROUND)
+        self.message_type_search = SearchBox(self, name='srb_message_type', label='Message type search',
+                                             background=BACKGROUND, foreground=FOREGROUND)
+        self.time_range = TimeRangeBox(self, name='trb_time_range', label='Time range', background=BACKGROUND,
+                                       foreground=FOREGROUND)
 
         # Packing
         self.title.pack(side='top', padx=(20, 0), pady=(30, 20))
@@ -1125,6 +587,7 @@ class OptionsFrame(tk.Frame):
 
     def pack_step_three(self):
         self.read_logs_button.pack(side='top', fill='x', ipady=10)
+        self.follow_button.pack(side='top', fill='x', ipady=10)
         self.export_button.pack(side='top', fill='x', ipady=10)
 
     def log_file_suffix(self):
@@ -1134,16 +597,74 @@ class OptionsFrame(tk.Frame):
             messagebox.showerror(title='No log type selected',
                                  message='Invalid log file type to read. Please select a valid log file type')
 
+    # Logs indexed per show_loaded call, small enough to keep the window responsive while a folder loads
+    index_batch_size = 5000
+
     def read_logs(self):
         # todo check if the log type has changed
         if self.tree_view_data is None:
             self.tree_view_data = TreeViewData(log_folder=LogFolder(directory_path=self.working_directory_var.get(),
-                                                                    log_file_suffix=self.log_file_suffix()))
+                                                                    log_file_suffix=self.log_file_suffix(),
+                                                                    workers=self.workers,
+                                                                    cache=self.cache,
+                                                                    raw_refs=self.raw_refs),
+                                               incremental=True)
+            self.loading = True
             ProgressBar(self, self.tree_view_data,
-                        callback=self.filter_data,
-                        max_value=self.tree_view_data.log_folder.progress_max)
+                        callback=self.load_finished,
+                        max_value=self.tree_view_data.log_folder.progress_max,
+                        cancel_callback=self.load_cancelled)
+            self.show_loaded()
         else:
-            pass
+            self.filter_data()
+
+    def show_loaded(self):
+        """
+        Indexes and shows the logs of the files loaded so far, a batch at a time, until the whole folder is shown.
+        """
+        if self.tree_view_data is None:
+            return
+        if self.tree_view_data.index_loaded(self.index_batch_size):
+            self.filter_data(keep_position=True)
+            self.after(1, self.show_loaded)
+        elif self.loading:
+            self.after(100, self.show_loaded)
+        else:
+            self.filter_data(keep_position=True)
+
+    def load_finished(self):
+        # show_loaded shows the last of the logs once they're indexed
+        self.loading = False
+
+    def load_cancelled(self):
+        # Forget the partly loaded folder, so the next read starts again
+        self.loading = False
+        self.tree_view_data = None
+
+    # Milliseconds between checks for logs appended to the folder's files while following
+    follow_interval = 1000
+
+    def toggle_follow(self):
+        self.following = not self.following
+        self.follow_button.set_subtext('On' if self.following else 'Off')
+        if self.following:
+            self.follow_logs()
+        elif self._follow_job is not None:
+            self.after_cancel(self._follow_job)
+            self._follow_job = None
+
+    def follow_logs(self):
+        """
+        Shows the logs appended to the folder's files since the last check, every follow_interval until follow is
+        turned off. Waits for the folder to finish loading first.
+        """
+        try:
+            if self.tree_view_data is not None and not self.loading and self.tree_view_data.follow():
+                # follow has filtered the new logs with the last filter applied
+                self.render(keep_position=True)
+        finally:
+            # Keep following while follow is on, a check that failed is tried again
+            self._follow_job = self.after(self.follow_interval, self.follow_logs)
 
     def filter(self):
         selected_log = self.log_list_var.get()
@@ -1151,23 +672,40 @@ class OptionsFrame(tk.Frame):
             self.ur_number_search.pack(side='top', pady=(20, 0), fill='x')
             self.visit_number_search.pack(side='top', pady=(20, 0), fill='x')
             self.wildcard_search.pack(side='top', pady=(20, 0), fill='x')
+            self.message_type_search.pack(side='top', pady=(20, 0), fill='x')
+            self.time_range.pack(side='top', pady=(20, 0), fill='x')
         else:
             self.ur_number_search.forget()
             self.visit_number_search.forget()
             self.wildcard_search.forget()
+            self.message_type_search.forget()
+            self.time_range.forget()
 
-    def filter_data(self):
-        self.tree_view_data.filter_by_ur_number(self.ur_number_search.get_keywords())
-        if self.visit_number_search.get_keywords():
-            pass
-        if self.wildcard_search.get_keywords():
-            pass
-        self.render()
-
-    def render(self):
+    def filter_data(self, keep_position=False):
+        """
+        :param keep_position: keep the scroll position and selection, for when more logs have loaded
+        """
+        try:
+            start, end = self.time_range.get_range()
+        except ValueError as error:
+            if not keep_position:
+                messagebox.showerror(title='Invalid time range', message=f'{error}\n\neg: 2020-01-01 14:00')
+            return
+        self.tree_view_data.filter(ur_numbers=self.ur_number_search.get_keywords(),
+                                   visit_numbers=self.visit_number_search.get_keywords(),
+                                   search_query=' '.join(self.wildcard_search.get_keywords()),
+                                   start=start,
+                                   end=end,
+                                   message_types=self.message_type_search.get_keywords())
+        self.render(keep_position)
+
+    def render(self, keep_position=False):
         self.tree_view_data: TreeViewData
+        if self.loading and self.tree_view_data.header is None:
+            # Nothing has loaded yet
+            return
         try:
-            self.parent.result_display_frame.display_results(self.tree_view_data)
+            self.parent.result_display_frame.display_results(self.tree_view_data, keep_position)
         except TypeError:
             messagebox.showerror(title='No log files found',
                                  message=f'There were no {self.tree_view_data.log_folder.log_file_type} files '
@@ -1195,10 +733,10 @@ class OptionsFrame(tk.Frame):
                             for log in self.selected_data:
                                 csv_writer.writerow(log)
                         elif not answer:
-                            for log in self.tree_view_data.log_folder.log_list:
+                            for log in self.tree_view_data.log_list:
                                 csv_writer.writerow(list(log.values()))
                     else:
-                        for log in self.tree_view_data.log_folder.log_list:
+                        for log in self.tree_view_data.log_list:
                             csv_writer.writerow(list(log.values()))
                 except TypeError:
                     os.remove(new_file)
@@ -1212,16 +750,33 @@ class OptionsFrame(tk.Frame):
 
 
 class ResultDisplayFrame(tk.Frame):
+    """
+    Displays logs in a Treeview. Only the rows in view, plus a small buffer, exist in the Treeview, the y scrollbar
+    moves a window over ResultDisplayFrame.rows and the visible rows are re-rendered from it.
+    """
+    # Rows rendered below the visible ones, covers partly visible rows while the frame is resized
+    row_buffer = 5
+    # Row height used until a rendered row can be measured
+    default_row_height = 20
+
     def __init__(self, parent, *args, **kwargs):
         tk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent: ClientApp = parent
         self.pack_propagate(False)
 
+        self.rows = []
+        self._unsorted_rows = []
+        self._sort_orders = {}
+        # (column, reverse) the rows are sorted by, None while they're unsorted
+        self._sort = None
+        self._first_row = 0
+        self._visible_rows = 1
+        self._selected_rows = set()
+
         self.results = ttk.Treeview(self, show='headings')
 
         self.results.pack(side='left', fill='both', expand=True)
-        self.y_scrollbar = ttk.Scrollbar(self.results, orient=tk.VERTICAL, command=self.results.yview)
-        self.results.configure(yscroll=self.y_scrollbar.set)
+        self.y_scrollbar = ttk.Scrollbar(self.results, orient=tk.VERTICAL, command=self.scroll)
         self.y_scrollbar.pack(side='right', fill='y', expand=False)
 
         self.x_scrollbar = ttk.Scrollbar(self.results, orient=tk.HORIZONTAL, command=self.results.xview)
@@ -1230,62 +785,203 @@ class ResultDisplayFrame(tk.Frame):
 
         self.results.bind('<<TreeviewSelect>>', self.select_result)
         self.results.bind('<3>', self.show_context_menu)
+        self.results.bind('<Configure>', self.on_resize)
+        self.results.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.results.bind('<Button-4>', self.on_mouse_wheel)
+        self.results.bind('<Button-5>', self.on_mouse_wheel)
+        for key in ('<Up>', '<Down>', '<Prior>', '<Next>', '<Home>', '<End>'):
+            self.results.bind(key, self.on_key)
 
     def show_context_menu(self, event):
         ContextMenu(self, event)
 
     def select_result(self, event):
-        self.parent.options_frame.selected_data.clear()
-        for selected_item in self.results.selection():
-            self.parent.options_frame.selected_data.append(self.results.item(selected_item)['values'])
+        window = range(self._first_row, self._first_row + len(self.results.get_children()))
+        self._selected_rows.difference_update(window)
+        self._selected_rows.update(int(item) for item in self.results.selection())
+        self.parent.options_frame.selected_data[:] = [self.rows[row].values() for row in sorted(self._selected_rows)]
 
     def sort_column(self, tv, col, reverse):
-        # Sourced from https://stackoverflow.com/questions/1966929/tk-treeview-column-sort
-        data_list = [(tv.set(k, col), k) for k in tv.get_children('')]
-        data_list.sort(reverse=reverse)
-
-        # rearrange items in sorted positions
-        for index, (val, k) in enumerate(data_list):
-            tv.move(k, '', index)
+        """
+        Sorts the rows by a column, the sort order of each column and direction is kept until new rows are shown.
+        """
+        if (col, reverse) not in self._sort_orders:
+            values = column_values(self._unsorted_rows, tv['columns'], col)
+            self._sort_orders[(col, reverse)] = sort_order(values, reverse)
+        self._sort = (col, reverse)
+        self.rows = [self._unsorted_rows[row] for row in self._sort_orders[(col, reverse)]]
+        self._first_row = 0
+        self._selected_rows.clear()
+        self.render_rows()
 
         # reverse sort next time
         tv.heading(col, text=col, command=lambda _col=col: self.sort_column(tv, _col, not reverse))
 
     def delete_results(self):
-        for log in self.results.get_children():
-            self.results.delete(log)
+        self.results.delete(*self.results.get_children())
 
-    def display_results(self, tvd: TreeViewData):
-        self.results['columns'] = ()
-        self.results['columns'] = tvd.header
+    def _row_height(self) -> Tuple[int, int]:
+        """
+        Measures the first rendered row.
+        :return: (heading height, row height)
+        """
+        children = self.results.get_children()
+        bbox = self.results.bbox(children[0]) if children else ''
+        if not bbox:
+            return self.default_row_height, self.default_row_height
+        return bbox[1], bbox[3]
+
+    def on_resize(self, event=None):
+        heading_height, row_height = self._row_height()
+        visible_rows = max(1, (self.results.winfo_height() - heading_height) // row_height)
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self.render_rows()
+
+    def on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll('scroll', -3, 'units')
+        else:
+            self.scroll('scroll', 3, 'units')
+        return 'break'
+
+    def on_key(self, event):
+        """
+        Moves the focused row, scrolling the window when it leaves the visible rows.
+        """
+        steps = {'Up': -1, 'Down': 1, 'Prior': -self._visible_rows, 'Next': self._visible_rows,
+                 'Home': -len(self.rows), 'End': len(self.rows)}
+        if not self.rows:
+            return 'break'
+        focus = self.results.focus()
+        row = int(focus) if focus else self._first_row
+        row = max(0, min(len(self.rows) - 1, row + steps[event.keysym]))
+        if row < self._first_row:
+            self._first_row = row
+        elif row >= self._first_row + self._visible_rows:
+            self._first_row = row - self._visible_rows + 1
+        self._selected_rows = {row}
+        self.render_rows()
+        self.results.focus(str(row))
+        return 'break'
+
+    def scroll(self, action, amount, unit=None):
+        """
+        Scrollbar command, moves the window of rendered rows.
+        """
+        if action == 'moveto':
+            self._first_row = int(float(amount) * len(self.rows))
+        elif unit == 'pages':
+            self._first_row += int(amount) * self._visible_rows
+        else:
+            self._first_row += int(amount)
+        self.render_rows()
 
-        for heading in tvd.header:
-            self.results.heading(f'{heading}', text=f'{heading}',
-                                 command=lambda _col=heading: self.sort_column(self.results, _col, False))
+    def render_rows(self):
+        """
+        Renders the rows in view, plus ResultDisplayFrame.row_buffer rows, and updates the scrollbar to match.
+        """
+        self._first_row = max(0, min(self._first_row, len(self.rows) - self._visible_rows))
+        last_row = min(len(self.rows), self._first_row + self._visible_rows + self.row_buffer)
         self.delete_results()
-        for log in tvd.log_folder.log_list:
+        for row in range(self._first_row, last_row):
             self.results.insert('',
                                 tk.END,
+                                iid=str(row),
                                 text='',
-                                values=log.values(),
+                                values=self.rows[row].values(),
                                 )
+        self.results.selection_set([str(row) for row in range(self._first_row, last_row)
+                                    if row in self._selected_rows])
+        self.results.yview_moveto(0)
+        total_rows = max(len(self.rows), 1)
+        self.y_scrollbar.set(self._first_row / total_rows,
+                             min(1.0, (self._first_row + self._visible_rows) / total_rows))
+
+    def _resort(self, rows: List[Log], previous_order: List[int]) -> List[int]:
+        """
+        Sorts rows that have had rows added to them by the current sort. The rows that were already sorted are put
+        first, in their sorted order, so sorting them again only has to place the added rows.
+        :param previous_order: the sort order of the rows before rows were added
+        :return: positions of the rows in sorted order
+        """
+        column, reverse = self._sort
+        positions = {id(log): position for position, log in enumerate(rows)}
+        if reverse:
+            # Ascending, so the rows are already in order for sort_order
+            previous_order = previous_order[::-1]
+        ordered = [positions.pop(id(self._unsorted_rows[row])) for row in previous_order
+                   if id(self._unsorted_rows[row]) in positions]
+        ordered.extend(sorted(positions.values()))
+        values = column_values([rows[position] for position in ordered], self.results['columns'], column)
+        return [ordered[position] for position in sort_order(values, reverse)]
+
+    def show_rows(self, rows: List[Log], keep_position=False):
+        """
+        :param keep_position: keep the first row, selection and sort, for when rows have been added. Otherwise the
+        rows are shown unsorted
+        """
+        sort_orders, self._sort_orders = self._sort_orders, {}
+        if not keep_position:
+            self._sort = None
+            self._first_row = 0
+            self._selected_rows.clear()
+        if self._sort is None:
+            self.rows = self._unsorted_rows = rows
+        else:
+            selected = {id(self.rows[row]) for row in self._selected_rows}
+            self._sort_orders[self._sort] = self._resort(rows, sort_orders[self._sort])
+            self._unsorted_rows = rows
+            self.rows = [rows[row] for row in self._sort_orders[self._sort]]
+            # The added rows can be sorted in among the selected ones
+            self._selected_rows = {row for row, log in enumerate(self.rows) if id(log) in selected}
+        self.render_rows()
+
+    def display_results(self, tvd: TreeViewData, keep_position=False):
+        if not keep_position or tuple(self.results['columns']) != tuple(tvd.header):
+            self.results['columns'] = ()
+            self.results['columns'] = tvd.header
+
+            for heading in tvd.header:
+                self.results.heading(f'{heading}', text=f'{heading}',
+                                     command=lambda _col=heading: self.sort_column(self.results, _col, False))
+        self.show_rows(tvd.log_list, keep_position)
 
 
 class ClientApp(tk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, workers: int = 1, cache: ParseCache = None, raw_refs: bool = False, **kwargs):
+        """
+        :param workers: number of processes used to parse the log files, see OptionsFrame
+        :param cache: parse cache to load unchanged files from, see OptionsFrame
+        :param raw_refs: logs keep where they are in their files rather than their raw text, see OptionsFrame
+        """
         tk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent = parent
         self.pack_propagate(True)
         self.configure(borderwidth=0, height=1080, width=1920)
 
-        self.options_frame = OptionsFrame(self)
+        self.options_frame = OptionsFrame(self, workers=workers, cache=cache, raw_refs=raw_refs)
         self.options_frame.pack(side='left', fill='both', expand=False)
 
         self.result_display_frame = ResultDisplayFrame(self)
         self.result_display_frame.pack(side='left', fill='both', expand=True)
 
 
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Logger, read and filter WebPAS logs.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes used to parse the logs, defaults to parsing them on the loading thread')
+    parser.add_argument('--cache', action='store_true',
+                        help='load unchanged files from the parse cache, which keeps the parsed logs on disk')
+    parser.add_argument('--cache-dir', default=None,
+                        help='parse cache folder, defaults to ~/.logapp/cache, implies --cache')
+    parser.add_argument('--raw-refs', action='store_true',
+                        help='keep where each log is in its file instead of its raw text, read back when it is shown')
+    return parser.parse_args(args)
+
+
 if __name__ == '__main__':
+    arguments = parse_args()
     root = tk.Tk()
     root.geometry('1920x1080')
     root.title('Logger')
@@ -1310,5 +1006,7 @@ if __name__ == '__main__':
                          highlightcolor=BACKGROUND,
                          )
 
-    ClientApp(root).pack(side='top', fill='both', expand=True)
+    parse_cache = ParseCache(arguments.cache_dir) if arguments.cache or arguments.cache_dir else None
+    ClientApp(root, workers=arguments.workers, cache=parse_cache,
+              raw_refs=arguments.raw_refs).pack(side='top', fill='both', expand=True)
     root.mainloop()
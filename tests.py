@@ -1,7 +1,59 @@
 import _tkinter
+import csv
+import gzip
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
 import tkinter as tk
 import unittest
+from os.path import join
+from unittest import mock
+import benchmark
+import cli
+import loggen
+import logparser
 import main
+import workbench
+
+BRD_SEPARATOR = 80 * '-'
+
+
+def brd_message(message_id, ur_number, visit_number, message_time='20200101120000'):
+    """
+    Builds the lines of a broadcaster log entry, the 52 character prefix puts the MSH segment at offset 53 once the
+    lines are joined.
+    """
+    return [BRD_SEPARATOR,
+            f'{message_time[:4]}-{message_time[4:6]}-{message_time[6:8]} 12:00:00.000 [PASBRD01] Outbound msg sent',
+            f'MSH|^~\\&|PAS|SJOG|HBA|SJOG|{message_time}||ADT^A01|{message_id}|P|2.4',
+            f'EVN|A01|{message_time}',
+            f'PID|1||{ur_number}^^^SJOG^MR||SMITH^JOHN^"||19800101|M',
+            f'PV1|1|I|4EAST^^12^SJOG||{visit_number}']
+
+
+def pas_access_line(user, ur_number, visit_number, time='12:00:00'):
+    return (f'10.1.1.20 {user} 2020-01-01 {time} "GET /cgi-bin/pas00001.pbl?template=12&urnumber={ur_number}'
+            f'&admissno={visit_number} HTTP/1.1" 200 5120 0.015 '
+            f'"Referer=https://webpas.sjog.org.au/cgi-bin/pas00002.pbl?template=1&urnumber={ur_number}"')
+
+
+def write_brd_log(path, messages, compress=False):
+    lines = [line for message in messages for line in message] + [BRD_SEPARATOR]
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='latin-1') as log_file:
+        log_file.write('\n'.join(lines) + '\n')
+
+
+def write_mllp_capture(path, messages, mode='w'):
+    """
+    Writes the segments of log entries as MLLP frames, the way a capture of the broadcaster's traffic holds them.
+    """
+    frames = ['\x0b' + '\r'.join(message[2:]) + '\r\x1c\r' for message in messages]
+    with open(path, mode, encoding='latin-1', newline='') as log_file:
+        log_file.write('\n'.join(frames))
 
 
 class TKTestCase(unittest.TestCase):
@@ -82,5 +134,1060 @@ class TestOptionsFrame(TKTestCase):
             self.assertEqual(suffix.name, self.client_app.options_frame.log_list_var.get())
 
 
+class TestResultDisplayFrame(TKTestCase):
+    class Row:
+        blank_values = {}
+
+        def __init__(self, value):
+            self.value = value
+
+        def values(self):
+            return self.value,
+
+    def test_only_rows_in_view_are_rendered(self):
+        result_display_frame = self.client_app.result_display_frame
+        result_display_frame.results['columns'] = ('value',)
+        result_display_frame.show_rows([self.Row(value) for value in range(100000)])
+        rendered = result_display_frame.results.get_children()
+        self.assertLessEqual(len(rendered), result_display_frame._visible_rows + result_display_frame.row_buffer)
+        result_display_frame.scroll('moveto', '0.5')
+        self.assertEqual(result_display_frame.results.get_children()[0], '50000')
+        self.assertEqual(result_display_frame.results.item('50000')['values'], [50000])
+
+    def test_added_rows_keep_position(self):
+        result_display_frame = self.client_app.result_display_frame
+        result_display_frame.results['columns'] = ('value',)
+        rows = [self.Row(value) for value in range(1000)]
+        result_display_frame.show_rows(rows[:500])
+        result_display_frame.scroll('moveto', '0.5')
+        result_display_frame.show_rows(rows, keep_position=True)
+        self.assertEqual(result_display_frame.results.get_children()[0], '250')
+
+    def test_added_rows_keep_sort(self):
+        result_display_frame = self.client_app.result_display_frame
+        result_display_frame.results['columns'] = ('value',)
+        rows = [self.Row(value % 7) for value in range(100)]
+        result_display_frame.show_rows(rows[:50])
+        result_display_frame.sort_column(result_display_frame.results, 'value', True)
+        selected = result_display_frame.rows[0]
+        result_display_frame._selected_rows = {0}
+        result_display_frame.show_rows(rows, keep_position=True)
+        self.assertListEqual([row.value for row in result_display_frame.rows],
+                             sorted((row.value for row in rows), reverse=True))
+        self.assertListEqual([result_display_frame.rows[row] for row in result_display_frame._selected_rows],
+                             [selected])
+        result_display_frame.show_rows(rows[:10])
+        self.assertListEqual(result_display_frame.rows, rows[:10])
+
+
+class TestSortOrder(unittest.TestCase):
+    def test_numbers_sort_by_value_and_blanks_last(self):
+        values = ['100', 9, '', '20', None, 3]
+        self.assertListEqual(logparser.sort_order(values), [5, 1, 3, 0, 2, 4])
+        self.assertListEqual(logparser.sort_order(values, reverse=True), [0, 3, 1, 5, 2, 4])
+
+    def test_dates_sort_by_value(self):
+        values = [logparser.datetime(2020, 1, 2), logparser.datetime(2019, 12, 31, 23, 59), logparser.datetime(2020, 1, 1)]
+        self.assertListEqual(logparser.sort_order(values), [1, 2, 0])
+
+    def test_missing_visit_numbers_sort_as_displayed(self):
+        logs = [logparser.BRDLog(' '.join(brd_message(1, 100, visit)[1:])) for visit in (20, 0, 3)]
+        header = logparser.BRDLog.header()
+        self.assertEqual(logs[1].values()[header.index('visit_number')], '')
+        values = logparser.column_values(logs, header, 'visit_number')
+        self.assertListEqual(values, [20, '', 3])
+        self.assertListEqual(logparser.sort_order(values), [2, 0, 1])
+        self.assertListEqual(logparser.sort_order(values, reverse=True), [0, 2, 1])
+
+
+class TestTimestamps(unittest.TestCase):
+    def test_matches_strptime(self):
+        cases = [(logparser.parse_hl7_datetime, '%Y%m%d%H%M%S', ['20200229235959', '20200101120000', '2020010112000',
+                                                            '20201301120000', '2020010112000x', '']),
+                 (logparser.parse_access_log_datetime, '%Y-%m-%d %H:%M:%S', ['2020-02-29 23:59:59', '2020-1-1 1:2:3',
+                                                                       '2020-02-30 00:00:00', '2020-01-01']),
+                 (logparser.parse_hl7_date, '%Y%m%d', ['19800101', '1980011', '19800230'])]
+        for parse, date_format, values in cases:
+            for value in values:
+                try:
+                    expected = logparser.datetime.strptime(value, date_format)
+                except ValueError:
+                    self.assertRaises(ValueError, parse, value)
+                    continue
+                if parse is logparser.parse_hl7_date:
+                    expected = expected.date()
+                self.assertEqual(parse(value), expected)
+
+
+class TestHL7Log(unittest.TestCase):
+    def test_parse_headers_matches_splitting_each_segment(self):
+        message = ' '.join(brd_message(1, 100, 10)[1:])
+        raws = [message, message.replace('PV1|', 'ZV1|'), message.replace('PID|', 'ZID|'), message[:120],
+                message.replace('[PASBRD01]', 'PID|PASBRD'), message + ' PV1|2|E|||||||||ED^5']
+        for raw in raws:
+            log = logparser.BRDLog.__new__(logparser.BRDLog)
+            log.raw = raw
+            msh, pid, pv1 = log._parse_headers()
+            self.assertListEqual(msh, raw[53:].split('|')[0:19])
+            if 'PID|' in raw:
+                self.assertListEqual(pid, raw[raw.find('PID|'):].split('|')[:31])
+            if 'PV1|' in raw:
+                self.assertListEqual(pv1, raw[raw.find('PV1|'):].split('|')[:45])
+
+
+class TestBRDLogFileBuffer(unittest.TestCase):
+    def parse(self, text):
+        attributes = ('a', 'BRDTransactionLog')
+        data = text.encode('latin-1')
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding='latin-1', errors='surrogateescape')
+        return (list(logparser.BRDLogFile(attributes, lines, lazy=True)._parse()),
+                list(logparser.BRDLogFile(attributes, logparser.LogBuffer(data), lazy=True)._parse()))
+
+    def test_matches_reading_lines(self):
+        message = ' '.join(brd_message(1, 100, 10)[1:])
+        cases = ['\n'.join(line for message in [brd_message(1, 100, 10), brd_message(2, 200, 20)] for line in message),
+                 f'preamble\n{BRD_SEPARATOR}\n{message}\n{BRD_SEPARATOR}\n',
+                 f'{BRD_SEPARATOR}\r\n {message} \r\n\r\n\xa0\x1c\r{BRD_SEPARATOR}x\r{message}\r{BRD_SEPARATOR}',
+                 f'{BRD_SEPARATOR}\nTimeout waiting for incoming message\n{BRD_SEPARATOR}\n{message}\n\n'
+                 f'{BRD_SEPARATOR}',
+                 f'x{BRD_SEPARATOR}\n{BRD_SEPARATOR[1:]}\n{BRD_SEPARATOR}-\n{message}\n{BRD_SEPARATOR}\n{message}',
+                 f'pre\r{BRD_SEPARATOR}\n\n{BRD_SEPARATOR}\n', '', BRD_SEPARATOR]
+        rng = loggen.random.Random(0)
+        pieces = [BRD_SEPARATOR, BRD_SEPARATOR + ' ', BRD_SEPARATOR[1:], ' ' + BRD_SEPARATOR, '', ' \t', '\x85x\xa0',
+                  message, 'Timeout waiting for incoming message']
+        for _ in range(500):
+            cases.append(''.join(rng.choice(pieces) + rng.choice(('\n', '\r\n', '\r', '\n\r', ''))
+                                 for _ in range(rng.randint(0, 12))))
+        for text in cases:
+            lines, buffer = self.parse(text)
+            self.assertListEqual(buffer, lines, repr(text))
+            # The bytes of each message give the same message when they're read back for a RawRef
+            data = text.encode('latin-1')
+            spans = logparser.BRDLogFile(('a', 'BRDTransactionLog'), logparser.LogBuffer(data), lazy=True)._parse_spans
+            for message, offset, length in spans(logparser.LogBuffer(data)):
+                self.assertEqual(logparser.BRDLogFile.raw_text(data[offset:offset + length]), message, repr(text))
+        self.assertEqual(len(self.parse(cases[0])[1]), 1)
+
+    def test_access_log_lines_match_reading_text(self):
+        line = pas_access_line('user1', 100, 10)
+        for text in (f'{line}\n{line}\n', f'{line}\r\n\r\n{line}', f'{line}\r{line}\r\r\n\n{line}\r', '', '\n'):
+            data = text.encode('latin-1')
+            lines = io.TextIOWrapper(io.BytesIO(data), encoding='latin-1', errors='surrogateescape')
+            log_file = logparser.PASLogFile(('a', 'PASAccessLog'), logparser.LogBuffer(data), lazy=True)
+            self.assertListEqual(list(log_file._parse()),
+                                 list(logparser.PASLogFile(('a', 'PASAccessLog'), lines, lazy=True)._parse()))
+            for raw, offset, length in log_file._parse_spans(logparser.LogBuffer(data)):
+                self.assertEqual(logparser.PASLogFile.raw_text(data[offset:offset + length]), raw)
+
+    def test_base_log_file_reads_no_logs(self):
+        log_buffer = logparser.LogBuffer(b'x\n')
+        log_file = logparser.LogFile(('a', 'PASAccessLog'), log_buffer, lazy=True)
+        self.assertListEqual(list(log_file._parse()), [])
+        self.assertListEqual(list(log_file._parse_spans(log_buffer)), [])
+
+    def test_reports_progress_and_cancels(self):
+        data = '\n'.join(line for i in range(20) for line in brd_message(i, 100, 10)).encode('latin-1')
+        read = []
+        log_buffer = logparser.LogBuffer(data, read.append)
+        log_buffer.report_size = 100
+        list(logparser.BRDLogFile(('a', 'BRDTransactionLog'), log_buffer, lazy=True)._parse())
+        self.assertGreater(len(read), 2)
+        self.assertEqual(sum(read), len(data))
+        cancelled = logparser.threading.Event()
+        cancelled.set()
+        with self.assertRaises(logparser.LoadCancelled):
+            list(logparser.BRDLogFile(('a', 'BRDTransactionLog'), logparser.LogBuffer(data, cancelled=cancelled),
+                                      lazy=True)._parse())
+
+
+class TestWorkbenchHL7Message(unittest.TestCase):
+    def setUp(self):
+        self.message = workbench.HL7Message('\n'.join(brd_message(7, '100~200&5', 10)[2:]))
+
+    def test_lookups(self):
+        self.assertIs(self.message['PID'], self.message['pid'])
+        self.assertEqual(str(self.message['msh'][10]), '7')
+        self.assertEqual(str(self.message['msh'][9][2]), 'A01')
+        self.assertEqual(str(self.message['pid'][5][2]), 'JOHN')
+        self.assertEqual(str(self.message['pid']['3.2'][1][2]), '5')
+        self.assertIsNone(self.message['zzz'])
+
+    def test_parts_must_split_and_build(self):
+        with self.assertRaises(TypeError):
+            workbench.HL7Part('PID|1', None, 'PID')
+
+    def test_missing_parts_return_every_child(self):
+        pid = self.message['pid']
+        self.assertIs(pid[99], pid.fields)
+        self.assertListEqual([field.name for field in pid[99]][:6], ['0', '1', '2', '3', '3.2', '4'])
+        self.assertListEqual([str(component) for component in pid[5][9]], ['SMITH', 'JOHN', '"'])
+        self.assertListEqual([str(subcomponent) for subcomponent in pid[5][1][9]], ['SMITH'])
+
+    def test_parts_are_split_when_accessed(self):
+        self.message['pid'][5]
+        self.assertListEqual([segment is not None for segment in self.message._segments],
+                             [False, False, True, False])
+        pid = self.message['pid']
+        self.assertEqual(sum(field is not None for field in pid._children), 1)
+        self.assertIsNone(pid[5]._raw_children)
+
+
+class TestLogFolder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reads_gzip_logs_without_extracting(self):
+        write_brd_log(join(self.path, 'today.brd'), [brd_message(1, 100, 10)])
+        write_brd_log(join(self.path, 'yesterday.brd.gz'), [brd_message(2, 200, 20), brd_message(3, 300, 30)],
+                      compress=True)
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog)
+        log_folder.run()
+        self.assertEqual([log.message_id for log in log_folder.logs['yesterday']], [2, 3])
+        self.assertEqual([log.message_id for log in log_folder.logs['today']], [1])
+        self.assertListEqual(sorted(os.listdir(self.path)), ['today.brd', 'yesterday.brd.gz'])
+
+    def test_reads_gzip_logs_named_without_suffix(self):
+        with gzip.open(join(self.path, 'access.1.gz'), 'wt') as log_file:
+            log_file.write('\n'.join(pas_access_line('user1', ur, 1) for ur in (1000, 1001)) + '\n')
+        write_brd_log(join(self.path, 'today.brd'), [brd_message(1, 100, 10)])
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.PASAccessLog)
+        log_folder.run()
+        self.assertListEqual(list(log_folder.logs), ['access.1'])
+        self.assertListEqual([log.ur_number for log in log_folder.logs['access.1']], [1000, 1001])
+        brd_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog)
+        brd_folder.run()
+        self.assertListEqual(list(brd_folder.logs), ['today'])
+
+    def test_parallel_matches_sequential(self):
+        write_brd_log(join(self.path, 'big.brd'), [brd_message(i, 100 + i, 10 + i) for i in range(1, 200)])
+        write_brd_log(join(self.path, 'small.brd.gz'), [brd_message(500, 600, 700)], compress=True)
+        sequential = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog)
+        sequential.run()
+        chunk_size, logparser.CHUNK_SIZE = logparser.CHUNK_SIZE, 4096
+        try:
+            parallel = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=2)
+            self.assertGreater(len(parallel._chunk_file('big.brd')), 1)
+            parallel.run()
+        finally:
+            logparser.CHUNK_SIZE = chunk_size
+        self.assertEqual(parallel.header, sequential.header)
+        self.assertEqual(parallel.get_progress(), sequential.get_progress())
+        for name, logs in sequential.logs.items():
+            self.assertListEqual([log.values() for log in parallel.logs[name]], [log.values() for log in logs])
+
+    def test_parallel_pas_access_logs(self):
+        with open(join(self.path, 'access.txt'), 'w') as log_file:
+            log_file.write('\n'.join(pas_access_line('user1', ur, 1) for ur in range(1000, 1010)) + '\n')
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.PASAccessLog, workers=2)
+        log_folder.run()
+        self.assertListEqual([log.ur_number for log in log_folder.logs['access']], list(range(1000, 1010)))
+
+    def test_logs_only_keep_exported_columns(self):
+        write_brd_log(join(self.path, 'today.brd'), [brd_message(1, 100, 10)])
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog)
+        log_folder.run()
+        log = log_folder.logs['today'][0]
+        self.assertFalse(hasattr(log, '__dict__'))
+        self.assertEqual(log.message_date, logparser.datetime(2020, 1, 1).date())
+        access_log = logparser.PASAccessLog(pas_access_line('user1', 1000, 1))
+        self.assertFalse(hasattr(access_log, '__dict__'))
+        self.assertEqual((access_log.ur_number, access_log.visit_number), (1000, 1))
+
+
+class TestLogFolderStats(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        write_brd_log(join(self.path, 'a.brd'), [brd_message(i, 100 + i, 10 + i) for i in range(1, 100)] +
+                      [brd_message(100, 200, 20, message_time='2020XX01120000')])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_stats(self):
+        stages = []
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, on_stats=stages.append)
+        log_folder.run()
+        report = log_folder.report()
+        self.assertEqual(stages, log_folder.stats)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0], dict(report[0], file='a.brd', stage='parse', records=99, filtered=0,
+                                         bytes_read=os.path.getsize(join(self.path, 'a.brd')),
+                                         dropped={'ValueError': 1}))
+        self.assertGreater(report[0]['records_per_second'], 0)
+
+    def test_cache_and_chunk_stats(self):
+        cache = logparser.ParseCache(join(self.path, 'cache'))
+        chunk_size, logparser.CHUNK_SIZE = logparser.CHUNK_SIZE, 4096
+        try:
+            log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=2, cache=cache)
+            log_folder.run()
+        finally:
+            logparser.CHUNK_SIZE = chunk_size
+        self.assertListEqual([(stats.stage, stats.records) for stats in log_folder.stats],
+                             [('cache', 0), ('parse', 99), ('save', 99)])
+        self.assertEqual(log_folder.stats[1].bytes_read, os.path.getsize(join(self.path, 'a.brd')))
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, cache=cache)
+        log_folder.run()
+        self.assertListEqual([(stats.stage, stats.records) for stats in log_folder.stats], [('cache', 99)])
+
+    def test_short_access_logs_are_dropped(self):
+        with open(join(self.path, 'access.txt'), 'w') as log_file:
+            log_file.write('\n'.join([pas_access_line('jbloggs', 100, 10), '10.1.1.20 jbloggs 2020-01-01 12:00:00 "GET',
+                                     'not an access log']) + '\n')
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.PASAccessLog)
+        log_folder.run()
+        self.assertEqual(len(log_folder.logs['access']), 1)
+        self.assertEqual(log_folder.stats[0].dropped, {'IndexError': 1, 'ValueError': 1})
+
+
+class TestLogFolderProgress(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        write_brd_log(join(self.path, 'a.brd'), [brd_message(i, 100 + i, 10 + i) for i in range(1, 100)])
+        write_brd_log(join(self.path, 'b.brd.gz'), [brd_message(i, 100 + i, 10 + i) for i in range(1, 100)],
+                      compress=True)
+        self.size = sum(os.path.getsize(join(self.path, file)) for file in os.listdir(self.path))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_progress_counts_bytes_on_disk(self):
+        for workers in (1, 2):
+            log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=workers)
+            self.assertIsNone(log_folder.eta())
+            log_folder.run()
+            self.assertEqual(log_folder.progress_max, self.size)
+            self.assertEqual(log_folder.get_progress(), self.size)
+            self.assertEqual(log_folder.eta(), 0)
+
+    def test_gzip_progress_counts_compressed_bytes(self):
+        reads = []
+        with logparser.open_log_file(join(self.path, 'b.brd.gz'), on_read=reads.append) as log_file:
+            self.assertGreater(len(log_file.read()), os.path.getsize(join(self.path, 'b.brd.gz')))
+        self.assertEqual(sum(reads), os.path.getsize(join(self.path, 'b.brd.gz')))
+
+    def test_cancel_between_files(self):
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog,
+                                         on_stats=lambda stats: log_folder.cancel())
+        with self.assertRaises(logparser.LoadCancelled):
+            log_folder.run()
+        self.assertEqual(len(log_folder.logs), 1)
+
+    def test_cancel_while_reading(self):
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog)
+        logs = log_folder.iter_logs()
+        next(logs)
+        log_folder.cancel()
+        with self.assertRaises(logparser.LoadCancelled):
+            list(logs)
+
+    def test_cancel_parallel(self):
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=2)
+
+        def cancel_and_wait(*args, **kwargs):
+            log_folder.cancel()
+            return wait(*args, **kwargs)
+        wait = logparser.wait
+        with mock.patch('logparser.wait', side_effect=cancel_and_wait):
+            with self.assertRaises(logparser.LoadCancelled):
+                log_folder.run()
+        self.assertEqual(log_folder.logs, {})
+
+    def test_format_eta(self):
+        self.assertEqual(main.ProgressBar.format_eta(65.4), '1:05 left')
+        self.assertEqual(main.ProgressBar.format_eta(None), '')
+
+
+class TestMainArgs(unittest.TestCase):
+    def test_gui_parses_on_loading_thread_by_default(self):
+        self.assertEqual(main.parse_args([]).workers, 1)
+        self.assertEqual(main.parse_args(['--workers', '4']).workers, 4)
+
+    def test_gui_cache_is_opt_in(self):
+        self.assertFalse(main.parse_args([]).cache)
+        self.assertIsNone(main.parse_args([]).cache_dir)
+        self.assertTrue(main.parse_args(['--cache']).cache)
+
+    def test_gui_keeps_raw_text_by_default(self):
+        self.assertFalse(main.parse_args([]).raw_refs)
+        self.assertTrue(main.parse_args(['--raw-refs']).raw_refs)
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        write_brd_log(join(self.path, 'a.brd'), [brd_message(i, 100 + i, 10 + i) for i in range(1, 50)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, record_filter, workers=1):
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=workers,
+                                         record_filter=record_filter)
+        log_folder.run()
+        return [log.message_id for log in log_folder.logs['a']]
+
+    def test_might_match_never_rejects_a_match(self):
+        raw = ' '.join(brd_message(1, '0100', 10)[1:])
+        for record_filter in [logparser.filter_query(ur_numbers=('100',)), logparser.filter_query(ur_numbers=(100,)),
+                              logparser.filter_query(visit_numbers=('010',)), logparser.filter_query(search_query='SMI*'),
+                              logparser.filter_query()]:
+            self.assertTrue(record_filter.might_match(raw), record_filter)
+        self.assertFalse(logparser.filter_query(ur_numbers=('777',)).might_match(raw))
+        self.assertFalse(logparser.filter_query(search_query='smith jones').might_match(raw))
+
+    def test_only_candidates_are_parsed(self):
+        with mock.patch.object(logparser.HL7Log, '_parse_headers', autospec=True,
+                               side_effect=logparser.HL7Log._parse_headers) as parse_headers:
+            self.assertListEqual(self.read(logparser.filter_query(ur_numbers=('0125',))), [25])
+        self.assertEqual(parse_headers.call_count, 1)
+
+    def test_empty_filter_is_falsy(self):
+        self.assertFalse(logparser.filter_query())
+        self.assertFalse(logparser.filter_query(search_query=' - ^ '))
+        self.assertTrue(logparser.filter_query(search_query='smith'))
+
+    def test_queries_must_match_logs(self):
+        with self.assertRaises(TypeError):
+            logparser.Query()
+
+    def test_search_without_words_matches_every_log(self):
+        tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog))
+        tree_view_data.run()
+        search = logparser.Search('-')
+        self.assertEqual(len(search.positions(tree_view_data.index)), 49)
+        self.assertTrue(all(search(log) and search.might_match(log.raw) for log in tree_view_data.index.logs))
+        tree_view_data.filter(search_query='-')
+        self.assertEqual(len(tree_view_data.log_list), 49)
+        self.assertEqual(len(self.read(logparser.filter_query(search_query='-'))), 49)
+
+    def test_parallel_matches_sequential(self):
+        record_filter = logparser.filter_query(visit_numbers=('20', '30', '999'), search_query='smith')
+        self.assertListEqual(self.read(record_filter, workers=2), self.read(record_filter))
+        self.assertListEqual(self.read(record_filter), [10, 20])
+
+    def test_index_positions_match_checking_each_log(self):
+        loggen.generate_logs(self.path, logparser.Suffix.BRDTransactionLog, 400)
+        tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog))
+        tree_view_data.run()
+        index = tree_view_data.index
+        log = index.logs[100]
+        ur_number, visit_number = logparser.UrNumber(log.ur_number), logparser.VisitNumber(log.visit_number)
+        start = logparser.datetime(2020, 1, 1, 0, 5)
+        queries = [ur_number, visit_number, logparser.MessageType('a01', 'A08'), logparser.Search('smith 4e*'),
+                   logparser.TimeRange(start=start), ur_number & logparser.MessageType(log.message_type),
+                   (ur_number | logparser.Search('icu')) & logparser.TimeRange(end=start),
+                   logparser.filter_query(ur_numbers=(log.ur_number,), search_query='jones', match_any=True),
+                   logparser.filter_query(message_types=('A01',), search_query='4east', start=start)]
+        for query in queries:
+            self.assertSetEqual(set(query.positions(index)),
+                                {position for position, log in enumerate(index.logs) if query(log)})
+            self.assertSetEqual(set(logparser.Query.positions(query, index)), set(query.positions(index)))
+        self.assertEqual(len(logparser.filter_query().positions(index)), len(index))
+
+    def test_prefix_search_after_adding_words(self):
+        index = logparser.LogIndex()
+        index.add('a', [logparser.BRDLog(' '.join(brd_message(1, 100, 10)[1:]))])
+        self.assertListEqual(index.search_positions('smi*'), [0])
+        for count in (1, index.vocabulary_inserts + 1):
+            words = ' '.join(f'smz{len(index)}x{word}' for word in range(count))
+            index.add('a', [logparser.BRDLog(f'{words} ' + ' '.join(brd_message(2, 100, 10)[1:]))])
+            self.assertListEqual(index._vocabulary, sorted(index._words))
+            self.assertListEqual(index.search_positions(f'smz{len(index) - 1}*'), [len(index) - 1])
+        self.assertListEqual(index.search_positions('sm*'), [0, 1, 2])
+
+    def test_and_checks_the_few_candidates_left_directly(self):
+        write_brd_log(join(self.path, 'b.brd'), [brd_message(i, 200, 10) for i in range(50, 60)])
+        tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog))
+        tree_view_data.run()
+        with mock.patch.object(logparser.Search, 'positions') as search_positions:
+            tree_view_data.query(logparser.Search('smith') & logparser.UrNumber('0125'))
+        search_positions.assert_not_called()
+        self.assertListEqual([log.message_id for log in tree_view_data.log_list], [25])
+
+    def test_message_type_and_match_any(self):
+        self.assertListEqual(self.read(logparser.filter_query(message_types=(' a01',))), list(range(1, 50)))
+        self.assertListEqual(self.read(logparser.filter_query(message_types=('A08',))), [])
+        record_filter = logparser.filter_query(ur_numbers=('0111',), visit_numbers=('20',), match_any=True)
+        self.assertTrue(record_filter)
+        self.assertListEqual(self.read(record_filter), [10, 11])
+        self.assertFalse(logparser.filter_query(match_any=True))
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'NumPy is not installed')
+class TestColumnarIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_hash_indexes(self):
+        for suffix in (logparser.Suffix.BRDTransactionLog, logparser.Suffix.PASAccessLog):
+            path = join(self.path, suffix.name)
+            loggen.generate_logs(path, suffix, 1500, files=2)
+            log_folder = logparser.LogFolder(path, suffix)
+            hashed = logparser.TreeViewData(log_folder)
+            hashed.run()
+            columnar = logparser.TreeViewData(log_folder, columnar=True)
+            columnar.build_index()
+            self.assertEqual(len(columnar.index.columns), 1500)
+            log = hashed.index.logs[100]
+            start = logparser.datetime(2020, 1, 1, 0, 30)
+            filters = [dict(ur_numbers=(log.ur_number, 'abc')), dict(visit_numbers=(str(log.visit_number),)),
+                       dict(message_types=('a01', 'A08')), dict(start=start), dict(end=start),
+                       dict(ur_numbers=(log.ur_number,), search_query='4east', start=start, match_any=True),
+                       dict(visit_numbers=(log.visit_number,), search_query='smith', end=start)]
+            for kwargs in filters:
+                filtered = []
+                for tree_view_data in (hashed, columnar):
+                    tree_view_data.filter(**kwargs)
+                    filtered.append(log_folder.filtered_logs)
+                    query = logparser.filter_query(**kwargs)
+                    self.assertSetEqual(set(query.positions(tree_view_data.index)),
+                                        set(logparser.np.flatnonzero(query.mask(columnar.index)).tolist()))
+                self.assertDictEqual(filtered[1], filtered[0], kwargs)
+                for column in ('message_id', 'ur_number', 'visit_number', 'ward', 'message_type', 'user',
+                               'last_name', 'response_code'):
+                    self.assertDictEqual(columnar.count_by(column), hashed.count_by(column), column)
+
+    def test_incremental_follow_and_counts(self):
+        path = join(self.path, 'a.brd')
+        write_brd_log(path, [brd_message(i, '00100' if i % 2 else 'A7', 10 + i % 3) for i in range(1, 1200)] +
+                      [brd_message(5000, 300, 12)])
+        tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog),
+                                                incremental=True, columnar=True)
+        tree_view_data.run()
+        while tree_view_data.index_loaded(max_logs=500):
+            pass
+        self.assertDictEqual(tree_view_data.count_by('ur_number'), {100: 600, 'A7': 599, 300: 1})
+        self.assertDictEqual(tree_view_data.count_by('ward'), {'4EAST': 1200})
+        tree_view_data.filter(ur_numbers=('100', 'a7'), visit_numbers=('11',))
+        self.assertDictEqual(tree_view_data.count_by('ur_number'), {100: 200})
+        with open(path, 'a', encoding='latin-1') as log_file:
+            log_file.write('\n'.join(brd_message(2000, 'A7', 11)[1:] + [BRD_SEPARATOR]) + '\n')
+        self.assertEqual(tree_view_data.follow(), 1)
+        tree_view_data.filter(ur_numbers=('A7',), visit_numbers=('11',), message_types=('A01',))
+        self.assertEqual(tree_view_data.count_by('message_id')[2000], 1)
+        self.assertEqual(len(tree_view_data.log_list), 201)
+        tree_view_data.filter(ur_numbers=('300',), end=logparser.datetime(2020, 1, 1, 12))
+        self.assertListEqual([log.message_id for log in tree_view_data.log_list], [5000])
+
+
+class TestMLLP(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_frames_from_any_buffer(self):
+        data = b'junk\x0bA|1\rB\x1c\r\x0bbroken\x0bC\x1c\r\x0bunfinished'
+        path = join(self.directory.name, 'capture')
+        with open(path, 'wb') as capture:
+            capture.write(data)
+        with open(path, 'rb') as capture, logparser.mmap.mmap(capture.fileno(), 0,
+                                                               access=logparser.mmap.ACCESS_READ) as mapped:
+            self.assertListEqual([bytes(frame) for frame in logparser.mllp_frames(mapped)], [b'A|1\rB', b'C'])
+        for buffer in (data, bytearray(data), memoryview(data)):
+            self.assertListEqual([bytes(frame) for frame in logparser.mllp_frames(buffer)], [b'A|1\rB', b'C'])
+        self.assertListEqual([bytes(frame) for frame in logparser.mllp_frames(data, 4, 20)], [b'A|1\rB'])
+        for block_size in (1, 3, 1024):
+            frames = logparser.read_mllp_frames(io.BytesIO(data), block_size)
+            self.assertListEqual(list(frames), [b'A|1\rB', b'C'])
+
+    def test_captures_parse_like_dash_logs(self):
+        rng = loggen.random.Random(0)
+        patients = loggen.patients(rng, 5)
+        for suffix, message in ((logparser.Suffix.BRDTransactionLog, loggen.brd_message),
+                                (logparser.Suffix.RECTransactionLog, loggen.rec_message)):
+            path = join(self.directory.name, suffix.name)
+            os.mkdir(path)
+            messages = [message(rng, rng.choice(patients), i, loggen.datetime(2020, 1, 1, 12, i)) for i in range(40)]
+            write_brd_log(join(path, f'dash.{suffix.value}'), messages)
+            write_mllp_capture(join(path, f'mllp.{suffix.value}'), messages)
+            with gzip.open(join(path, f'mllp_gz.{suffix.value}.gz'), 'wb') as capture, \
+                    open(join(path, f'mllp.{suffix.value}'), 'rb') as plain:
+                capture.write(plain.read())
+            log_folder = logparser.LogFolder(path, suffix)
+            log_folder.run()
+            chunk_size, logparser.CHUNK_SIZE = logparser.CHUNK_SIZE, 1024
+            try:
+                parallel = logparser.LogFolder(path, suffix, workers=2)
+                self.assertGreater(len(parallel._chunk_file(f'mllp.{suffix.value}')), 1)
+                parallel.run()
+            finally:
+                logparser.CHUNK_SIZE = chunk_size
+            expected = [log.values()[:-1] for log in log_folder.logs['dash']]
+            self.assertEqual(len(expected), 40)
+            self.assertTrue(all(values[0] is not None and values[4] for values in expected))
+            for logs in (log_folder.logs['mllp'], log_folder.logs['mllp_gz'], parallel.logs['mllp']):
+                self.assertListEqual([log.values()[:-1] for log in logs], expected)
+            self.assertTrue(log_folder.logs['mllp'][0].raw.startswith('MSH|^~\\&|'))
+
+    def test_dash_logs_with_start_bytes(self):
+        messages = [brd_message(1, 100, 10), brd_message(2, 200, 20)]
+        messages[1][4] = messages[1][4].replace('SMITH', 'SMI\x0bTH')
+        write_brd_log(join(self.directory.name, 'dash.brd'), messages)
+        with open(join(self.directory.name, 'capture.brd'), 'w', encoding='latin-1', newline='') as capture:
+            capture.write('\r\n')
+        write_mllp_capture(join(self.directory.name, 'capture.brd'), [brd_message(3, 300, 30)], mode='a')
+        for name, log_file_class in (('dash.brd', logparser.BRDLogFile), ('capture.brd', logparser.MLLPLogFile)):
+            self.assertIs(logparser.sniff_log_file_class(join(self.directory.name, name), 'BRDTransactionLog'),
+                          log_file_class)
+        log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog)
+        log_folder.run()
+        self.assertListEqual([log.message_id for log in log_folder.logs['dash']], [1, 2])
+        self.assertListEqual([log.message_id for log in log_folder.logs['capture']], [3])
+
+    def test_follow_capture(self):
+        path = join(self.directory.name, 'capture.brd')
+        write_mllp_capture(path, [brd_message(1, 100, 10)])
+        with open(path, 'a', newline='') as capture:
+            capture.write('\n\x0bMSH|^~\\&|PAS')
+        log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog)
+        log_folder.run()
+        with open(path, 'a', newline='') as capture:
+            capture.write('|SJOG\r\x1c\r')
+        write_mllp_capture(path, [brd_message(2, 200, 20)], mode='a')
+        self.assertListEqual([log.message_id for log in log_folder.follow()['capture']], [None, 2])
+        self.assertListEqual([log.message_id for log in log_folder.logs['capture']], [1, None, 2])
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = join(self.directory.name, 'logs')
+        os.mkdir(self.path)
+        self.cache = logparser.ParseCache(join(self.directory.name, 'cache'))
+        write_brd_log(join(self.path, 'old.brd'), [brd_message(1, 100, 10)])
+        write_brd_log(join(self.path, 'new.brd'), [brd_message(2, 200, 20)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, workers=1, record_filter=None):
+        log_folder = logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog, workers=workers, cache=self.cache,
+                                         record_filter=record_filter)
+        log_folder.run()
+        return log_folder
+
+    def test_unchanged_files_load_from_cache(self):
+        first = self.read()
+        write_brd_log(join(self.path, 'new.brd'), [brd_message(2, 200, 20), brd_message(3, 300, 30)])
+        with mock.patch('logparser.read_log_file', wraps=logparser.read_log_file) as read_log_file:
+            second = self.read()
+        self.assertEqual([call.args[0] for call in read_log_file.call_args_list], [join(self.path, 'new.brd')])
+        self.assertEqual([log.values() for log in second.logs['old']], [log.values() for log in first.logs['old']])
+        self.assertEqual([log.message_id for log in second.logs['new']], [2, 3])
+        self.assertEqual(second.header, first.header)
+
+    def test_filtered_reads_are_not_cached(self):
+        filtered = self.read(record_filter=logparser.filter_query(ur_numbers=('100',)))
+        self.assertEqual(filtered.logs, {'old': filtered.logs['old'], 'new': []})
+        self.assertFalse(os.path.exists(join(self.directory.name, 'cache')))
+        self.read()
+        filtered = self.read(record_filter=logparser.filter_query(ur_numbers=('200',)))
+        self.assertEqual([log.message_id for log in filtered.logs['new']], [2])
+        self.assertEqual(filtered.logs['old'], [])
+
+    def test_older_versions_are_parsed_again(self):
+        self.read()
+        with mock.patch.object(logparser.ParseCache, 'version', logparser.ParseCache.version + 1):
+            with mock.patch('logparser.read_log_file', wraps=logparser.read_log_file) as read_log_file:
+                self.read()
+        self.assertEqual(read_log_file.call_count, 2)
+
+    def test_parallel_uses_cache(self):
+        self.read()
+        log_folder = self.read(workers=2)
+        self.assertEqual([log.message_id for log in log_folder.logs['old']], [1])
+        self.assertEqual(log_folder.get_progress(), log_folder.progress_max)
+
+
+class TestTreeViewData(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        write_brd_log(join(self.directory.name, 'a.brd'),
+                      [brd_message(1, 100, 10), brd_message(2, 200, 20), brd_message(3, 100, 30)])
+        write_brd_log(join(self.directory.name, 'b.brd'), [brd_message(4, 300, 10), brd_message(5, 100, 40)])
+        self.tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog))
+        self.tree_view_data.run()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def message_ids(self):
+        return [log.message_id for log in self.tree_view_data.log_folder.log_list]
+
+    def test_filter_by_ur_number(self):
+        self.tree_view_data.filter_by_ur_number(('300', '0100'))
+        self.assertListEqual(sorted(self.message_ids()), [1, 3, 4, 5])
+        self.assertListEqual([log.message_id for log in self.tree_view_data.log_folder.filtered_logs['a']], [1, 3])
+
+    def test_filter_by_visit_number(self):
+        self.tree_view_data.filter_by_visit_number(('10',))
+        self.assertListEqual(sorted(self.message_ids()), [1, 4])
+
+    def test_no_matches_and_cleared_filter(self):
+        self.tree_view_data.filter_by_ur_number(('999',))
+        self.assertListEqual(self.message_ids(), [])
+        self.tree_view_data.filter_by_ur_number(())
+        self.assertListEqual(sorted(self.message_ids()), [1, 2, 3, 4, 5])
+
+    def test_filter_all(self):
+        self.tree_view_data.filter_all('SMITH 4east')
+        self.assertListEqual(sorted(self.message_ids()), [1, 2, 3, 4, 5])
+        self.tree_view_data.filter_all('smith 30')
+        self.assertListEqual(self.message_ids(), [3])
+        self.tree_view_data.filter_all('30*')
+        self.assertListEqual(sorted(self.message_ids()), [3, 4])
+        self.tree_view_data.filter_all('jones')
+        self.assertListEqual(self.message_ids(), [])
+
+    def test_filter_combines_filters(self):
+        self.tree_view_data.filter(ur_numbers=('100',), visit_numbers=('10', '40'))
+        self.assertListEqual(sorted(self.message_ids()), [1, 5])
+        self.tree_view_data.filter(ur_numbers=('100',), search_query='30')
+        self.assertListEqual(self.message_ids(), [3])
+        self.tree_view_data.filter()
+        self.assertEqual(len(self.message_ids()), 5)
+
+    def test_incremental_index_matches_run(self):
+        log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog, workers=2)
+        tree_view_data = logparser.TreeViewData(log_folder, incremental=True)
+        tree_view_data.run()
+        self.assertEqual(len(tree_view_data.index), 0)
+        batches = []
+        while True:
+            batches.append(tree_view_data.index_loaded(max_logs=2))
+            if not batches[-1]:
+                break
+        self.assertListEqual(batches, [2, 2, 1, 0])
+        self.assertListEqual(sorted(log.message_id for log in tree_view_data.log_list), [1, 2, 3, 4, 5])
+        for tvd in (self.tree_view_data, tree_view_data):
+            tvd.filter(ur_numbers=('100',), search_query='smith')
+        self.assertDictEqual({name: [log.message_id for log in logs] for name, logs in log_folder.filtered_logs.items()},
+                             {'a': [1, 3], 'b': [5]})
+        self.assertListEqual(sorted(log.message_id for log in tree_view_data.log_list), sorted(self.message_ids()))
+
+    def test_filter_by_time_range(self):
+        write_brd_log(join(self.directory.name, 'c.brd'),
+                      [brd_message(6, 100, 10, '20200101140000'), brd_message(7, 100, 10, '20200101143000'),
+                       brd_message(8, 200, 10, '20200101140500'), brd_message(9, 100, 10, '20200102090000')])
+        self.tree_view_data.log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog)
+        self.tree_view_data.run()
+        start, end = logparser.parse_time_bound('2020-01-01 14:00'), logparser.parse_time_bound('2020-01-01T14:30')
+        self.tree_view_data.filter(start=start, end=end)
+        self.assertListEqual(self.message_ids(), [6, 7, 8])
+        self.assertListEqual([log.message_id for log in self.tree_view_data.log_folder.filtered_logs['c']], [6, 7, 8])
+        self.tree_view_data.filter(ur_numbers=('100',), visit_numbers=('10',), start=start, end=end)
+        self.assertListEqual(self.message_ids(), [6, 7])
+        self.tree_view_data.filter(start=logparser.parse_time_bound('2020-01-02'))
+        self.assertListEqual(self.message_ids(), [9])
+        self.tree_view_data.filter(end=logparser.parse_time_bound('2020-01-01', end=True))
+        self.assertEqual(len(self.message_ids()), 8)
+        self.assertListEqual(self.tree_view_data.index.time_range_positions(end=logparser.datetime(2019, 1, 1)), [])
+
+    def test_parse_time_bound(self):
+        self.assertEqual(logparser.parse_time_bound(' 2020-01-01 14:00 '), logparser.datetime(2020, 1, 1, 14))
+        self.assertEqual(logparser.parse_time_bound('2020-01-01', end=True),
+                         logparser.datetime(2020, 1, 1, 23, 59, 59, 999999))
+        self.assertIsNone(logparser.parse_time_bound(''))
+        self.assertRaises(ValueError, logparser.parse_time_bound, '14:00')
+
+    def test_streamed_logs_match_filter(self):
+        log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.BRDTransactionLog,
+                                         record_filter=logparser.filter_query(ur_numbers=('0100',), search_query='30*'))
+        logs = log_folder.iter_logs()
+        self.assertEqual(log_folder.header, self.tree_view_data.header)
+        self.assertListEqual([log.message_id for log in logs], [3])
+        self.assertEqual(log_folder.get_progress(), log_folder.progress_max)
+        self.tree_view_data.filter(ur_numbers=('0100',), search_query='30*')
+        self.assertListEqual(self.message_ids(), [3])
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = join(self.directory.name, 'a.brd')
+        # The third message is still being written, there's no separator after it yet
+        self.append([brd_message(1, 100, 10, '20200101120000'), brd_message(2, 200, 20, '20200101120100'),
+                     brd_message(3, 100, 30, '20200101120200')[:4]])
+        self.tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.directory.name,
+                                                                         logparser.Suffix.BRDTransactionLog))
+        self.tree_view_data.run()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append(self, messages, path=None, separator=False):
+        lines = [line for message in messages for line in message] + ([BRD_SEPARATOR] if separator else [])
+        with open(path or self.path, 'a', encoding='latin-1') as log_file:
+            log_file.write('\n'.join(lines) + '\n')
+
+    def message_ids(self):
+        return [log.message_id for log in self.tree_view_data.log_list]
+
+    def test_follow_reads_only_whole_appended_messages(self):
+        self.assertListEqual(self.message_ids(), [1, 2])
+        self.assertEqual(self.tree_view_data.follow(), 0)
+        self.append([brd_message(3, 100, 30, '20200101120200')[4:], brd_message(4, 100, 40, '20200101120300'),
+                     [BRD_SEPARATOR, '2020-01-01 12:04:00.000 [PASBRD01] Outbound msg sent']])
+        self.assertEqual(self.tree_view_data.follow(), 2)
+        self.assertListEqual(self.message_ids(), [1, 2, 3, 4])
+        self.assertListEqual([log.message_id for log in self.tree_view_data.log_folder.logs['a']], [1, 2, 3, 4])
+        self.assertEqual(self.tree_view_data.log_folder.report()[-1]['stage'], 'follow')
+        self.append([brd_message(5, 100, 50, '20200101120400')[2:]], separator=True)
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        self.assertListEqual(self.message_ids(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.tree_view_data.log_folder.logs['a'][-1].message_type, 'A01')
+
+    def test_follow_keeps_filter_and_index_up_to_date(self):
+        self.tree_view_data.filter(ur_numbers=('100',), start=logparser.datetime(2020, 1, 1, 12, 1))
+        self.assertListEqual(self.message_ids(), [])
+        self.append([brd_message(3, 100, 30, '20200101120200')[4:], brd_message(4, 200, 40, '20200101120300'),
+                     brd_message(5, 100, 50, '20200101115900')], separator=True)
+        self.assertEqual(self.tree_view_data.follow(), 3)
+        self.assertListEqual(self.message_ids(), [3])
+        index = self.tree_view_data.index
+        fresh = logparser.LogIndex()
+        fresh.add('a', index.logs)
+        for start in (None, logparser.datetime(2020, 1, 1, 12, 1)):
+            self.assertListEqual(index.time_range_positions(start), fresh.time_range_positions(start))
+        self.assertListEqual(index.search_positions('smi*'), fresh.search_positions('smi*'))
+
+    def test_follow_new_and_replaced_files(self):
+        write_brd_log(join(self.directory.name, 'b.brd'), [brd_message(6, 100, 60)])
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        self.assertListEqual(self.message_ids(), [1, 2, 6])
+        write_brd_log(self.path, [brd_message(7, 100, 70)])
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        self.assertListEqual([log.message_id for log in self.tree_view_data.log_folder.logs['a']], [1, 2, 7])
+
+    def test_incremental_follow_and_access_logs(self):
+        path = join(self.directory.name, 'access.txt')
+        with open(path, 'w') as log_file:
+            log_file.write(pas_access_line('user1', 100, 10) + '\n' + pas_access_line('user2', 100, 10)[:30])
+        log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.PASAccessLog, workers=2)
+        tree_view_data = logparser.TreeViewData(log_folder, incremental=True)
+        tree_view_data.run()
+        tree_view_data.index_loaded()
+        with open(path, 'a') as log_file:
+            log_file.write(pas_access_line('user2', 100, 10)[30:] + '\n' + pas_access_line('user3', 100, 10))
+        self.assertEqual(tree_view_data.follow(), 1)
+        self.assertListEqual([log.user for log in tree_view_data.log_list], ['user1', 'user2'])
+
+    def test_follow_drops_deleted_files(self):
+        write_brd_log(join(self.directory.name, 'b.brd'), [brd_message(6, 100, 60)])
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        os.remove(join(self.directory.name, 'b.brd'))
+        self.append([brd_message(3, 100, 30, '20200101120200')[4:]], separator=True)
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        self.assertListEqual(self.message_ids(), [1, 2, 6, 3])
+        write_brd_log(join(self.directory.name, 'b.brd'), [brd_message(7, 100, 70)])
+        self.assertEqual(self.tree_view_data.follow(), 1)
+        self.assertListEqual([log.message_id for log in self.tree_view_data.log_folder.logs['b']], [6, 7])
+
+    def test_unfinished_access_line_is_read_once(self):
+        path = join(self.directory.name, 'access.txt')
+        lines = [pas_access_line(f'user{i}', 100, 10) for i in range(1, 4)]
+        with open(path, 'w') as log_file:
+            log_file.write(lines[0] + '\n' + lines[1] + '\n' + lines[2][:-20])
+        for raw_refs in (False, True):
+            log_folder = logparser.LogFolder(self.directory.name, logparser.Suffix.PASAccessLog, raw_refs=raw_refs)
+            log_folder.run()
+            self.assertListEqual([log.user for log in log_folder.logs['access']], ['user1', 'user2'])
+            with open(path, 'w') as log_file:
+                log_file.write('\n'.join(lines) + '\n')
+            self.assertListEqual([log.user for log in log_folder.follow()['access']], ['user3'])
+            self.assertListEqual([log.raw for log in log_folder.logs['access']], lines)
+            with open(path, 'w') as log_file:
+                log_file.write(lines[0] + '\n' + lines[1] + '\n' + lines[2][:-20])
+
+    def test_load_stops_at_size_when_found(self):
+        size = os.path.getsize(self.path)
+        self.append([brd_message(3, 100, 30, '20200101120200')[4:]], separator=True)
+        attributes = ('a', 'BRDTransactionLog')
+        for chunk in ((0, None), (0, size)):
+            header, logs, stats = logparser.read_log_file(self.path, attributes, chunk, size=size)
+            self.assertListEqual([log.message_id for log in logs], [1, 2])
+            self.assertEqual(stats.bytes_read, size)
+        header, logs, stats = logparser.read_log_file(self.path, attributes)
+        self.assertListEqual([log.message_id for log in logs], [1, 2, 3])
+
+
+class TestRawRefs(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        write_brd_log(join(self.path, 'a.brd'), [brd_message(i, 100 + i % 3, 10 + i) for i in range(1, 100)])
+        write_brd_log(join(self.path, 'b.brd.gz'), [brd_message(200, 300, 400)], compress=True)
+        with open(join(self.path, 'access.txt'), 'w', newline='\r\n') as log_file:
+            log_file.write('\n'.join(pas_access_line('user1', ur, 1) for ur in range(1000, 1050)) + '\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, suffix, **kwargs):
+        log_folder = logparser.LogFolder(self.path, suffix, **kwargs)
+        log_folder.run()
+        return log_folder
+
+    def test_raw_text_is_read_back_from_the_file(self):
+        for suffix in (logparser.Suffix.BRDTransactionLog, logparser.Suffix.PASAccessLog):
+            expected = self.read(suffix)
+            chunk_size, logparser.CHUNK_SIZE = logparser.CHUNK_SIZE, 2048
+            try:
+                for workers in (1, 2):
+                    log_folder = self.read(suffix, workers=workers, raw_refs=True)
+                    for name, logs in expected.logs.items():
+                        self.assertListEqual([log.values() for log in log_folder.logs[name]],
+                                             [log.values() for log in logs])
+            finally:
+                logparser.CHUNK_SIZE = chunk_size
+        logs = log_folder.logs['access']
+        self.assertIsInstance(logs[0]._raw, logparser.RawRef)
+        log_folder = self.read(logparser.Suffix.BRDTransactionLog, raw_refs=True)
+        self.assertIsInstance(log_folder.logs['a'][0]._raw, logparser.RawRef)
+        # Compressed files keep their raw text
+        self.assertIsInstance(log_folder.logs['b'][0]._raw, str)
+
+    def test_search_cache_and_follow(self):
+        cache = logparser.ParseCache(join(self.path, 'cache'))
+        self.read(logparser.Suffix.BRDTransactionLog, cache=cache, raw_refs=True)
+        tree_view_data = logparser.TreeViewData(logparser.LogFolder(self.path, logparser.Suffix.BRDTransactionLog,
+                                                                    cache=cache, raw_refs=True))
+        tree_view_data.run()
+        self.assertEqual(tree_view_data.log_folder.report()[0]['stage'], 'cache')
+        tree_view_data.filter(search_query='smith 4east', ur_numbers=('101',))
+        self.assertEqual(len(tree_view_data.log_list), 33)
+        with open(join(self.path, 'a.brd'), 'a', encoding='latin-1') as log_file:
+            log_file.write('\n'.join(brd_message(500, 101, 10)[1:] + [BRD_SEPARATOR]) + '\n')
+        self.assertEqual(tree_view_data.follow(), 1)
+        log = tree_view_data.log_list[-1]
+        self.assertIsInstance(log._raw, logparser.RawRef)
+        self.assertEqual(log.raw, ' '.join(brd_message(500, 101, 10)[1:]))
+
+    def test_cache_keeps_raw_refs_apart(self):
+        cache = logparser.ParseCache(join(self.path, 'cache'))
+        self.read(logparser.Suffix.BRDTransactionLog, cache=cache)
+        # The first raw_refs read misses the cache the plain read saved, then each loads its own cache file
+        for raw_refs, raw_type, cached in ((True, logparser.RawRef, 0), (False, str, 99), (True, logparser.RawRef, 99)):
+            log_folder = self.read(logparser.Suffix.BRDTransactionLog, cache=cache, raw_refs=raw_refs)
+            self.assertIsInstance(log_folder.logs['a'][0]._raw, raw_type)
+            self.assertEqual((log_folder.stats[0].stage, log_folder.stats[0].records), ('cache', cached))
+
+    def test_cli_export_matches(self):
+        outputs = [join(self.path, 'kept.csv'), join(self.path, 'refs.csv')]
+        for output, raw_refs in zip(outputs, ([], ['--raw-refs'])):
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--no-cache'] + raw_refs), 0)
+        with open(outputs[0]) as kept, open(outputs[1]) as refs:
+            self.assertEqual(kept.read(), refs.read())
+
+
+class TestLoggen(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_generated_logs_parse(self):
+        for suffix in logparser.Suffix:
+            for compress in (False, True):
+                path = join(self.directory.name, f'{suffix.name}{compress}')
+                loggen.generate_logs(path, suffix, 101, files=2, compress=compress)
+                log_folder = logparser.LogFolder(path, suffix)
+                log_folder.run()
+                self.assertDictEqual({name: len(logs) for name, logs in log_folder.logs.items()},
+                                     {'log_20200101': 51, 'log_20200102': 50})
+                if suffix is not logparser.Suffix.PASAccessLog:
+                    logs = log_folder.logs['log_20200101']
+                    self.assertListEqual([log.message_id for log in logs], list(range(1, 52)))
+                    self.assertTrue(all(log.ur_number and log.type_description for log in logs))
+
+    def test_seed_repeats_logs(self):
+        first = list(loggen.log_lines(logparser.Suffix.RECTransactionLog, 10, loggen.datetime(2020, 1, 1), seed=3))
+        second = list(loggen.log_lines(logparser.Suffix.RECTransactionLog, 10, loggen.datetime(2020, 1, 1), seed=3))
+        self.assertListEqual(first, second)
+
+    def test_benchmark_times_every_stage(self):
+        loggen.generate_logs(self.directory.name, logparser.Suffix.BRDTransactionLog, 200)
+        results = benchmark.run(self.directory.name, logparser.Suffix.BRDTransactionLog).results
+        self.assertEqual(results[0], dict(results[0], stage='LogFolder.run', records=200))
+        self.assertEqual(results[-1]['stage'], 'write_csv')
+        self.assertIn('display_results', [result['stage'] for result in results])
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = join(self.directory.name, 'logs')
+        os.mkdir(self.path)
+        write_brd_log(join(self.path, 'a.brd'),
+                      [brd_message(1, 100, 10), brd_message(2, 200, 20), brd_message(3, 100, 30)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_filters_and_exports(self):
+        output = join(self.directory.name, 'extract.csv')
+        self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--ur-number', '100', '--search', 'smith',
+                                   '--workers', '1', '--no-cache']), 0)
+        with open(output, newline='') as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0][0], 'message_id')
+        self.assertListEqual([row[0] for row in rows[1:]], ['1', '3'])
+
+    def test_cache_is_opt_in(self):
+        output = join(self.directory.name, 'extract.csv')
+        cache = join(self.directory.name, '.logapp', 'cache')
+        with mock.patch.dict(os.environ, {'HOME': self.directory.name}):
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--workers', '1']), 0)
+            self.assertFalse(os.path.exists(cache))
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--workers', '1', '--cache']), 0)
+            self.assertEqual(len(os.listdir(cache)), 1)
+
+    def test_stream_matches_export(self):
+        outputs = [join(self.directory.name, 'loaded.csv'), join(self.directory.name, 'streamed.csv')]
+        for output, stream in zip(outputs, ([], ['--stream'])):
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--visit-number', '10', '30',
+                                       '--no-cache'] + stream), 0)
+        with open(outputs[0]) as loaded, open(outputs[1]) as streamed:
+            self.assertEqual(loaded.read(), streamed.read())
+
+    def test_time_range(self):
+        write_brd_log(join(self.path, 'b.brd'), [brd_message(4, 100, 40, '20200101143000')])
+        output = join(self.directory.name, 'extract.csv')
+        for stream in ([], ['--stream']):
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--ur-number', '100', '--from',
+                                       '2020-01-01 14:00', '--to', '2020-01-01 15:00', '--no-cache'] + stream), 0)
+            with open(output, newline='') as csv_file:
+                self.assertListEqual([row[0] for row in list(csv.reader(csv_file))[1:]], ['4'])
+
+    def test_message_type_and_match_any(self):
+        output = join(self.directory.name, 'extract.csv')
+        for arguments, message_ids in ((['--ur-number', '200', '--visit-number', '30', '--match-any'], ['2', '3']),
+                                       (['--ur-number', '200', '--message-type', 'A08'], [])):
+            self.assertEqual(cli.main([self.path, 'BRDTransactionLog', output, '--no-cache'] + arguments), 0)
+            with open(output, newline='') as csv_file:
+                self.assertListEqual([row[0] for row in list(csv.reader(csv_file))[1:]], message_ids)
+
+    def test_does_not_import_tkinter_or_numpy(self):
+        result = subprocess.run([sys.executable, '-c',
+                                 'import sys, cli; print("tkinter" in sys.modules, "numpy" in sys.modules)'],
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.strip(), 'False False')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,15 @@
+from abc import ABC, abstractmethod
 from datetime import datetime
 import re
 from os import listdir
 from os.path import join, isfile
-from typing import List, Any
+from typing import List, Any, Optional, Tuple
 import sys
 from types import ModuleType, FunctionType
 from gc import get_referents
 
+from logparser import read_mllp_frames
+
 # Custom objects know their class.
 # Function objects seem to know way too much, including modules.
 # Exclude modules as well.
@@ -90,31 +93,31 @@ EB = '\x1c'
 CR = '\x0d'
 
 HL7_Messages = []
-HL7_Message = ''
 if __name__ == '__main__':
-    for file in listdir(BRD_FILE_PATH):
-        if isfile(join(BRD_FILE_PATH, file)):
+    # eg: python workbench.py C:\Users\username\Desktop\working_directory
+    directory = sys.argv[1] if len(sys.argv) > 1 else BRD_FILE_PATH
+    for file in listdir(directory):
+        if isfile(join(directory, file)):
             if 'brd' in file:
-                with open(join(BRD_FILE_PATH, file), 'r', encoding='latin-1', errors='surrogateescape') as log_file:
-                    logging = False
-                    for log in log_file:
-                        if SB in log:
-                            logging = True
-                            HL7_Message += log[1:]
-                        elif EB in log:
-                            logging = False
-                            HL7_Messages.append(HL7_Message)
-                            HL7_Message = ''
-                        elif logging:
-                            HL7_Message += log
+                with open(join(directory, file), 'rb') as log_file:
+                    for frame in read_mllp_frames(log_file):
+                        # HL7Message splits segments on newlines
+                        HL7_Messages.append(frame.decode('latin-1').replace(CR + '\n', '\n').replace(CR, '\n'))
 
 
 class HL7Message:
+    """
+    An HL7 message, split into segments, fields, components and subcomponents only as each part is first accessed.
+    Each part keeps an index from its children's names to their positions, so lookups like message['pid'][5][2] are
+    dictionary lookups rather than scans.
+    """
+
     def __init__(self, raw_message: str):
         self._raw_message = raw_message
-        self.segments = []
         self.separators = self._parse_separators()
-        self._parse_segments()
+        self._raw_segments = self._raw_message.split(self.separators['SEGMENT'])
+        self._segments = [None] * len(self._raw_segments)
+        self._segment_index = None
 
     def _parse_separators(self):
         m = re.match("^MSH(?P<field_sep>\S)", self._raw_message)
@@ -151,9 +154,18 @@ class HL7Message:
 
             return separator_characters
 
-    def _parse_segments(self):
-        for segment in self._raw_message.split(self.separators['SEGMENT']):
-            self.segments.append(Segment(raw_segment=segment, separators=self.separators))
+    def _segment(self, position: int) -> 'Segment':
+        segment = self._segments[position]
+        if segment is None:
+            segment = self._segments[position] = Segment(raw_segment=self._raw_segments[position],
+                                                         separators=self.separators)
+        return segment
+
+    @property
+    def segments(self) -> List['Segment']:
+        for position in range(len(self._segments)):
+            self._segment(position)
+        return self._segments
 
     def __str__(self):
         return self._raw_message
@@ -162,24 +174,90 @@ class HL7Message:
         return self._raw_message
 
     def __getitem__(self, item: Any):
-        for segment in self.segments:
-            if str(item).lower() == str(segment.name).lower():
-                if segment:
-                    return segment
-                else:
-                    pass
+        """
+        :return: the first segment named item, case insensitive, or None if there isn't one
+        """
+        if self._segment_index is None:
+            self._segment_index = {}
+            for position, raw_segment in enumerate(self._raw_segments):
+                self._segment_index.setdefault(raw_segment[:3].lower(), position)
+        position = self._segment_index.get(str(item).lower())
+        if position is not None:
+            return self._segment(position)
+
+
+class HL7Part(ABC):
+    """
+    Part of an HL7 message that splits into named child parts the first time one of them is accessed. Only the
+    children that are accessed are built.
+    """
+
+    def __init__(self, raw: str, separators: Optional[dict], name: str):
+        self._raw = raw
+        self._separators = separators
+        self.name = name
+        # (name, raw) of each child, their positions by lower cased name and the children built so far
+        self._raw_children = None
+        self._index = None
+        self._children = None
+
+    @abstractmethod
+    def _split(self) -> List[Tuple[str, str]]:
+        """
+        :return: (name, raw text) of each child part, in order
+        """
+
+    @abstractmethod
+    def _build(self, name: str, raw: str) -> 'HL7Part':
+        """
+        :return: the child part named name, built from its raw text
+        """
+
+    def _load(self) -> None:
+        if self._raw_children is None:
+            self._raw_children = self._split()
+            self._children = [None] * len(self._raw_children)
+            self._index = {}
+            for position, (name, raw) in enumerate(self._raw_children):
+                # Names can repeat, the first child with a name wins
+                self._index.setdefault(name.lower(), position)
+
+    def _child(self, position: int) -> 'HL7Part':
+        child = self._children[position]
+        if child is None:
+            child = self._children[position] = self._build(*self._raw_children[position])
+        return child
+
+    def _all_children(self) -> list:
+        self._load()
+        for position in range(len(self._children)):
+            self._child(position)
+        return self._children
+
+    def __getitem__(self, item: Any):
+        """
+        :return: the first child named item, case insensitive, or the list of every child if there isn't one
+        """
+        self._load()
+        position = self._index.get(str(item).lower())
+        if position is None:
+            return self._all_children()
+        return self._child(position)
+
+    def __repr__(self):
+        return self._raw
+
+    def __str__(self):
+        return self._raw
 
 
-class Segment:
+class Segment(HL7Part):
     def __init__(self, raw_segment: str, separators: dict):
-        self._raw_segment = raw_segment
-        self._separators = separators
-        self.name = self._raw_segment[:3]
-        self.fields = []
-        self._parse_fields()
+        super().__init__(raw_segment, separators, raw_segment[:3])
 
-    def _parse_fields(self):
-        for index, field in enumerate(self._raw_segment.split(self._separators['FIELD'])):
+    def _split(self):
+        fields = []
+        for index, field in enumerate(self._raw.split(self._separators['FIELD'])):
             if self.name == 'MSH':
                 index = str(index + 1)
             else:
@@ -189,80 +267,47 @@ class Segment:
                     r_index = '.'.join(index + str(r_index + 1))
                 else:
                     r_index = index
-                self.fields.append(Field(raw_field=repeated_field, separators=self._separators, index=r_index))
+                fields.append((r_index, repeated_field))
+        return fields
 
-    def __repr__(self):
-        return self._raw_segment
+    def _build(self, name, raw):
+        return Field(raw_field=raw, separators=self._separators, index=name)
 
-    def __getitem__(self, item: Any):
-        for field in self.fields:
-            if str(item).lower() == str(field.name).lower():
-                if field:
-                    return field
-                else:
-                    pass
-        return self.fields
+    @property
+    def fields(self) -> List['Field']:
+        return self._all_children()
 
-    def __str__(self):
-        return self._raw_segment
 
-
-class Field:
+class Field(HL7Part):
     def __init__(self, raw_field: str, separators: dict, index: str):
-        self._raw_field = raw_field
-        self._separators = separators
-        self.name = index
-        self.components = []
-        self._parse_components()
-
-    def _parse_components(self):
-        for index, component in enumerate(self._raw_field.split(self._separators['COMPONENT'])):
-            index = str(index + 1)
-            self.components.append(Component(raw_component=component, separators=self._separators, index=index))
+        super().__init__(raw_field, separators, index)
 
-    def __repr__(self):
-        return self._raw_field
+    def _split(self):
+        return [(str(index + 1), component)
+                for index, component in enumerate(self._raw.split(self._separators['COMPONENT']))]
 
-    def __str__(self):
-        return self._raw_field
+    def _build(self, name, raw):
+        return Component(raw_component=raw, separators=self._separators, index=name)
 
-    def __getitem__(self, item: Any):
-        for component in self.components:
-            if str(item).lower() == str(component.name).lower():
-                if component:
-                    return component
-                else:
-                    pass
-        return self.components
+    @property
+    def components(self) -> List['Component']:
+        return self._all_children()
 
 
-class Component:
+class Component(HL7Part):
     def __init__(self, raw_component: str, separators: dict, index: str):
-        self._raw_component = raw_component
-        self._separators = separators
-        self.name = index
-        self.subcomponents = []
-        self._parse_subcomponents()
+        super().__init__(raw_component, separators, index)
 
-    def _parse_subcomponents(self):
-        for index, subcomponent in enumerate(self._raw_component.split(self._separators['SUBCOMPONENT'])):
-            index = str(index + 1)
-            self.subcomponents.append(SubComponent(raw_subcomponent=subcomponent, index=index))
+    def _split(self):
+        return [(str(index + 1), subcomponent)
+                for index, subcomponent in enumerate(self._raw.split(self._separators['SUBCOMPONENT']))]
 
-    def __repr__(self):
-        return self._raw_component
+    def _build(self, name, raw):
+        return SubComponent(raw_subcomponent=raw, index=name)
 
-    def __str__(self):
-        return self._raw_component
-
-    def __getitem__(self, item: Any):
-        for subcomponent in self.subcomponents:
-            if str(item).lower() == str(subcomponent.name).lower():
-                if subcomponent:
-                    return subcomponent
-                else:
-                    pass
-        return self.subcomponents
+    @property
+    def subcomponents(self) -> List['SubComponent']:
+        return self._all_children()
 
 
 class SubComponent: